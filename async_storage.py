@@ -0,0 +1,587 @@
+"""
+Модуль асинхронного хранилища для серверной базы данных
+Запросы пишутся на общем подмножестве SQL, драйвер (asyncpg или встроенный SQLite) подключается отдельно
+"""
+
+import re
+import json
+import asyncio
+import sqlite3
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from storage import AsyncStorageBackend, PageCursor
+
+
+class AsyncConnection(ABC):
+    """
+    Соединение драйвера. Параметры в запросах - '?', драйвер переводит их в свой формат.
+    """
+
+    @abstractmethod
+    async def execute(self, query: str, params: Sequence = ()) -> None:
+        """Выполняет запрос без результата"""
+
+    @abstractmethod
+    async def fetch_all(self, query: str, params: Sequence = ()) -> List[Dict]:
+        """Выполняет запрос и возвращает строки словарями"""
+
+    async def fetch_one(self, query: str, params: Sequence = ()) -> Optional[Dict]:
+        """Выполняет запрос и возвращает первую строку"""
+        rows = await self.fetch_all(query, params)
+        return rows[0] if rows else None
+
+
+class AsyncDriver(ABC):
+    """
+    Пул соединений драйвера.
+    """
+
+    # Тип автоинкрементного первичного ключа в DDL
+    id_column = "INTEGER PRIMARY KEY AUTOINCREMENT"
+
+    @abstractmethod
+    async def connect(self) -> None:
+        """Открывает соединения"""
+
+    @abstractmethod
+    async def close(self) -> None:
+        """Закрывает соединения"""
+
+    @abstractmethod
+    def acquire(self) -> "AsyncIterator[AsyncConnection]":
+        """Контекст с соединением в режиме autocommit"""
+
+    @abstractmethod
+    def transaction(self) -> "AsyncIterator[AsyncConnection]":
+        """Контекст с соединением внутри транзакции (откат при исключении)"""
+
+
+class _AsyncpgConnection(AsyncConnection):
+    """Соединение asyncpg"""
+
+    PLACEHOLDER_PATTERN = re.compile(r'\?')
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    @classmethod
+    def _numbered(cls, query: str) -> str:
+        """Переводит '?' в $1, $2, ... (в запросах хранилища нет '?' внутри строковых литералов)"""
+        counter = iter(range(1, query.count('?') + 1))
+        return cls.PLACEHOLDER_PATTERN.sub(lambda _: f"${next(counter)}", query)
+
+    async def execute(self, query: str, params: Sequence = ()) -> None:
+        await self.raw.execute(self._numbered(query), *params)
+
+    async def fetch_all(self, query: str, params: Sequence = ()) -> List[Dict]:
+        return [dict(row) for row in await self.raw.fetch(self._numbered(query), *params)]
+
+
+class AsyncpgDriver(AsyncDriver):
+    """
+    Драйвер PostgreSQL на asyncpg (пакет устанавливается отдельно).
+    """
+
+    id_column = "BIGSERIAL PRIMARY KEY"
+
+    def __init__(self, dsn: str, min_size: int = 2, max_size: int = 10):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.pool = None
+
+    async def connect(self) -> None:
+        try:
+            import asyncpg
+        except ImportError:
+            raise RuntimeError("Для AsyncpgDriver установите пакет asyncpg")
+        self.pool = await asyncpg.create_pool(self.dsn, min_size=self.min_size, max_size=self.max_size)
+
+    async def close(self) -> None:
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[AsyncConnection]:
+        async with self.pool.acquire() as raw:
+            yield _AsyncpgConnection(raw)
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[AsyncConnection]:
+        async with self.pool.acquire() as raw:
+            async with raw.transaction():
+                yield _AsyncpgConnection(raw)
+
+
+class _SQLiteConnection(AsyncConnection):
+    """Соединение встроенного драйвера: запросы выполняются в потоке драйвера"""
+
+    def __init__(self, driver: "SQLiteThreadDriver"):
+        self.driver = driver
+
+    async def execute(self, query: str, params: Sequence = ()) -> None:
+        await self.driver._run(self.driver._execute, query, tuple(params))
+
+    async def fetch_all(self, query: str, params: Sequence = ()) -> List[Dict]:
+        return await self.driver._run(self.driver._fetch_all, query, tuple(params))
+
+
+class SQLiteThreadDriver(AsyncDriver):
+    """
+    Встроенный драйвер на sqlite3 в отдельном потоке.
+    Заменяет серверную базу в тестах и при локальном запуске: одно соединение, запросы по очереди.
+    """
+
+    def __init__(self, db_path: str = ":memory:"):
+        self.db_path = db_path
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.conn: Optional[sqlite3.Connection] = None
+        self.lock: Optional[asyncio.Lock] = None
+
+    async def connect(self) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-driver")
+        # Lock создается внутри цикла событий (в Python 3.8-3.9 он привязывается к текущему циклу)
+        self.lock = asyncio.Lock()
+        await self._run(self._open)
+
+    async def close(self) -> None:
+        if self.executor is None:
+            return
+        await self._run(self.conn.close)
+        self.executor.shutdown(wait=True)
+        self.executor = None
+
+    def _open(self) -> None:
+        self.conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+
+    def _execute(self, query: str, params: tuple) -> None:
+        self.conn.execute(query, params)
+
+    def _fetch_all(self, query: str, params: tuple) -> List[Dict]:
+        cursor = self.conn.execute(query, params)
+        columns = [column[0] for column in cursor.description or ()]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[AsyncConnection]:
+        # Одно соединение на драйвер: одиночный запрос не должен попасть в чужую транзакцию
+        async with self.lock:
+            yield _SQLiteConnection(self)
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[AsyncConnection]:
+        async with self.lock:
+            await self._run(self._execute, 'BEGIN IMMEDIATE', ())
+            try:
+                yield _SQLiteConnection(self)
+            except BaseException:
+                await self._run(self._execute, 'ROLLBACK', ())
+                raise
+            await self._run(self._execute, 'COMMIT', ())
+
+
+def _now() -> str:
+    """Текущее время UTC в формате меток времени схемы"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _to_epoch(value: str) -> Optional[int]:
+    """Epoch-секунды для времени расписания (время без зоны - UTC, как strftime('%s') в SQLite)"""
+    try:
+        moment = datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp())
+
+
+class AsyncDatabaseManager(AsyncStorageBackend):
+    """
+    Хранилище бота на серверной базе данных через асинхронный драйвер.
+    Несколько реплик бота работают с одними пользователями, платежами и расписанием.
+    """
+
+    def __init__(self, driver: AsyncDriver):
+        self.driver = driver
+
+    async def start(self) -> None:
+        """Подключается к базе и создает схему, если ее нет"""
+        await self.driver.connect()
+        await self.init_schema()
+
+    async def close(self) -> None:
+        """Закрывает соединения драйвера"""
+        await self.driver.close()
+
+    async def init_schema(self) -> None:
+        """Создает таблицы и индексы (DDL общий для PostgreSQL и SQLite)"""
+        id_column = self.driver.id_column
+        statements = [
+            '''
+            CREATE TABLE IF NOT EXISTS users (
+                user_id BIGINT PRIMARY KEY,
+                first_name TEXT,
+                last_name TEXT,
+                username TEXT,
+                thread_id TEXT,
+                created_at TEXT,
+                updated_at TEXT
+            )
+            ''',
+            f'''
+            CREATE TABLE IF NOT EXISTS payments (
+                id {id_column},
+                user_id BIGINT,
+                invoice_payload TEXT UNIQUE,
+                amount BIGINT,
+                currency TEXT DEFAULT 'RUB',
+                status TEXT DEFAULT 'pending',
+                provider_payment_charge_id TEXT,
+                telegram_payment_charge_id TEXT,
+                order_info TEXT,
+                created_at TEXT,
+                updated_at TEXT
+            )
+            ''',
+            # Сжатие длинных текстов на сервере делает сама СУБД (TOAST в PostgreSQL)
+            f'''
+            CREATE TABLE IF NOT EXISTS message_history (
+                id {id_column},
+                user_id BIGINT,
+                message_text TEXT,
+                message_type TEXT DEFAULT 'user',
+                message_length INTEGER,
+                timestamp TEXT
+            )
+            ''',
+            f'''
+            CREATE TABLE IF NOT EXISTS schedule (
+                id {id_column},
+                user_id BIGINT,
+                payment_id BIGINT,
+                lesson_type TEXT,
+                scheduled_datetime TEXT,
+                duration_minutes INTEGER DEFAULT 120,
+                status TEXT DEFAULT 'scheduled',
+                notes TEXT,
+                starts_at BIGINT,
+                ends_at BIGINT,
+                created_at TEXT,
+                updated_at TEXT
+            )
+            ''',
+            'CREATE INDEX IF NOT EXISTS idx_message_history_user_timestamp ON message_history (user_id, timestamp)',
+            'CREATE INDEX IF NOT EXISTS idx_payments_user_created ON payments (user_id, created_at)',
+            'CREATE INDEX IF NOT EXISTS idx_schedule_user_datetime ON schedule (user_id, scheduled_datetime)',
+            '''CREATE INDEX IF NOT EXISTS idx_schedule_active_interval
+               ON schedule (starts_at, ends_at) WHERE status = 'scheduled' ''',
+            '''CREATE INDEX IF NOT EXISTS idx_schedule_active_datetime
+               ON schedule (scheduled_datetime) WHERE status = 'scheduled' ''',
+            '''CREATE UNIQUE INDEX IF NOT EXISTS idx_schedule_payment_unique
+               ON schedule (payment_id) WHERE payment_id IS NOT NULL''',
+        ]
+        async with self.driver.transaction() as conn:
+            for statement in statements:
+                await conn.execute(statement)
+
+    async def user_exists(self, user_id: int) -> bool:
+        """Проверяет существование пользователя"""
+        async with self.driver.acquire() as conn:
+            return await conn.fetch_one('SELECT 1 AS found FROM users WHERE user_id = ?', (user_id,)) is not None
+
+    async def get_user(self, user_id: int) -> Optional[Dict]:
+        """Получает данные пользователя"""
+        async with self.driver.acquire() as conn:
+            return await conn.fetch_one('SELECT * FROM users WHERE user_id = ?', (user_id,))
+
+    async def create_user(self, user_data: Dict) -> str:
+        """Создает нового пользователя и возвращает thread_id"""
+        thread_id = f"thread_{user_data['user_id']}_{int(datetime.now().timestamp())}"
+        now = _now()
+        async with self.driver.acquire() as conn:
+            await conn.execute('''
+                INSERT INTO users (user_id, first_name, last_name, username, thread_id, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                user_data['user_id'],
+                user_data.get('first_name', ''),
+                user_data.get('last_name', ''),
+                user_data.get('username', ''),
+                thread_id,
+                now,
+                now
+            ))
+        return thread_id
+
+    async def update_user_thread(self, user_id: int, thread_id: str) -> None:
+        """Обновляет thread_id пользователя"""
+        async with self.driver.acquire() as conn:
+            await conn.execute('UPDATE users SET thread_id = ?, updated_at = ? WHERE user_id = ?',
+                               (thread_id, _now(), user_id))
+
+    async def save_message(self, user_id: int, message_text: str, message_type: str = 'user') -> None:
+        """Сохраняет сообщение в историю"""
+        async with self.driver.acquire() as conn:
+            await conn.execute('''
+                INSERT INTO message_history (user_id, message_text, message_type, message_length, timestamp)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (user_id, message_text, message_type, len(message_text) if message_text is not None else None, _now()))
+
+    async def get_user_messages(self, user_id: int, limit: int = 10) -> List[Dict]:
+        """Получает последние сообщения пользователя"""
+        async with self.driver.acquire() as conn:
+            return await conn.fetch_all('''
+                SELECT * FROM message_history
+                WHERE user_id = ?
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?
+            ''', (user_id, limit))
+
+    async def save_payment(self, payment_data: Dict) -> None:
+        """Сохраняет информацию о платеже"""
+        async with self.driver.acquire() as conn:
+            await conn.execute(*self._payment_insert(payment_data, 'pending'))
+
+    @staticmethod
+    def _payment_insert(payment_data: Dict, status: str) -> Tuple[str, tuple]:
+        """Запрос вставки платежа"""
+        now = _now()
+        return '''
+            INSERT INTO payments (
+                user_id, invoice_payload, amount, currency, status,
+                provider_payment_charge_id, telegram_payment_charge_id, order_info, created_at, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            payment_data['user_id'],
+            payment_data.get('invoice_payload', ''),
+            payment_data.get('total_amount', 0),
+            payment_data.get('currency', 'RUB'),
+            status,
+            payment_data.get('provider_payment_charge_id', ''),
+            payment_data.get('telegram_payment_charge_id', ''),
+            json.dumps(payment_data.get('order_info', {})),
+            now,
+            now
+        )
+
+    async def update_payment_status(self, invoice_payload: str, status: str) -> None:
+        """Обновляет статус платежа"""
+        async with self.driver.acquire() as conn:
+            await conn.execute('UPDATE payments SET status = ?, updated_at = ? WHERE invoice_payload = ?',
+                               (status, _now(), invoice_payload))
+
+    async def payment_exists(self, invoice_payload: str) -> bool:
+        """Проверяет существование платежа"""
+        async with self.driver.acquire() as conn:
+            row = await conn.fetch_one('SELECT 1 AS found FROM payments WHERE invoice_payload = ?', (invoice_payload,))
+            return row is not None
+
+    async def get_user_payments(self, user_id: int) -> List[Dict]:
+        """Получает все платежи пользователя"""
+        async with self.driver.acquire() as conn:
+            return await conn.fetch_all('''
+                SELECT * FROM payments
+                WHERE user_id = ?
+                ORDER BY created_at DESC, id DESC
+            ''', (user_id,))
+
+    async def get_user_payments_page(self, user_id: int, limit: int = 5,
+                                     after: Optional[PageCursor] = None) -> Tuple[List[Dict], Optional[PageCursor]]:
+        """Получает страницу платежей пользователя (keyset по created_at, id) и курсор следующей страницы"""
+        async with self.driver.acquire() as conn:
+            if after is None:
+                rows = await conn.fetch_all('''
+                    SELECT * FROM payments
+                    WHERE user_id = ?
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT ?
+                ''', (user_id, limit + 1))
+            else:
+                rows = await conn.fetch_all('''
+                    SELECT * FROM payments
+                    WHERE user_id = ? AND (created_at, id) < (?, ?)
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT ?
+                ''', (user_id, after[0], after[1], limit + 1))
+
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, (rows[-1]['created_at'], rows[-1]['id'])
+
+    async def get_payment_by_id(self, payment_id: int) -> Optional[Dict]:
+        """Получает платеж по ID"""
+        async with self.driver.acquire() as conn:
+            return await conn.fetch_one('SELECT * FROM payments WHERE id = ?', (payment_id,))
+
+    @staticmethod
+    def _schedule_insert(schedule_data: Dict, payment_id: Optional[int]) -> Tuple[str, tuple]:
+        """Запрос вставки занятия; интервал в epoch-секундах считается здесь, без триггеров"""
+        starts_at = _to_epoch(schedule_data['scheduled_datetime'])
+        duration_minutes = schedule_data.get('duration_minutes', 120)
+        ends_at = starts_at + int(duration_minutes) * 60 if starts_at is not None else None
+        now = _now()
+        return '''
+            INSERT INTO schedule (user_id, payment_id, lesson_type, scheduled_datetime, duration_minutes,
+                                  status, notes, starts_at, ends_at, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            schedule_data['user_id'],
+            payment_id,
+            schedule_data['lesson_type'],
+            schedule_data['scheduled_datetime'],
+            duration_minutes,
+            schedule_data.get('status', 'scheduled'),
+            schedule_data.get('notes', ''),
+            starts_at,
+            ends_at,
+            now,
+            now
+        )
+
+    async def save_schedule(self, schedule_data: Dict) -> int:
+        """Сохраняет запись в расписании (упрощенная версия без payment_id)"""
+        query, params = self._schedule_insert(schedule_data, None)
+        async with self.driver.acquire() as conn:
+            row = await conn.fetch_one(query + ' RETURNING id', params)
+            return row['id']
+
+    async def add_schedule_entry(self, user_id: int, payment_id: int, lesson_type: str,
+                                 scheduled_datetime: str, duration_minutes: int = 120, notes: str = "") -> int:
+        """Добавляет запись в расписание"""
+        query, params = self._schedule_insert({
+            'user_id': user_id,
+            'lesson_type': lesson_type,
+            'scheduled_datetime': scheduled_datetime,
+            'duration_minutes': duration_minutes,
+            'notes': notes
+        }, payment_id)
+        async with self.driver.acquire() as conn:
+            row = await conn.fetch_one(query + ' RETURNING id', params)
+            return row['id']
+
+    async def ingest_payment(self, payment_data: Dict, user_data: Dict, schedule_data: Dict) -> Optional[int]:
+        """
+        Принимает успешный платеж одной транзакцией: пользователь, платеж и запись в расписании.
+
+        Args:
+            payment_data: Данные платежа (как для save_payment)
+            user_data: Данные пользователя (как для create_user), создается если его нет
+            schedule_data: Данные занятия (как для save_schedule)
+
+        Returns:
+            Optional[int]: ID созданной записи расписания или None, если платеж уже принят
+        """
+        now = _now()
+        async with self.driver.transaction() as conn:
+            await conn.execute('''
+                INSERT INTO users (user_id, first_name, last_name, username, thread_id, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id) DO NOTHING
+            ''', (
+                user_data['user_id'],
+                user_data.get('first_name', ''),
+                user_data.get('last_name', ''),
+                user_data.get('username', ''),
+                f"thread_{user_data['user_id']}_{int(datetime.now().timestamp())}",
+                now,
+                now
+            ))
+
+            query, params = self._payment_insert(payment_data, 'completed')
+            payment = await conn.fetch_one(query + '''
+                ON CONFLICT (invoice_payload) DO UPDATE SET status = 'completed', updated_at = excluded.updated_at
+                RETURNING id
+            ''', params)
+
+            # Уникальный индекс по payment_id: повторная доставка не создает второе занятие
+            query, params = self._schedule_insert(schedule_data, payment['id'])
+            schedule = await conn.fetch_one(
+                query + ' ON CONFLICT (payment_id) WHERE payment_id IS NOT NULL DO NOTHING RETURNING id', params
+            )
+            return schedule['id'] if schedule else None
+
+    async def check_schedule_conflict(self, scheduled_datetime: str, duration_minutes: int = 120) -> bool:
+        """Проверяет, пересекается ли интервал с активными занятиями (включая уже идущие)"""
+        starts_at = _to_epoch(scheduled_datetime)
+        if starts_at is None:
+            return False
+        ends_at = starts_at + int(duration_minutes) * 60
+
+        async with self.driver.acquire() as conn:
+            row = await conn.fetch_one('''
+                SELECT EXISTS (
+                    SELECT 1 FROM schedule
+                    WHERE status = 'scheduled'
+                    AND starts_at >= ? - (
+                        SELECT COALESCE(MAX(duration_minutes), 0) * 60 FROM schedule WHERE status = 'scheduled'
+                    )
+                    AND starts_at < ?
+                    AND ends_at > ?
+                ) AS has_conflict
+            ''', (starts_at, ends_at, starts_at))
+            return bool(row['has_conflict'])
+
+    async def get_schedule_for_date(self, date_str: str) -> List[Dict]:
+        """Получает расписание на конкретную дату"""
+        day = datetime.strptime(str(date_str)[:10], '%Y-%m-%d')
+        next_day = day + timedelta(days=1)
+        async with self.driver.acquire() as conn:
+            return await conn.fetch_all('''
+                SELECT s.*, u.first_name, u.last_name, p.amount, p.currency
+                FROM schedule s
+                LEFT JOIN users u ON s.user_id = u.user_id
+                LEFT JOIN payments p ON s.payment_id = p.id
+                WHERE s.scheduled_datetime >= ? AND s.scheduled_datetime < ?
+                AND s.status = 'scheduled'
+                ORDER BY s.scheduled_datetime
+            ''', (day.strftime('%Y-%m-%d'), next_day.strftime('%Y-%m-%d')))
+
+    async def get_user_schedule(self, user_id: int) -> List[Dict]:
+        """Получает расписание пользователя"""
+        async with self.driver.acquire() as conn:
+            return await conn.fetch_all('''
+                SELECT s.*, p.amount, p.currency, p.invoice_payload
+                FROM schedule s
+                LEFT JOIN payments p ON s.payment_id = p.id
+                WHERE s.user_id = ?
+                ORDER BY s.scheduled_datetime DESC, s.id DESC
+            ''', (user_id,))
+
+    async def get_user_schedule_page(self, user_id: int, limit: int = 5,
+                                     after: Optional[PageCursor] = None) -> Tuple[List[Dict], Optional[PageCursor]]:
+        """Получает страницу расписания пользователя (keyset по scheduled_datetime, id) и курсор следующей страницы"""
+        async with self.driver.acquire() as conn:
+            if after is None:
+                rows = await conn.fetch_all('''
+                    SELECT s.*, p.amount, p.currency, p.invoice_payload
+                    FROM schedule s
+                    LEFT JOIN payments p ON s.payment_id = p.id
+                    WHERE s.user_id = ?
+                    ORDER BY s.scheduled_datetime DESC, s.id DESC
+                    LIMIT ?
+                ''', (user_id, limit + 1))
+            else:
+                rows = await conn.fetch_all('''
+                    SELECT s.*, p.amount, p.currency, p.invoice_payload
+                    FROM schedule s
+                    LEFT JOIN payments p ON s.payment_id = p.id
+                    WHERE s.user_id = ? AND (s.scheduled_datetime, s.id) < (?, ?)
+                    ORDER BY s.scheduled_datetime DESC, s.id DESC
+                    LIMIT ?
+                ''', (user_id, after[0], after[1], limit + 1))
+
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, (rows[-1]['scheduled_datetime'], rows[-1]['id'])
@@ -0,0 +1,101 @@
+"""
+Модуль адаптивного окна батчинга сообщений
+Для каждого пользователя по EWMA оценивается обычная пауза между сообщениями одной серии;
+батч закрывается, когда пауза заметно превысила обычную, но не позже max_wait от первого сообщения
+"""
+
+import math
+import threading
+from typing import Dict, Optional
+
+
+class _UserGaps:
+    """Оценка пауз пользователя: среднее и дисперсия EWMA"""
+
+    def __init__(self, mean: float, variance: float):
+        self.mean = mean
+        self.variance = variance
+        self.last_message_at: Optional[float] = None
+        self.batch_started_at: Optional[float] = None
+
+
+class AdaptiveBatchWindow:
+    """
+    Окно батча на пользователя: mean + k * std пауз, в пределах [min_window, max_window].
+    Паузы не короче max_window считаются началом новой серии и не учитываются.
+    """
+
+    def __init__(self, max_window: float = 10.0, min_window: float = 2.0, max_wait: float = 15.0,
+                 alpha: float = 0.15, k: float = 2.5, prior_gap: float = 3.0, prior_std: float = 1.5):
+        self.max_window = max_window    # Прежнее фиксированное окно - верхняя граница
+        self.min_window = min_window
+        self.max_wait = max_wait        # Батч закрывается не позже, чем через max_wait от первого сообщения
+        self.alpha = alpha              # Вес новой паузы в EWMA
+        self.k = k                      # Запас в стандартных отклонениях, чтобы не дробить серию
+        self.prior_gap = prior_gap      # Начальная оценка для нового пользователя
+        self.prior_std = prior_std
+        self.users: Dict[int, _UserGaps] = {}
+        self.lock = threading.Lock()
+
+    def on_message(self, user_id: int, now: float) -> float:
+        """
+        Учитывает новое сообщение и возвращает задержку до закрытия батча.
+
+        Args:
+            user_id: ID пользователя Telegram
+            now: Время сообщения (time.time())
+
+        Returns:
+            float: Секунды до обработки батча
+        """
+        with self.lock:
+            gaps = self.users.get(user_id)
+            if gaps is None:
+                gaps = _UserGaps(self.prior_gap, self.prior_std ** 2)
+                self.users[user_id] = gaps
+
+            if gaps.last_message_at is not None:
+                gap = now - gaps.last_message_at
+                if 0 <= gap < self.max_window:
+                    self._update(gaps, gap)
+            gaps.last_message_at = now
+            if gaps.batch_started_at is None:
+                gaps.batch_started_at = now
+
+            deadline = gaps.batch_started_at + self.max_wait - now
+            return max(0.0, min(self._window(gaps), deadline))
+
+    def batch_closed(self, user_id: int) -> None:
+        """Сбрасывает начало батча после его обработки"""
+        with self.lock:
+            gaps = self.users.get(user_id)
+            if gaps is not None:
+                gaps.batch_started_at = None
+
+    def window(self, user_id: int) -> float:
+        """Текущее окно пользователя в секундах"""
+        with self.lock:
+            gaps = self.users.get(user_id)
+            if gaps is None:
+                return self._window(_UserGaps(self.prior_gap, self.prior_std ** 2))
+            return self._window(gaps)
+
+    def _update(self, gaps: _UserGaps, gap: float) -> None:
+        """Инкрементальное EWMA-обновление среднего и дисперсии"""
+        diff = gap - gaps.mean
+        increment = self.alpha * diff
+        gaps.mean += increment
+        gaps.variance = (1 - self.alpha) * (gaps.variance + diff * increment)
+
+    def _window(self, gaps: _UserGaps) -> float:
+        window = gaps.mean + self.k * math.sqrt(gaps.variance)
+        return min(self.max_window, max(self.min_window, window))
+
+    def get_stats(self) -> Dict:
+        """Число пользователей и медианное окно"""
+        with self.lock:
+            windows = sorted(self._window(gaps) for gaps in self.users.values())
+        return {
+            "users": len(windows),
+            "median_window": round(windows[len(windows) // 2], 2) if windows else None,
+        }
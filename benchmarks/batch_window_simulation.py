@@ -0,0 +1,98 @@
+"""
+Симуляция батчинга main_batch: фиксированное окно BATCH_TIMEOUT против адаптивного окна
+
+Пользователи трех типов: пишут одной строкой, быстро несколькими сообщениями и медленно с длинными паузами.
+Считаются задержка от последнего сообщения серии до обработки батча и число батчей (вызовов Make).
+Запуск: python benchmarks/batch_window_simulation.py [пользователей] [серий на пользователя]
+"""
+
+import os
+import sys
+import random
+import statistics
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from batch_window import AdaptiveBatchWindow
+
+BATCH_TIMEOUT = 10
+MAX_WAIT_SECONDS = 15
+
+PROFILES = {
+    # (число сообщений в серии, пауза между сообщениями серии)
+    "одной строкой": (lambda rng: 1, lambda rng: 0),
+    "быстро": (lambda rng: rng.randint(2, 5), lambda rng: rng.uniform(0.5, 2.0)),
+    "медленно": (lambda rng: rng.randint(2, 4), lambda rng: rng.uniform(3.0, 7.0)),
+}
+
+
+def build_messages(users: int, sessions: int, seed: int = 7):
+    """Сообщения (время, user_id) и число серий"""
+    rng = random.Random(seed)
+    messages = []
+    for user_id in range(users):
+        count, gap = PROFILES[list(PROFILES)[user_id % len(PROFILES)]]
+        now = rng.uniform(0, 60)
+        for _ in range(sessions):
+            for index in range(count(rng)):
+                if index:
+                    now += gap(rng)
+                messages.append((now, user_id))
+            now += rng.uniform(40, 300)  # Ответ бота и пауза до следующего вопроса
+    messages.sort()
+    return messages, users * sessions
+
+
+def simulate(messages, delay_for, on_close=lambda user_id: None):
+    """Прогоняет сообщения через таймеры батчей; возвращает задержки после последнего сообщения и число батчей"""
+    open_batches = {}  # user_id -> (время закрытия, время последнего сообщения)
+    latencies = []
+    batches = 0
+
+    def close(user_id):
+        nonlocal batches
+        close_at, last_at = open_batches.pop(user_id)
+        latencies.append(close_at - last_at)
+        batches += 1
+        on_close(user_id)
+
+    for now, user_id in messages:
+        for other in [uid for uid, (close_at, _) in open_batches.items() if close_at <= now]:
+            close(other)
+        delay = delay_for(user_id, now)
+        open_batches[user_id] = (now + delay, now)
+    for user_id in list(open_batches):
+        close(user_id)
+    return latencies, batches
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    sessions = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    messages, series = build_messages(users, sessions)
+    print(f"Пользователей: {users}, серий: {series}, сообщений: {len(messages)}")
+
+    # Как было: таймер BATCH_TIMEOUT перезапускается с каждым сообщением, без ограничения MAX_WAIT_SECONDS
+    fixed = simulate(messages, lambda user_id, now: BATCH_TIMEOUT)
+
+    # Фиксированное окно с тем же ограничением MAX_WAIT_SECONDS, что и у адаптивного
+    started = {}
+
+    def fixed_capped_delay(user_id, now):
+        started.setdefault(user_id, now)
+        return max(0.0, min(BATCH_TIMEOUT, started[user_id] + MAX_WAIT_SECONDS - now))
+
+    fixed_capped = simulate(messages, fixed_capped_delay, lambda user_id: started.pop(user_id, None))
+
+    window = AdaptiveBatchWindow(max_window=BATCH_TIMEOUT, max_wait=MAX_WAIT_SECONDS)
+    adaptive = simulate(messages, window.on_message, window.batch_closed)
+
+    for label, (latencies, batches) in (("фиксированное 10 с", fixed), ("10 с + MAX_WAIT", fixed_capped),
+                                        ("адаптивное", adaptive)):
+        latencies.sort()
+        print(f"{label:<20} батчей {batches:6d} ({batches / series:5.2f} на серию)  "
+              f"медиана {statistics.median(latencies):5.2f} с  p90 {latencies[int(len(latencies) * 0.9)]:5.2f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Бенчмарк ответов на статические команды
+
+Сравнивает прежнее построение ответа /docs без запроса (запрос категорий в SQLite и склейка через +=)
+и /start (f-строка) с готовыми ответами ResponseTemplates.
+Запуск: python benchmarks/command_responses.py [повторов]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from make_documentation import MakeDocumentationManager
+from response_templates import ResponseTemplates
+
+START_TEXT = "\n🤖 <b>Добро пожаловать в Make.com Помощник!</b>\n\nПривет, {user_name}! Я ваш персональный эксперт.\n" * 8
+
+
+def docs_before(docs: MakeDocumentationManager) -> str:
+    categories = docs.get_categories()
+    response_text = "📚 <b>Документация Make.com</b>\n\n"
+    response_text += "Доступные категории:\n"
+    for category in categories:
+        response_text += f"• {category}\n"
+    response_text += "\nИспользуйте: /docs &lt;запрос&gt; для поиска"
+    return response_text
+
+
+def measure(label: str, fn, repeats: int) -> None:
+    started = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    per_call = (time.perf_counter() - started) / repeats
+    print(f"{label:<34} {per_call * 1e6:10.2f} мкс/ответ")
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        docs = MakeDocumentationManager(os.path.join(tmp, "docs.db"))
+        for i in range(20):
+            docs.add_documentation_entry(f"Категория {i}", f"Статья {i}", "Текст статьи")
+
+        templates = ResponseTemplates()
+        templates.register("docs_categories", lambda: docs_before(docs), depends_on=("docs",))
+        templates.register("start", lambda: START_TEXT, fields=("user_name",))
+        templates.warm_up()
+
+        measure("/docs: SQLite + склейка", lambda: docs_before(docs), repeats)
+        measure("/docs: готовый ответ", lambda: templates.format("docs_categories"), repeats)
+        measure("/start: f-строка", lambda: START_TEXT.format(user_name="Анна"), repeats)
+        measure("/start: шаблон с экранированием", lambda: templates.format("start", user_name="Анна"), repeats)
+
+
+if __name__ == "__main__":
+    main()
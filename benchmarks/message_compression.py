@@ -0,0 +1,161 @@
+"""
+Бенчмарк сжатия истории сообщений на корпусе, похожем на реальный
+
+Корпус: короткие вопросы пользователей, HTML-ответы ассистента, отчеты анализа сценариев
+и превью файлов. Сравнивает размер файла SQLite и скорость при хранении текстом, zlib без словаря,
+zlib со словарем версии 1 и со словарем, обученным на половине корпуса.
+Запуск: python benchmarks/message_compression.py [сообщений]
+"""
+
+import os
+import sys
+import time
+import zlib
+import random
+import sqlite3
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import message_codec
+from message_codec import COMPRESSION_THRESHOLD, build_dictionary, decode_message, encode_message
+from migrations import apply_migrations
+
+MODULE_TYPES = [
+    "gateway:CustomWebHook", "json:ParseJSON", "http:ActionSendData", "builtin:BasicRouter",
+    "google-sheets:addRow", "openai-gpt-3:CreateCompletion", "telegram:SendMessage", "datastore:AddRecord",
+]
+TOPICS = ["вебхук", "роутер", "фильтр", "итератор", "агрегатор", "Data Store", "HTTP модуль", "Google Sheets"]
+QUESTIONS = [
+    "Как настроить {topic} в Make.com?",
+    "Почему {topic} не получает данные?",
+    "Сколько стоит занятие по {topic}?",
+    "Можно ли ускорить сценарий с {topic}?",
+]
+PARAGRAPHS = [
+    "<b>{topic}</b> в Make.com используется для обработки данных между модулями сценария.",
+    "Откройте сценарий, добавьте модуль <i>{topic}</i> и укажите параметры подключения.",
+    "Проверьте, что предыдущий модуль возвращает данные: запустите сценарий кнопкой <b>Run once</b>.",
+    "Пример выражения: <code>{{{{1.data.items}}}}</code> - массив элементов из модуля 1.",
+    "Если ошибка повторяется, включите обработчик ошибок <b>Resume</b> и посмотрите журнал выполнения.",
+    "Подробнее в документации: <a href=\"https://www.make.com/en/help/modules/{slug}\">{topic}</a>.",
+    "Для сложных сценариев рекомендую индивидуальное занятие (2 часа): разберем ваш сценарий вместе.",
+    "💡 Совет: разбивайте большие сценарии на несколько, связывая их через вебхуки.",
+]
+
+
+def scenario_report(rng: random.Random) -> str:
+    """Отчет анализа сценария в формате process_document_message"""
+    modules = rng.randint(3, 40)
+    types = rng.sample(MODULE_TYPES, rng.randint(2, 6))
+    text = "[JSON СЦЕНАРИЙ] 📊 <b>Анализ сценария Make.com</b>\n\n"
+    text += f"🔢 Модулей: {modules}\n🔗 Соединений: {modules - 1}\n📈 Сложность: {rng.choice(['low', 'medium', 'high'])}\n\n"
+    warnings = [f"Модуль {rng.randint(1, modules)} ({rng.choice(types)}) без параметров" for _ in range(rng.randint(0, 4))]
+    warnings += [f"Модуль {rng.randint(1, modules)} не связан с другими модулями по данным" for _ in range(rng.randint(0, 3))]
+    if warnings:
+        text += "⚠️ <b>Предупреждения:</b>\n" + "".join(f"• {w}\n" for w in warnings) + "\n"
+    text += "💡 <b>Рекомендации:</b>\n"
+    text += f"• ✅ Сценарий содержит {modules} модулей\n"
+    if warnings:
+        text += f"• 🟡 Найдено {len(warnings)} предупреждений\n"
+    text += f"• ⛓ Глубина цепочки данных: {rng.randint(2, 9)} ({' → '.join(str(i) for i in range(1, rng.randint(3, 8)))})\n"
+    text += f"• 📊 Используется {len(types)} типов модулей: {', '.join(types)}\n"
+    return text
+
+
+def assistant_reply(rng: random.Random) -> str:
+    """HTML-ответ ассистента из нескольких абзацев"""
+    topic = rng.choice(TOPICS)
+    paragraphs = rng.sample(PARAGRAPHS, rng.randint(3, 6))
+    return "\n\n".join(p.format(topic=topic, slug=topic.lower().replace(' ', '-')) for p in paragraphs)
+
+
+def file_preview(rng: random.Random) -> str:
+    """Превью загруженного файла (первые 500 символов)"""
+    lines = [f"row_{i},{rng.randint(0, 10 ** 6)},{rng.choice(TOPICS)},{rng.random():.4f}" for i in range(40)]
+    return f"[ФАЙЛ data_{rng.randint(1, 999)}.csv] " + "\n".join(lines)[:500] + "..."
+
+
+def build_corpus(size: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        kind = rng.random()
+        if kind < 0.45:
+            corpus.append(rng.choice(QUESTIONS).format(topic=rng.choice(TOPICS)))
+        elif kind < 0.85:
+            corpus.append(assistant_reply(rng))
+        elif kind < 0.95:
+            corpus.append(scenario_report(rng))
+        else:
+            corpus.append(file_preview(rng))
+    return corpus
+
+
+def store(db_path: str, corpus: list, encode) -> float:
+    """Записывает корпус в message_history и возвращает время кодирования"""
+    apply_migrations(db_path)
+    started = time.perf_counter()
+    rows = [(1, encode(text), 'assistant', len(text)) for text in corpus]
+    elapsed = time.perf_counter() - started
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO message_history (user_id, message_text, message_type, message_length) VALUES (?, ?, ?, ?)",
+            rows
+        )
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('VACUUM')
+    return elapsed
+
+
+def read_all(db_path: str) -> float:
+    started = time.perf_counter()
+    with sqlite3.connect(db_path) as conn:
+        for (value,) in conn.execute('SELECT message_text FROM message_history'):
+            decode_message(value)
+    return time.perf_counter() - started
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    corpus = build_corpus(size)
+    raw_bytes = sum(len(text.encode('utf-8')) for text in corpus)
+    long_share = sum(1 for text in corpus if len(text.encode('utf-8')) >= COMPRESSION_THRESHOLD) / size
+    print(f"Сообщений: {size}, текста: {raw_bytes / 1024 / 1024:.1f} МБ, длиннее порога: {long_share:.0%}")
+
+    # Обучение на первой половине корпуса, замер на всем
+    trained = build_dictionary(corpus[:size // 2][:2000])
+    message_codec.DICTIONARIES[200] = trained
+    message_codec.DICTIONARIES[201] = b""
+
+    variants = [
+        ("TEXT (как раньше)", lambda text: text),
+        ("zlib без словаря", lambda text: encode_message(text, dictionary_version=201)),
+        ("zlib + словарь v1", lambda text: encode_message(text)),
+        (f"zlib + обученный ({len(trained) // 1024} КБ)", lambda text: encode_message(text, dictionary_version=200)),
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        baseline = None
+        for index, (label, encode) in enumerate(variants):
+            db_path = os.path.join(tmp_dir, f'bench_{index}.db')
+            encode_time = store(db_path, corpus, encode)
+            read_time = read_all(db_path)
+            file_size = os.path.getsize(db_path)
+            baseline = baseline or file_size
+            print(f"{label:<32} файл {file_size / 1024 / 1024:6.2f} МБ ({file_size / baseline:5.0%})  "
+                  f"запись {encode_time / size * 1e6:6.1f} мкс/сообщ.  "
+                  f"чтение {read_time / size * 1e6:6.1f} мкс/сообщ.")
+
+    # Отдельно - выигрыш словаря на коротких отчетах, где он важнее всего
+    reports = [text for text in corpus if text.startswith("[JSON")][:500]
+    for label, zdict in (("без словаря", b""), ("словарь v1", message_codec.MESSAGE_DICTIONARY_V1)):
+        total = 0
+        for text in reports:
+            compressor = zlib.compressobj(level=9, zdict=zdict) if zdict else zlib.compressobj(level=9)
+            total += len(compressor.compress(text.encode('utf-8')) + compressor.flush())
+        print(f"Отчеты анализа, {label:<12} {total / sum(len(t.encode('utf-8')) for t in reports):5.0%} исходного")
+
+
+if __name__ == "__main__":
+    main()
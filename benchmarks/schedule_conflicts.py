@@ -0,0 +1,92 @@
+"""
+Бенчмарк проверки конфликтов расписания на плотном расписании за несколько лет
+
+Сравнивает старую проверку (datetime() BETWEEN без индекса) с интервальным индексом.
+Запуск: python benchmarks/schedule_conflicts.py [лет] [занятий в день]
+"""
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from database import DatabaseManager
+
+CHECKS = 2000
+
+
+def seed(db_path: str, years: int, lessons_per_day: int) -> int:
+    """Заполняет расписание занятиями с 08:00 подряд, длительностью от 30 до 120 минут"""
+    start = datetime(2020, 1, 1, 8, 0)
+    rows = []
+    for day in range(365 * years):
+        current = start + timedelta(days=day)
+        for _ in range(lessons_per_day):
+            duration = random.choice((30, 60, 90, 120))
+            rows.append((1, 'lesson', current.strftime('%Y-%m-%d %H:%M:%S'), duration, 'scheduled', ''))
+            current += timedelta(minutes=duration)
+
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany('''
+            INSERT INTO schedule (user_id, lesson_type, scheduled_datetime, duration_minutes, status, notes)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', rows)
+        conn.execute('ANALYZE')
+    return len(rows)
+
+
+def legacy_conflict(db_path: str, scheduled_datetime: str, duration_minutes: int) -> bool:
+    """Проверка до интервальных колонок"""
+    with sqlite3.connect(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT COUNT(*) FROM schedule NOT INDEXED
+            WHERE status = 'scheduled'
+            AND datetime(scheduled_datetime) BETWEEN
+                datetime(?) AND datetime(?, '+{} minutes')
+        '''.format(duration_minutes), (scheduled_datetime, scheduled_datetime))
+        return cursor.fetchone()[0] > 0
+
+
+def measure(label: str, check, probes) -> float:
+    started = time.perf_counter()
+    for scheduled_datetime, duration in probes:
+        check(scheduled_datetime, duration)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed / len(probes) * 1e6:10.1f} мкс/проверка")
+    return elapsed
+
+
+def main():
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    lessons_per_day = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'bench.db')
+        db = DatabaseManager(db_path)
+        rows = seed(db_path, years, lessons_per_day)
+        print(f"Занятий в расписании: {rows} ({years} лет, {lessons_per_day} в день)")
+
+        probes = []
+        for _ in range(CHECKS):
+            moment = datetime(2020, 1, 1) + timedelta(minutes=random.randrange(365 * years * 24 * 60))
+            probes.append((moment.strftime('%Y-%m-%d %H:%M:%S'), random.choice((30, 60, 120))))
+
+        legacy = measure('datetime() BETWEEN (скан)', lambda d, m: legacy_conflict(db_path, d, m), probes)
+        indexed = measure('интервальный индекс', db.check_schedule_conflict, probes)
+        print(f"Ускорение: x{legacy / indexed:.1f}")
+
+        started = time.perf_counter()
+        for scheduled_datetime, _ in probes[:200]:
+            day = scheduled_datetime[:10]
+            db.find_free_slots(f'{day} 00:00:00', f'{day} 23:59:59', 60)
+        print(f"{'поиск свободных окон (день)':<28} {(time.perf_counter() - started) / 200 * 1e6:10.1f} мкс/запрос")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Бенчмарк записи обновлений в журнал: commit на каждое обновление против групповой записи
+
+Несколько потоков (как потоки Flask) одновременно записывают обновления и ждут подтверждения записи.
+Запуск: python benchmarks/update_journal_throughput.py [обновлений] [потоков]
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import tempfile
+import threading
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from update_journal import UpdateJournal
+
+
+def make_update(update_id: int) -> dict:
+    return {"update_id": update_id, "message": {"from": {"id": update_id % 500}, "text": "x" * 200}}
+
+
+def run_threads(count: int, threads: int, append) -> float:
+    per_thread = count // threads
+    started = time.perf_counter()
+
+    def worker(offset: int):
+        for update_id in range(offset, offset + per_thread):
+            append(make_update(update_id))
+
+    pool = [threading.Thread(target=worker, args=(1 + i * per_thread,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Commit на каждое обновление под общей блокировкой
+        path = os.path.join(tmp_dir, 'single.db')
+        UpdateJournal(path).close()
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = FULL')
+        lock = threading.Lock()
+
+        def append_single(update):
+            with lock, conn:
+                conn.execute('INSERT OR IGNORE INTO update_journal (update_id, payload, received_at) VALUES (?, ?, ?)',
+                             (update["update_id"], json.dumps(update), time.time()))
+
+        elapsed = run_threads(count, threads, append_single)
+        conn.close()
+        print(f"commit на обновление: {count / elapsed:8.0f} обновл./с")
+
+        journal = UpdateJournal(os.path.join(tmp_dir, 'grouped.db'))
+        elapsed = run_threads(count, threads, journal.append)
+        stats = journal.get_stats()
+        journal.close()
+        print(f"групповая запись:     {count / elapsed:8.0f} обновл./с "
+              f"({stats['commits']} commit, {stats['appended'] / stats['commits']:.1f} обновл. на fsync)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Нагрузочный тест приема обновлений: long polling против webhook на локальном фейковом Telegram
+
+Фейковый Bot API (getUpdates с long polling, setWebhook, sendMessage) и бот-эхо на python-telegram-bot
+работают в одном процессе. Задержка - от появления обновления в "Telegram" до прихода ответа sendMessage.
+Запуск: python benchmarks/webhook_latency.py [--updates 300] [--rate 50] [--poll-interval 3.0]
+Нужны python-telegram-bot, httpx и uvicorn (requirements.txt).
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from typing import Dict, List
+from urllib.parse import parse_qsl
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+import uvicorn
+from telegram import Update
+from telegram.ext import Application, MessageHandler, filters
+
+from webhook_server import WebhookApp
+
+TOKEN = "123456:FAKE"
+SECRET = "benchmark-secret"
+API_PORT = 18081
+WEBHOOK_PORT = 18082
+
+
+class FakeTelegram:
+    """
+    ASGI-приложение с минимальным Bot API: хранит очередь обновлений и время прихода ответов.
+    """
+
+    def __init__(self):
+        self.updates: List[Dict] = []
+        self.new_update = asyncio.Event()
+        self.replies: Dict[str, float] = {}  # текст ответа -> время получения
+        self.message_id = 0
+
+    def push(self, update: Dict) -> None:
+        self.updates.append(update)
+        self.new_update.set()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        headers = dict(scope["headers"])
+        if headers.get(b"content-type", b"").startswith(b"application/json"):
+            params = json.loads(body or b"{}")
+        else:
+            params = {key: self._value(value) for key, value in parse_qsl(body.decode())}
+
+        method = scope["path"].rsplit("/", 1)[-1]
+        result = await self.handle(method, params)
+        payload = json.dumps({"ok": True, "result": result}).encode()
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": payload})
+
+    @staticmethod
+    def _value(value: str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+
+    async def handle(self, method: str, params: Dict):
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+        if method == "getUpdates":
+            offset = int(params.get("offset") or 0)
+            deadline = time.monotonic() + float(params.get("timeout") or 0)
+            while True:
+                pending = [u for u in self.updates if u["update_id"] >= offset]
+                if pending or time.monotonic() >= deadline:
+                    return pending[:100]
+                self.new_update.clear()
+                try:
+                    await asyncio.wait_for(self.new_update.wait(), deadline - time.monotonic())
+                except asyncio.TimeoutError:
+                    pass
+        if method == "sendMessage":
+            self.replies[params["text"]] = time.perf_counter()
+            self.message_id += 1
+            return {"message_id": self.message_id, "date": int(time.time()),
+                    "chat": {"id": int(params["chat_id"]), "type": "private"}, "text": params["text"]}
+        return True
+
+
+def make_update(update_id: int) -> Dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": 1000 + update_id % 50, "type": "private"},
+            "from": {"id": 1000 + update_id % 50, "is_bot": False, "first_name": "Load"},
+            "text": f"msg-{update_id}",
+        },
+    }
+
+
+async def echo(update: Update, context) -> None:
+    await update.message.reply_text(update.message.text)
+
+
+def build_application() -> Application:
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        .base_url(f"http://127.0.0.1:{API_PORT}/bot")
+        .concurrent_updates(64)
+        .build()
+    )
+    application.add_handler(MessageHandler(filters.TEXT, echo))
+    return application
+
+
+async def start_server(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="error",
+                                           access_log=False, lifespan="off"))
+    server.install_signal_handlers = lambda: None
+    asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server
+
+
+async def run_mode(mode: str, fake: FakeTelegram, updates: int, rate: float, poll_interval: float,
+                   first_id: int) -> List[float]:
+    """Прогоняет нагрузку в одном режиме и возвращает задержки в миллисекундах"""
+    application = build_application()
+    sent_at: Dict[str, float] = {}
+    webhook_server = None
+
+    async with application:
+        await application.start()
+        if mode == "polling":
+            await application.updater.start_polling(poll_interval=poll_interval, timeout=10)
+        else:
+            async def submit(data):
+                await application.update_queue.put(Update.de_json(data, application.bot))
+            webhook_server = await start_server(WebhookApp(submit, SECRET), WEBHOOK_PORT)
+
+        async with httpx.AsyncClient() as client:
+            for update_id in range(first_id, first_id + updates):
+                update = make_update(update_id)
+                sent_at[update["message"]["text"]] = time.perf_counter()
+                if mode == "polling":
+                    fake.push(update)
+                else:
+                    response = await client.post(
+                        f"http://127.0.0.1:{WEBHOOK_PORT}/telegram", json=update,
+                        headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}
+                    )
+                    response.raise_for_status()
+                await asyncio.sleep(1 / rate)
+
+        deadline = time.monotonic() + poll_interval + 30
+        while time.monotonic() < deadline and not all(text in fake.replies for text in sent_at):
+            await asyncio.sleep(0.05)
+
+        if mode == "polling":
+            await application.updater.stop()
+        else:
+            webhook_server.should_exit = True
+        await application.stop()
+
+    return [(fake.replies[text] - started) * 1000 for text, started in sent_at.items() if text in fake.replies]
+
+
+def report(mode: str, latencies: List[float], expected: int) -> None:
+    if not latencies:
+        print(f"{mode:<8} нет ответов")
+        return
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{mode:<8} ответов {len(latencies)}/{expected}  p50 {statistics.median(latencies):8.1f} мс  "
+          f"p95 {p95:8.1f} мс  p99 {p99:8.1f} мс  max {latencies[-1]:8.1f} мс")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--updates", type=int, default=300)
+    parser.add_argument("--rate", type=float, default=50, help="Обновлений в секунду")
+    parser.add_argument("--poll-interval", type=float, default=3.0)
+    parser.add_argument("--mode", choices=("both", "polling", "webhook"), default="both")
+    args = parser.parse_args()
+
+    fake = FakeTelegram()
+    api_server = await start_server(fake, API_PORT)
+    modes = ("polling", "webhook") if args.mode == "both" else (args.mode,)
+
+    print(f"Обновлений: {args.updates}, темп: {args.rate:g}/с, poll_interval: {args.poll_interval:g} с")
+    for index, mode in enumerate(modes):
+        latencies = await run_mode(mode, fake, args.updates, args.rate, args.poll_interval,
+                                   first_id=1 + index * args.updates)
+        report(mode, latencies, args.updates)
+
+    api_server.should_exit = True
+    await asyncio.sleep(0.1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
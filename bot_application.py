@@ -0,0 +1,71 @@
+"""
+Модуль сборки Application python-telegram-bot
+Одна конфигурация для бота и нагрузочных тестов: обновления разных чатов обрабатываются параллельно,
+pre-checkout не ждет свободного места среди долгих обработчиков
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+
+from telegram import Update
+from telegram.ext import Application, BaseRateLimiter, BaseUpdateProcessor
+
+# Сколько обновлений обрабатывается одновременно; долгий ответ одному чату не задерживает остальные
+DEFAULT_CONCURRENT_UPDATES = 32
+
+# Семафор базового класса ограничивает все обновления сразу, поэтому он задается с запасом,
+# а лимит обычных обновлений действует внутри do_process_update
+_ALL_UPDATES_LIMIT = 100000
+
+
+class PaymentFirstUpdateProcessor(BaseUpdateProcessor):
+    """
+    Ограничивает число одновременно обрабатываемых обновлений, кроме pre-checkout.
+    Telegram ждет ответ на pre-checkout не дольше 10 секунд - он обрабатывается сразу, даже если все места
+    заняты запросами к OpenAI и Whisper.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(_ALL_UPDATES_LIMIT)
+        self.regular_limit = max_concurrent_updates
+        self.regular_slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        if isinstance(update, Update) and update.pre_checkout_query is not None:
+            await coroutine
+            return
+        async with self.regular_slots:
+            await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+
+def build_application(token: str, concurrent_updates: int = DEFAULT_CONCURRENT_UPDATES,
+                      rate_limiter: Optional[BaseRateLimiter] = None,
+                      post_shutdown: Optional[Callable[[Application], Awaitable]] = None,
+                      base_url: Optional[str] = None) -> Application:
+    """
+    Создает Application с параллельной обработкой обновлений.
+
+    Args:
+        token: Токен бота
+        concurrent_updates: Максимум одновременно обрабатываемых обновлений (pre-checkout - сверх лимита)
+        rate_limiter: Ограничитель исходящих запросов (очередь SendScheduler)
+        post_shutdown: Вызывается после остановки приложения
+        base_url: Адрес Bot API (для локального фейкового Telegram)
+
+    Returns:
+        Application: Приложение без обработчиков
+    """
+    builder = Application.builder().token(token).concurrent_updates(PaymentFirstUpdateProcessor(concurrent_updates))
+    if base_url:
+        builder = builder.base_url(base_url)
+    if rate_limiter is not None:
+        builder = builder.rate_limiter(rate_limiter)
+    if post_shutdown is not None:
+        builder = builder.post_shutdown(post_shutdown)
+    return builder.build()
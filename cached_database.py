@@ -0,0 +1,169 @@
+"""
+Модуль кэширования чтений из базы данных
+Частые проверки пользователей и платежей отвечают из памяти, записи сбрасывают кэш
+"""
+
+import time
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from database import DatabaseManager
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Ограниченный по размеру LRU кэш с временем жизни записей.
+    Поколение ключа растет при каждом сбросе: значение, прочитанное из базы до сброса, не попадает в кэш после него.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()  # key -> (expires_at, value)
+        self.lock = threading.Lock()
+        self.generations: "OrderedDict[Any, int]" = OrderedDict()  # key -> номер последнего сброса
+        self.generation_floor = 0  # Не меньше поколения любого вытесненного из generations ключа
+        self.invalidations = itertools.count(1)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Any) -> Any:
+        """Возвращает значение или _MISSING, если записи нет или она устарела"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return _MISSING
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self, key: Any) -> int:
+        """Поколение ключа; берется до чтения из базы и передается в set"""
+        with self.lock:
+            return self.generations.get(key, self.generation_floor)
+
+    def set(self, key: Any, value: Any, ttl_seconds: float, generation: Optional[int] = None) -> None:
+        """Сохраняет значение на ttl_seconds (если ключ сбрасывался после generation - не сохраняет)"""
+        with self.lock:
+            if generation is not None and self.generations.get(key, self.generation_floor) != generation:
+                return
+            self.entries[key] = (time.monotonic() + ttl_seconds, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key: Any) -> None:
+        """Удаляет запись"""
+        with self.lock:
+            self.entries.pop(key, None)
+            self.generations[key] = next(self.invalidations)
+            self.generations.move_to_end(key)
+            while len(self.generations) > self.max_entries:
+                _, generation = self.generations.popitem(last=False)
+                self.generation_floor = max(self.generation_floor, generation)
+
+    def clear(self) -> None:
+        """Очищает кэш"""
+        with self.lock:
+            self.entries.clear()
+            self.generations.clear()
+            self.generation_floor = next(self.invalidations)
+
+
+class CachedDatabaseManager(DatabaseManager):
+    """
+    DatabaseManager с кэшем чтения для пользователей и платежей.
+    Запись через этот же экземпляр сразу сбрасывает затронутые ключи.
+    """
+
+    def __init__(self, db_path: str = "bot_database.db", user_ttl_seconds: float = 300,
+                 payment_ttl_seconds: float = 3600, negative_ttl_seconds: float = 30,
+                 max_entries: int = 10000):
+        self.user_ttl_seconds = user_ttl_seconds
+        self.payment_ttl_seconds = payment_ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.users_cache = TTLCache(max_entries)      # user_id -> dict пользователя или None
+        self.payments_cache = TTLCache(max_entries)   # invoice_payload -> bool
+        super().__init__(db_path)
+
+    def get_user(self, user_id: int) -> Optional[Dict]:
+        """Получает данные пользователя (из кэша, если есть)"""
+        user = self.users_cache.get(user_id)
+        if user is _MISSING:
+            generation = self.users_cache.generation(user_id)
+            user = super().get_user(user_id)
+            # Отсутствующий пользователь кэшируется коротко
+            ttl = self.user_ttl_seconds if user is not None else self.negative_ttl_seconds
+            self.users_cache.set(user_id, user, ttl, generation)
+        return dict(user) if user is not None else None
+
+    def user_exists(self, user_id: int) -> bool:
+        """Проверяет существование пользователя через кэш профиля"""
+        return self.get_user(user_id) is not None
+
+    def create_user(self, user_data: Dict) -> str:
+        """Создает пользователя и сбрасывает его запись в кэше"""
+        try:
+            return super().create_user(user_data)
+        finally:
+            self.users_cache.invalidate(user_data['user_id'])
+
+    def update_user_thread(self, user_id: int, thread_id: str) -> None:
+        """Обновляет thread_id и сбрасывает запись пользователя в кэше"""
+        try:
+            super().update_user_thread(user_id, thread_id)
+        finally:
+            self.users_cache.invalidate(user_id)
+
+    def payment_exists(self, invoice_payload: str) -> bool:
+        """Проверяет существование платежа (с кэшированием отрицательных ответов)"""
+        exists = self.payments_cache.get(invoice_payload)
+        if exists is _MISSING:
+            # Платеж, записанный во время чтения, не должен остаться в кэше как отсутствующий
+            generation = self.payments_cache.generation(invoice_payload)
+            exists = super().payment_exists(invoice_payload)
+            ttl = self.payment_ttl_seconds if exists else self.negative_ttl_seconds
+            self.payments_cache.set(invoice_payload, exists, ttl, generation)
+        return exists
+
+    def save_payment(self, payment_data: Dict) -> None:
+        """Сохраняет платеж и сбрасывает кэш по его payload"""
+        try:
+            super().save_payment(payment_data)
+        finally:
+            self.payments_cache.invalidate(payment_data.get('invoice_payload', ''))
+
+    def update_payment_status(self, invoice_payload: str, status: str) -> None:
+        """Обновляет статус платежа и сбрасывает кэш по его payload"""
+        try:
+            super().update_payment_status(invoice_payload, status)
+        finally:
+            self.payments_cache.invalidate(invoice_payload)
+
+    def ingest_payment(self, payment_data: Dict, user_data: Dict, schedule_data: Dict) -> Optional[int]:
+        """Принимает платеж одной транзакцией и сбрасывает кэш платежа и пользователя"""
+        try:
+            return super().ingest_payment(payment_data, user_data, schedule_data)
+        finally:
+            self.payments_cache.invalidate(payment_data.get('invoice_payload', ''))
+            self.users_cache.invalidate(user_data['user_id'])
+
+    def get_cache_stats(self) -> Dict:
+        """
+        Возвращает счетчики кэша.
+
+        Returns:
+            Dict: Попадания и промахи по пользователям и платежам
+        """
+        return {
+            "users": {"hits": self.users_cache.hits, "misses": self.users_cache.misses,
+                      "size": len(self.users_cache.entries)},
+            "payments": {"hits": self.payments_cache.hits, "misses": self.payments_cache.misses,
+                         "size": len(self.payments_cache.entries)},
+        }
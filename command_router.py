@@ -0,0 +1,78 @@
+"""
+Модуль маршрутизации команд бота
+Первое слово сообщения разбирается один раз (/cmd, /cmd@bot_username), команда ищется в словаре по точному имени
+"""
+
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+
+# handler(user_id, user_name, args) -> ответ (dict с action/reply_text) или корутина, возвращающая его
+CommandCallback = Callable[[int, str, str], Union[Dict, Awaitable[Dict]]]
+
+
+class Command:
+    """Зарегистрированная команда"""
+
+    def __init__(self, name: str, handler: CommandCallback, bypass_debounce: bool = True):
+        self.name = name
+        self.handler = handler
+        self.bypass_debounce = bypass_debounce  # Команды - явные действия пользователя, debounce к ним не применяется
+
+
+class RoutedCommand:
+    """Результат разбора сообщения-команды"""
+
+    def __init__(self, name: str, args: str, command: Optional[Command], foreign: bool):
+        self.name = name
+        self.args = args
+        self.command = command    # None - неизвестная команда
+        self.foreign = foreign    # Команда адресована другому боту (/start@other_bot в группе)
+
+
+class CommandRouter:
+    """
+    Реестр команд.
+    В отличие от цепочки startswith, /timezone не совпадает с /time, а /start@other_bot не считается нашей командой.
+    """
+
+    def __init__(self):
+        self.commands: Dict[str, Command] = {}
+
+    def register(self, name: str, handler: CommandCallback, bypass_debounce: bool = True) -> None:
+        """
+        Регистрирует команду.
+
+        Args:
+            name: Имя без косой черты (латиница в нижнем регистре, цифры и _, как требует Telegram)
+            handler: Обработчик (user_id, user_name, args)
+            bypass_debounce: Обрабатывать команду, даже если пользователь попал под debounce
+        """
+        name = name.lower()
+        if name in self.commands:
+            raise ValueError(f"Команда /{name} уже зарегистрирована")
+        self.commands[name] = Command(name, handler, bypass_debounce)
+
+    def names(self) -> List[str]:
+        """Имена команд (для CommandHandler python-telegram-bot)"""
+        return list(self.commands)
+
+    def route(self, text: Optional[str], bot_username: Optional[str] = None) -> Optional[RoutedCommand]:
+        """
+        Разбирает сообщение.
+
+        Args:
+            text: Текст сообщения
+            bot_username: Имя нашего бота (без @) для команд вида /cmd@bot_username
+
+        Returns:
+            RoutedCommand или None, если сообщение не команда
+        """
+        if not text or text[0] != '/':
+            return None
+        parts = text.split(None, 1)
+        name, _, target = parts[0][1:].partition('@')
+        if not name:
+            return None
+        args = parts[1].strip() if len(parts) > 1 else ""
+        name = name.lower()
+        foreign = bool(target) and bot_username is not None and target.lower() != bot_username.lower()
+        return RoutedCommand(name, args, None if foreign else self.commands.get(name), foreign)
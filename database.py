@@ -1,82 +1,78 @@
 import sqlite3
 import json
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Dict, List, Optional, Tuple
+from migrations import apply_migrations
+from message_codec import encode_message, decode_rows
+from storage import StorageBackend
 
-class DatabaseManager:
+# Запросы горячих путей вынесены в константы: tests/test_query_plans.py проверяет их планы (EXPLAIN QUERY PLAN)
+USER_MESSAGES_SQL = '''
+    SELECT * FROM message_history
+    WHERE user_id = ?
+    ORDER BY timestamp DESC
+    LIMIT ?
+'''
+
+USER_PAYMENTS_SQL = '''
+    SELECT * FROM payments
+    WHERE user_id = ?
+    ORDER BY created_at DESC
+'''
+
+USER_SCHEDULE_SQL = '''
+    SELECT s.*, p.amount, p.currency, p.invoice_payload
+    FROM schedule s
+    LEFT JOIN payments p ON s.payment_id = p.id
+    WHERE s.user_id = ?
+    ORDER BY s.scheduled_datetime DESC
+'''
+
+SCHEDULE_FOR_DATE_SQL = '''
+    SELECT s.*, u.first_name, u.last_name, p.amount, p.currency
+    FROM schedule s
+    LEFT JOIN users u ON s.user_id = u.user_id
+    LEFT JOIN payments p ON s.payment_id = p.id
+    WHERE date(s.scheduled_datetime) = date(?)
+    AND s.status = 'scheduled'
+    ORDER BY s.scheduled_datetime
+'''
+
+# Пересечение: начало занятия < конца интервала и конец занятия > начала интервала.
+# Нижняя граница по starts_at (минус самое длинное занятие) дает поиск по индексу.
+SCHEDULE_CONFLICT_SQL = '''
+    SELECT EXISTS (
+        SELECT 1 FROM schedule
+        WHERE status = 'scheduled'
+        AND starts_at >= ? - (
+            SELECT COALESCE(MAX(duration_minutes), 0) * 60 FROM schedule WHERE status = 'scheduled'
+        )
+        AND starts_at < ?
+        AND ends_at > ?
+    )
+'''
+
+
+class DatabaseManager(StorageBackend):
     """Менеджер базы данных SQLite для хранения пользователей и платежей"""
     
+    # WAL: чтение не ждет запись, коммит - одна запись в журнал вместо копии страниц
+    JOURNAL_MODE = "WAL"
+    
     def __init__(self, db_path: str = "bot_database.db"):
         self.db_path = db_path
         self.init_database()
     
     def init_database(self) -> None:
-        """Инициализация базы данных"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # Таблица пользователей
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    first_name TEXT,
-                    last_name TEXT,
-                    username TEXT,
-                    thread_id TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Таблица платежей
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS payments (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    invoice_payload TEXT UNIQUE,
-                    amount INTEGER,
-                    currency TEXT DEFAULT 'RUB',
-                    status TEXT DEFAULT 'pending',
-                    provider_payment_charge_id TEXT,
-                    telegram_payment_charge_id TEXT,
-                    order_info TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            ''')
-            
-            # Таблица истории сообщений
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS message_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    message_text TEXT,
-                    message_type TEXT DEFAULT 'user',
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            ''')
-            
-            # Таблица расписания занятий
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS schedule (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    payment_id INTEGER,
-                    lesson_type TEXT,
-                    scheduled_datetime TEXT,
-                    duration_minutes INTEGER DEFAULT 120,
-                    status TEXT DEFAULT 'scheduled',
-                    notes TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id),
-                    FOREIGN KEY (payment_id) REFERENCES payments (id)
-                )
-            ''')
-            
-            conn.commit()
+        """Инициализация базы данных: применяет недостающие миграции схемы"""
+        apply_migrations(self.db_path)
+        
+        # Режим журнала хранится в файле базы, поэтому достаточно установить его один раз при запуске
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute(f'PRAGMA journal_mode = {self.JOURNAL_MODE}')
+        finally:
+            conn.close()
     
     def user_exists(self, user_id: int) -> bool:
         """Проверяет существование пользователя"""
@@ -127,13 +123,13 @@ class DatabaseManager:
             conn.commit()
     
     def save_message(self, user_id: int, message_text: str, message_type: str = 'user') -> None:
-        """Сохраняет сообщение в историю"""
+        """Сохраняет сообщение в историю (длинные сообщения - в сжатом виде)"""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                INSERT INTO message_history (user_id, message_text, message_type)
-                VALUES (?, ?, ?)
-            ''', (user_id, message_text, message_type))
+                INSERT INTO message_history (user_id, message_text, message_type, message_length)
+                VALUES (?, ?, ?, ?)
+            ''', (user_id, encode_message(message_text), message_type, len(message_text) if message_text is not None else None))
             conn.commit()
     
     def get_user_messages(self, user_id: int, limit: int = 10) -> List[Dict]:
@@ -141,13 +137,8 @@ class DatabaseManager:
         with sqlite3.connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT * FROM message_history 
-                WHERE user_id = ? 
-                ORDER BY timestamp DESC 
-                LIMIT ?
-            ''', (user_id, limit))
-            return [dict(row) for row in cursor.fetchall()]
+            cursor.execute(USER_MESSAGES_SQL, (user_id, limit))
+            return decode_rows(dict(row) for row in cursor.fetchall())
     
     def save_payment(self, payment_data: Dict) -> None:
         """Сохраняет информацию о платеже"""
@@ -192,13 +183,36 @@ class DatabaseManager:
         with sqlite3.connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT * FROM payments 
-                WHERE user_id = ? 
-                ORDER BY created_at DESC
-            ''', (user_id,))
+            cursor.execute(USER_PAYMENTS_SQL, (user_id,))
             return [dict(row) for row in cursor.fetchall()]
     
+    def get_user_payments_page(self, user_id: int, limit: int = 5,
+                               after: Optional[Tuple[str, int]] = None) -> Tuple[List[Dict], Optional[Tuple[str, int]]]:
+        """Получает страницу платежей пользователя (keyset по created_at, id) и курсор следующей страницы"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            if after is None:
+                cursor.execute('''
+                    SELECT * FROM payments
+                    WHERE user_id = ?
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT ?
+                ''', (user_id, limit + 1))
+            else:
+                cursor.execute('''
+                    SELECT * FROM payments
+                    WHERE user_id = ? AND (created_at, id) < (?, ?)
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT ?
+                ''', (user_id, after[0], after[1], limit + 1))
+            rows = [dict(row) for row in cursor.fetchall()]
+        
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, (rows[-1]['created_at'], rows[-1]['id'])
+    
     def get_payment_by_id(self, payment_id: int) -> Optional[Dict]:
         """Получает платеж по ID"""
         with sqlite3.connect(self.db_path) as conn:
@@ -227,6 +241,83 @@ class DatabaseManager:
             conn.commit()
             return cursor.lastrowid
     
+    def ingest_payment(self, payment_data: Dict, user_data: Dict, schedule_data: Dict) -> Optional[int]:
+        """
+        Принимает успешный платеж одной транзакцией: пользователь, платеж и запись в расписании.
+        
+        Args:
+            payment_data: Данные платежа (как для save_payment)
+            user_data: Данные пользователя (как для create_user), создается если его нет
+            schedule_data: Данные занятия (как для save_schedule)
+        
+        Returns:
+            Optional[int]: ID созданной записи расписания или None, если платеж уже принят
+        """
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            cursor = conn.cursor()
+            # Блокировка записи сразу: параллельные доставки одного платежа выполняются по очереди
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                thread_id = f"thread_{user_data['user_id']}_{int(datetime.now().timestamp())}"
+                cursor.execute('''
+                    INSERT INTO users (user_id, first_name, last_name, username, thread_id)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(user_id) DO NOTHING
+                ''', (
+                    user_data['user_id'],
+                    user_data.get('first_name', ''),
+                    user_data.get('last_name', ''),
+                    user_data.get('username', ''),
+                    thread_id
+                ))
+                
+                cursor.execute('''
+                    INSERT INTO payments (
+                        user_id, invoice_payload, amount, currency, status,
+                        provider_payment_charge_id, telegram_payment_charge_id, order_info
+                    ) VALUES (?, ?, ?, ?, 'completed', ?, ?, ?)
+                    ON CONFLICT(invoice_payload) DO UPDATE SET
+                        status = 'completed',
+                        updated_at = CURRENT_TIMESTAMP
+                ''', (
+                    payment_data['user_id'],
+                    payment_data.get('invoice_payload', ''),
+                    payment_data.get('total_amount', 0),
+                    payment_data.get('currency', 'RUB'),
+                    payment_data.get('provider_payment_charge_id', ''),
+                    payment_data.get('telegram_payment_charge_id', ''),
+                    json.dumps(payment_data.get('order_info', {}))
+                ))
+                cursor.execute('SELECT id FROM payments WHERE invoice_payload = ?',
+                               (payment_data.get('invoice_payload', ''),))
+                payment_id = cursor.fetchone()[0]
+                
+                # Уникальный индекс по payment_id: повторная доставка не создает второе занятие
+                cursor.execute('''
+                    INSERT INTO schedule (user_id, payment_id, lesson_type, scheduled_datetime,
+                                        duration_minutes, status, notes)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(payment_id) WHERE payment_id IS NOT NULL DO NOTHING
+                ''', (
+                    schedule_data['user_id'],
+                    payment_id,
+                    schedule_data['lesson_type'],
+                    schedule_data['scheduled_datetime'],
+                    schedule_data['duration_minutes'],
+                    schedule_data['status'],
+                    schedule_data['notes']
+                ))
+                schedule_id = cursor.lastrowid if cursor.rowcount == 1 else None
+                
+                cursor.execute('COMMIT')
+                return schedule_id
+            except BaseException:
+                cursor.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+    
     def add_schedule_entry(self, user_id: int, payment_id: int, lesson_type: str, 
                           scheduled_datetime: str, duration_minutes: int = 120, notes: str = "") -> int:
         """Добавляет запись в расписание"""
@@ -241,32 +332,73 @@ class DatabaseManager:
             return cursor.lastrowid
     
     def check_schedule_conflict(self, scheduled_datetime: str, duration_minutes: int = 120) -> bool:
-        """Проверяет конфликт расписания"""
+        """Проверяет, пересекается ли интервал с активными занятиями (включая уже идущие)"""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
+            starts_at, ends_at = self._get_interval(cursor, scheduled_datetime, duration_minutes)
+            if starts_at is None:
+                return False
+            
+            cursor.execute(SCHEDULE_CONFLICT_SQL, (starts_at, ends_at, starts_at))
+            return bool(cursor.fetchone()[0])
+    
+    def find_free_slots(self, window_start: str, window_end: str, duration_minutes: int = 120) -> List[Dict]:
+        """Находит свободные промежутки не короче duration_minutes между активными занятиями"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT CAST(strftime('%s', ?) AS INTEGER), CAST(strftime('%s', ?) AS INTEGER)
+            ''', (window_start, window_end))
+            starts_at, ends_at = cursor.fetchone()
+            if starts_at is None or ends_at is None:
+                return []
+            
             cursor.execute('''
-                SELECT COUNT(*) FROM schedule 
-                WHERE status = 'scheduled' 
-                AND datetime(scheduled_datetime) BETWEEN 
-                    datetime(?) AND datetime(?, '+{} minutes')
-            '''.format(duration_minutes), (scheduled_datetime, scheduled_datetime))
-            count = cursor.fetchone()[0]
-            return count > 0
+                SELECT starts_at, ends_at FROM schedule
+                WHERE status = 'scheduled'
+                AND starts_at >= ? - (
+                    SELECT COALESCE(MAX(duration_minutes), 0) * 60 FROM schedule WHERE status = 'scheduled'
+                )
+                AND starts_at < ?
+                AND ends_at > ?
+                ORDER BY starts_at
+            ''', (starts_at, ends_at, starts_at))
+            
+            free_slots = []
+            cursor_time = starts_at
+            for busy_start, busy_end in cursor.fetchall():
+                if busy_start - cursor_time >= duration_minutes * 60:
+                    free_slots.append(self._format_slot(cursor_time, busy_start))
+                cursor_time = max(cursor_time, busy_end)
+            
+            if ends_at - cursor_time >= duration_minutes * 60:
+                free_slots.append(self._format_slot(cursor_time, ends_at))
+            
+            return free_slots
+    
+    @staticmethod
+    def _get_interval(cursor: sqlite3.Cursor, scheduled_datetime: str, duration_minutes: int) -> Tuple[Optional[int], Optional[int]]:
+        """Переводит время начала и длительность в epoch-секунды так же, как триггеры схемы"""
+        cursor.execute("SELECT CAST(strftime('%s', ?) AS INTEGER)", (scheduled_datetime,))
+        starts_at = cursor.fetchone()[0]
+        if starts_at is None:
+            return None, None
+        return starts_at, starts_at + int(duration_minutes) * 60
+    
+    @staticmethod
+    def _format_slot(starts_at: int, ends_at: int) -> Dict:
+        """Форматирует свободный промежуток в строки времени расписания"""
+        return {
+            'start': datetime.fromtimestamp(starts_at, timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+            'end': datetime.fromtimestamp(ends_at, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        }
     
     def get_schedule_for_date(self, date_str: str) -> List[Dict]:
         """Получает расписание на конкретную дату"""
         with sqlite3.connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT s.*, u.first_name, u.last_name, p.amount, p.currency
-                FROM schedule s
-                LEFT JOIN users u ON s.user_id = u.user_id
-                LEFT JOIN payments p ON s.payment_id = p.id
-                WHERE date(s.scheduled_datetime) = date(?)
-                AND s.status = 'scheduled'
-                ORDER BY s.scheduled_datetime
-            ''', (date_str,))
+            cursor.execute(SCHEDULE_FOR_DATE_SQL, (date_str,))
             return [dict(row) for row in cursor.fetchall()]
     
     def get_user_schedule(self, user_id: int) -> List[Dict]:
@@ -274,11 +406,36 @@ class DatabaseManager:
         with sqlite3.connect(self.db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT s.*, p.amount, p.currency, p.invoice_payload
-                FROM schedule s
-                LEFT JOIN payments p ON s.payment_id = p.id
-                WHERE s.user_id = ?
-                ORDER BY s.scheduled_datetime DESC
-            ''', (user_id,))
+            cursor.execute(USER_SCHEDULE_SQL, (user_id,))
             return [dict(row) for row in cursor.fetchall()]
+    
+    def get_user_schedule_page(self, user_id: int, limit: int = 5,
+                               after: Optional[Tuple[str, int]] = None) -> Tuple[List[Dict], Optional[Tuple[str, int]]]:
+        """Получает страницу расписания пользователя (keyset по scheduled_datetime, id) и курсор следующей страницы"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            if after is None:
+                cursor.execute('''
+                    SELECT s.*, p.amount, p.currency, p.invoice_payload
+                    FROM schedule s
+                    LEFT JOIN payments p ON s.payment_id = p.id
+                    WHERE s.user_id = ?
+                    ORDER BY s.scheduled_datetime DESC, s.id DESC
+                    LIMIT ?
+                ''', (user_id, limit + 1))
+            else:
+                cursor.execute('''
+                    SELECT s.*, p.amount, p.currency, p.invoice_payload
+                    FROM schedule s
+                    LEFT JOIN payments p ON s.payment_id = p.id
+                    WHERE s.user_id = ? AND (s.scheduled_datetime, s.id) < (?, ?)
+                    ORDER BY s.scheduled_datetime DESC, s.id DESC
+                    LIMIT ?
+                ''', (user_id, after[0], after[1], limit + 1))
+            rows = [dict(row) for row in cursor.fetchall()]
+        
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, (rows[-1]['scheduled_datetime'], rows[-1]['id'])
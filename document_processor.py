@@ -0,0 +1,373 @@
+"""
+Модуль для обработки документов в отдельных процессах
+Разбор и анализ JSON сценариев и декодирование текстовых файлов не блокируют event loop бота
+"""
+
+import os
+import json
+import signal
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait as wait_futures
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone, timedelta
+from typing import Callable, Dict, Optional, Union
+
+from scenario_graph import ScenarioGraphAnalyzer
+
+# Московский часовой пояс (UTC+3)
+MOSCOW_TZ = timezone(timedelta(hours=3))
+
+# Поддерживаемые текстовые форматы и кодировки (в порядке попыток)
+TEXT_EXTENSIONS = ['.txt', '.py', '.js', '.html', '.css', '.md', '.csv', '.log']
+TEXT_ENCODINGS = ('utf-8', 'cp1251', 'latin1')
+MAX_TEXT_LENGTH = 10000
+
+# Граф потоков данных сценариев (кэш по хешу blueprint, свой в каждом процессе)
+scenario_graph_analyzer = ScenarioGraphAnalyzer()
+
+DocumentSource = Union[str, bytes, bytearray]
+
+
+def get_timestamp():
+    """Возвращает текущее время в формате [HH:MM:SS] по московскому времени"""
+    return datetime.now(MOSCOW_TZ).strftime("[%H:%M:%S]")
+
+
+class DocumentProcessingError(Exception):
+    """Документ не может быть обработан пулом (слишком большой, слишком долгий или пул остановлен)"""
+
+
+def get_document_size(source: DocumentSource) -> int:
+    """Возвращает размер документа в байтах (путь к файлу или содержимое в памяти)"""
+    if isinstance(source, (bytes, bytearray)):
+        return len(source)
+    return os.path.getsize(source)
+
+
+def read_document(source: DocumentSource) -> bytes:
+    """Возвращает содержимое документа (путь к файлу или содержимое в памяти)"""
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def analyze_make_scenario(scenario_data: Dict) -> Dict:
+    """Анализирует JSON сценарий Make.com и возвращает рекомендации"""
+    try:
+        analysis = {
+            "modules_count": 0,
+            "connections_count": 0,
+            "errors": [],
+            "warnings": [],
+            "recommendations": [],
+            "complexity": "low",
+            "modules_details": []
+        }
+        
+        print(f"[{get_timestamp()}] Анализ JSON структуры. Ключи верхнего уровня: {list(scenario_data.keys())}")
+        
+        # Make.com blueprint структура: flow - массив модулей
+        if "flow" in scenario_data and isinstance(scenario_data["flow"], list):
+            all_modules = []
+            
+            def extract_modules_recursive(flow_list, depth=0):
+                """Рекурсивно извлекает все модули включая вложенные в routes"""
+                modules_found = []
+                for module_item in flow_list:
+                    if not isinstance(module_item, dict):
+                        continue
+                    
+                    # Добавляем основной модуль
+                    if "module" in module_item:
+                        modules_found.append(module_item)
+                        
+                        module_type = module_item.get("module", "unknown")
+                        module_id = module_item.get("id", "unknown")
+                        print(f"[{get_timestamp()}] {'  ' * depth}Модуль: ID={module_id}, тип={module_type}")
+                    
+                    # Проверяем routes для вложенных модулей
+                    if "routes" in module_item and isinstance(module_item["routes"], list):
+                        print(f"[{get_timestamp()}] {'  ' * depth}Найдены routes в модуле {module_item.get('id', 'unknown')}")
+                        for route in module_item["routes"]:
+                            if isinstance(route, dict) and "flow" in route:
+                                nested_modules = extract_modules_recursive(route["flow"], depth + 1)
+                                modules_found.extend(nested_modules)
+                
+                return modules_found
+            
+            all_modules = extract_modules_recursive(scenario_data["flow"])
+            analysis["modules_count"] = len(all_modules)
+            
+            print(f"[{get_timestamp()}] Всего найдено {len(all_modules)} модулей (включая вложенные)")
+            
+            # Анализируем каждый модуль
+            for i, module_item in enumerate(all_modules):
+                module_type = module_item.get("module", "unknown")
+                module_id = module_item.get("id", f"ID_{i+1}")
+                version = module_item.get("version", "не указана")
+                
+                # Детали модуля
+                module_detail = {
+                    "id": module_id,
+                    "type": module_type,
+                    "version": version,
+                    "has_parameters": "parameters" in module_item,
+                    "has_mapper": "mapper" in module_item
+                }
+                analysis["modules_details"].append(module_detail)
+                
+                # Проверки на ошибки
+                if not module_item.get("module"):
+                    analysis["errors"].append(f"Модуль {module_id} без указания типа")
+                
+                if "parameters" not in module_item and module_type != "builtin:BasicRouter":
+                    analysis["warnings"].append(f"Модуль {module_id} ({module_type}) без параметров")
+                
+                # Специфичные проверки
+                if "webhook" in module_type.lower() or "watch" in module_type.lower():
+                    params = module_item.get("parameters", {})
+                    if not params.get("hook") and not params.get("__IMTHOOK__"):
+                        analysis["warnings"].append(f"Webhook модуль {module_id} без hook")
+                
+                if "datastore" in module_type.lower():
+                    params = module_item.get("parameters", {})
+                    if not params.get("datastore"):
+                        analysis["warnings"].append(f"DataStore модуль {module_id} без указания хранилища")
+        
+        # Анализируем connections: реальные ссылки {{ID.поле}} между модулями
+        graph = scenario_graph_analyzer.analyze(scenario_data)
+        analysis["connections_count"] = graph["edges_count"]
+        analysis["data_flow"] = graph
+        
+        for reference in graph["dangling_references"]:
+            analysis["errors"].append(f"Модуль {reference['module']} ссылается на несуществующий модуль {reference['reference']}")
+        
+        if graph["cycle_modules"]:
+            analysis["errors"].append(f"Циклические зависимости между модулями: {', '.join(map(str, graph['cycle_modules']))}")
+        
+        for module_id in graph["unused_modules"]:
+            analysis["warnings"].append(f"Модуль {module_id} не связан с другими модулями по данным")
+        
+        # Определяем сложность
+        if analysis["modules_count"] > 20:
+            analysis["complexity"] = "очень высокая"
+        elif analysis["modules_count"] > 10:
+            analysis["complexity"] = "высокая"
+        elif analysis["modules_count"] > 5:
+            analysis["complexity"] = "средняя"
+        else:
+            analysis["complexity"] = "низкая"
+        
+        # Генерируем рекомендации
+        if analysis["modules_count"] == 0:
+            analysis["recommendations"].append("❌ Сценарий пустой - добавьте модули")
+        else:
+            analysis["recommendations"].append(f"✅ Сценарий содержит {analysis['modules_count']} модулей")
+        
+        if analysis["modules_count"] > 15:
+            analysis["recommendations"].append("⚠️ Сложный сценарий - рекомендую разбить на части")
+        
+        if analysis["errors"]:
+            analysis["recommendations"].append("🔴 Найдены критические ошибки - требуют исправления")
+        
+        if analysis["warnings"]:
+            analysis["recommendations"].append(f"🟡 Найдено {len(analysis['warnings'])} предупреждений")
+        
+        if analysis["connections_count"] == 0 and analysis["modules_count"] > 1:
+            analysis["recommendations"].append("🔗 Проверьте соединения между модулями")
+        elif analysis["connections_count"] > 0:
+            analysis["recommendations"].append(f"✅ Настроено {analysis['connections_count']} соединений")
+        
+        if graph["critical_path_depth"] > 1:
+            path = " → ".join(map(str, graph["critical_path"]))
+            analysis["recommendations"].append(f"⛓ Глубина цепочки данных: {graph['critical_path_depth']} ({path})")
+        
+        # Анализ типов модулей
+        module_types = [m["type"] for m in analysis["modules_details"]]
+        unique_types = set(module_types)
+        analysis["recommendations"].append(f"📊 Используется {len(unique_types)} типов модулей: {', '.join(list(unique_types)[:5])}")
+        
+        print(f"[{get_timestamp()}] Результат анализа: {analysis['modules_count']} модулей, {analysis['connections_count']} соединений")
+        
+        return analysis
+        
+    except Exception as e:
+        print(f"[{get_timestamp()}] Ошибка анализа JSON: {e}")
+        import traceback
+        traceback.print_exc()
+        return {
+            "error": f"Ошибка анализа: {str(e)}",
+            "modules_count": 0,
+            "connections_count": 0,
+            "errors": [f"Ошибка парсинга: {str(e)}"],
+            "warnings": [],
+            "recommendations": ["Проверьте структуру JSON файла"],
+            "complexity": "неизвестно"
+        }
+
+
+def analyze_json_document(source: DocumentSource) -> Dict:
+    """Разбирает JSON сценарий и анализирует его (выполняется в процессе пула)"""
+    try:
+        scenario_data = json.loads(read_document(source))
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        return {"error": f"Ошибка в JSON файле: {str(e)}"}
+
+    print(f"[{get_timestamp()}] JSON успешно загружен. Размер данных: {get_document_size(source)} байт")
+
+    if not isinstance(scenario_data, dict):
+        return {"error": "Ошибка в JSON файле: ожидается объект сценария"}
+
+    return {"analysis": analyze_make_scenario(scenario_data)}
+
+
+def decode_text_document(source: DocumentSource) -> str:
+    """Декодирует текстовый файл, перебирая кодировки (выполняется в процессе пула)"""
+    data = read_document(source)
+
+    for encoding in TEXT_ENCODINGS:
+        try:
+            file_content = data.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+
+    # Ограничиваем размер содержимого
+    if len(file_content) > MAX_TEXT_LENGTH:
+        file_content = file_content[:MAX_TEXT_LENGTH] + "\n... (файл обрезан)"
+
+    return file_content
+
+
+def _warm_up() -> int:
+    """Пустая задача для прогрева процессов пула"""
+    return os.getpid()
+
+
+class DocumentProcessingPool:
+    """
+    Пул процессов для CPU-тяжелой обработки документов с лимитами размера и времени.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_file_size: int = 20 * 1024 * 1024,
+                 timeout_seconds: float = 30.0, warm_up_timeout: float = 30.0):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_file_size = max_file_size
+        self.timeout_seconds = timeout_seconds
+        self.warm_up_timeout = warm_up_timeout  # Сколько ждать запуска процессов (spawn импортирует модули заново)
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.worker_pids: Dict[int, set] = {}  # id(executor) -> PID процессов, ответивших на прогрев
+        self.start_lock = threading.Lock()
+        self.async_start_lock: Optional[asyncio.Lock] = None
+
+    def start(self) -> None:
+        """Запускает процессы пула и дожидается их готовности (не дольше warm_up_timeout)"""
+        with self.start_lock:
+            if self.executor is not None:
+                return
+
+            # spawn безопаснее fork в процессе с потоками HTTP клиентов
+            executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            warm_up_jobs = [executor.submit(_warm_up) for _ in range(self.max_workers)]
+            done, not_done = wait_futures(warm_up_jobs, timeout=self.warm_up_timeout)
+            self.worker_pids[id(executor)] = {job.result() for job in done if job.exception() is None}
+            if not_done:
+                # Пул рабочий, задачи дождутся запуска оставшихся процессов
+                print(f"[{get_timestamp()}] Прогрев пула документов не завершился за {self.warm_up_timeout:g} сек")
+            self.executor = executor
+
+    async def _ensure_started(self) -> ProcessPoolExecutor:
+        """Запускает пул в потоке: создание и прогрев spawn-процессов не должны блокировать цикл событий"""
+        if self.executor is not None:
+            return self.executor
+        if self.async_start_lock is None:
+            self.async_start_lock = asyncio.Lock()
+        async with self.async_start_lock:
+            if self.executor is None:
+                await asyncio.get_running_loop().run_in_executor(None, self.start)
+        return self.executor
+
+    def shutdown(self) -> None:
+        """Останавливает пул"""
+        if self.executor is not None:
+            self.worker_pids.pop(id(self.executor), None)
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    async def analyze_json(self, source: DocumentSource) -> Dict:
+        """Анализирует JSON сценарий в пуле"""
+        return await self.run(analyze_json_document, source)
+
+    async def decode_text(self, source: DocumentSource) -> str:
+        """Декодирует текстовый файл в пуле"""
+        return await self.run(decode_text_document, source)
+
+    async def run(self, func: Callable, source: DocumentSource):
+        """
+        Выполняет задачу в пуле с лимитами размера и времени.
+
+        Args:
+            func: Функция уровня модуля, принимающая документ
+            source: Путь к файлу или содержимое документа
+
+        Returns:
+            Результат func
+
+        Raises:
+            DocumentProcessingError: Документ слишком большой, обработка слишком долгая или пул сломан
+        """
+        size = get_document_size(source)
+        if size > self.max_file_size:
+            raise DocumentProcessingError(
+                f"Файл слишком большой ({size // 1024} КБ, максимум {self.max_file_size // 1024} КБ)"
+            )
+
+        # Одна повторная попытка, если пул был перезапущен из-за чужой зависшей задачи
+        for attempt in range(2):
+            executor = await self._ensure_started()
+            job = executor.submit(func, source)
+
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(job), self.timeout_seconds)
+            except asyncio.TimeoutError:
+                self._cancel(job, executor)
+                raise DocumentProcessingError(f"Превышено время обработки файла ({self.timeout_seconds:g} сек)")
+            except asyncio.CancelledError:
+                self._cancel(job, executor)
+                raise
+            except BrokenProcessPool:
+                self._restart(executor)
+                if attempt:
+                    raise DocumentProcessingError("Пул обработки документов недоступен")
+
+    def _cancel(self, job, executor: ProcessPoolExecutor) -> None:
+        """Отменяет задачу; выполняющуюся задачу можно остановить только перезапуском пула"""
+        if not job.cancel() and not job.done():
+            print(f"[{get_timestamp()}] Задача обработки документа зависла, перезапускаем пул")
+            self._restart(executor, terminate=True)
+
+    def _restart(self, executor: ProcessPoolExecutor, terminate: bool = False) -> None:
+        """Заменяет пул новым; старые процессы при необходимости принудительно завершаются"""
+        if self.executor is executor:
+            self.executor = None
+
+        pids = self.worker_pids.pop(id(executor), set())
+        if terminate:
+            # ProcessPoolExecutor не умеет прерывать отдельную задачу и не отдает свои процессы публично.
+            # Процессы, которые пул запустил после прогрева, видны только в приватном _processes
+            # (есть в CPython 3.7+); если его нет, завершаем процессы, известные по прогреву
+            processes = getattr(executor, '_processes', None) or {}
+            pids.update(processes.keys())
+            for pid in pids:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except (ProcessLookupError, PermissionError):
+                    pass
+
+        executor.shutdown(wait=False)
@@ -0,0 +1,241 @@
+"""
+Модуль выгрузки истории сообщений для аналитики
+Читает message_history пачками через fetchmany и пишет JSONL, CSV или Parquet с постоянным расходом памяти
+"""
+
+import os
+import csv
+import json
+import sqlite3
+import argparse
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from message_codec import decode_rows
+
+EXPORT_FORMATS = ("jsonl", "csv", "parquet")
+DEFAULT_BATCH_SIZE = 1000
+
+MESSAGE_COLUMNS = ["id", "user_id", "message_type", "message_text", "timestamp"]
+USER_COLUMNS = ["first_name", "last_name", "username"]
+PAYMENT_COLUMNS = ["payments_count", "payments_total"]
+
+
+class HistoryExporter:
+    """
+    Потоковая выгрузка message_history и дневные сводки.
+    Соединение открывается только на чтение, каждая пачка читается отдельной короткой транзакцией.
+    """
+
+    def __init__(self, db_path: str = "bot_database.db", batch_size: int = DEFAULT_BATCH_SIZE):
+        self.db_path = db_path
+        self.batch_size = batch_size
+
+    def _connect(self) -> sqlite3.Connection:
+        """Открывает соединение только для чтения"""
+        uri = f"file:{os.path.abspath(self.db_path)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def get_columns(join_users: bool = False, join_payments: bool = False) -> List[str]:
+        """Возвращает колонки выгрузки в порядке вывода"""
+        columns = list(MESSAGE_COLUMNS)
+        if join_users:
+            columns += USER_COLUMNS
+        if join_payments:
+            columns += PAYMENT_COLUMNS
+        return columns
+
+    def _build_query(self, join_users: bool, join_payments: bool, user_id: Optional[int],
+                     since: Optional[str], until: Optional[str]) -> Tuple[str, List]:
+        """Строит запрос одной пачки (keyset по id)"""
+        select = ["m.id", "m.user_id", "m.message_type", "m.message_text", "m.timestamp"]
+        joins = []
+        if join_users:
+            select += ["u.first_name", "u.last_name", "u.username"]
+            joins.append("LEFT JOIN users u ON u.user_id = m.user_id")
+        if join_payments:
+            # Один ряд на сообщение: платежи пользователя сворачиваются в агрегаты
+            select += [
+                "(SELECT COUNT(*) FROM payments p WHERE p.user_id = m.user_id AND p.status = 'completed') AS payments_count",
+                "(SELECT COALESCE(SUM(p.amount), 0) FROM payments p WHERE p.user_id = m.user_id AND p.status = 'completed') AS payments_total",
+            ]
+
+        conditions = ["m.id > ?"]
+        params = []
+        if user_id is not None:
+            conditions.append("m.user_id = ?")
+            params.append(user_id)
+        if since is not None:
+            conditions.append("m.timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("m.timestamp < ?")
+            params.append(until)
+
+        query = f'''
+            SELECT {", ".join(select)}
+            FROM message_history m
+            {" ".join(joins)}
+            WHERE {" AND ".join(conditions)}
+            ORDER BY m.id
+            LIMIT ?
+        '''
+        return query, params
+
+    def iter_batches(self, join_users: bool = False, join_payments: bool = False, user_id: Optional[int] = None,
+                     since: Optional[str] = None, until: Optional[str] = None) -> Iterator[List[Dict]]:
+        """
+        Отдает историю сообщений пачками по batch_size строк.
+
+        Args:
+            join_users: Добавить имя и username пользователя
+            join_payments: Добавить число и сумму завершенных платежей пользователя
+            user_id: Только сообщения одного пользователя
+            since: Нижняя граница timestamp (включительно)
+            until: Верхняя граница timestamp (не включительно)
+
+        Returns:
+            Iterator[List[Dict]]: Пачки строк по возрастанию id
+        """
+        query, params = self._build_query(join_users, join_payments, user_id, since, until)
+        last_id = 0
+
+        conn = self._connect()
+        try:
+            while True:
+                # Отдельный запрос на пачку: блокировка чтения не держится, пока потребитель пишет файл
+                cursor = conn.execute(query, [last_id] + params + [self.batch_size])
+                batch = decode_rows(dict(row) for row in cursor.fetchmany(self.batch_size))
+                cursor.close()
+                if not batch:
+                    return
+                last_id = batch[-1]["id"]
+                yield batch
+                if len(batch) < self.batch_size:
+                    return
+        finally:
+            conn.close()
+
+    def export(self, path: str, export_format: str = "jsonl", join_users: bool = False,
+               join_payments: bool = False, user_id: Optional[int] = None,
+               since: Optional[str] = None, until: Optional[str] = None) -> int:
+        """
+        Выгружает историю сообщений в файл.
+
+        Args:
+            path: Путь к файлу выгрузки
+            export_format: jsonl, csv или parquet (нужен pyarrow)
+            join_users, join_payments, user_id, since, until: Как в iter_batches
+
+        Returns:
+            int: Количество выгруженных строк
+        """
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Неизвестный формат выгрузки: {export_format}")
+
+        columns = self.get_columns(join_users, join_payments)
+        batches = self.iter_batches(join_users, join_payments, user_id, since, until)
+
+        if export_format == "parquet":
+            return self._write_parquet(path, columns, batches)
+
+        rows_count = 0
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            if export_format == "csv":
+                writer = csv.DictWriter(f, fieldnames=columns)
+                writer.writeheader()
+                for batch in batches:
+                    writer.writerows(batch)
+                    rows_count += len(batch)
+            else:
+                for batch in batches:
+                    f.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in batch)
+                    rows_count += len(batch)
+        return rows_count
+
+    @staticmethod
+    def _write_parquet(path: str, columns: List[str], batches: Iterator[List[Dict]]) -> int:
+        """Пишет пачки в Parquet по одной группе строк на пачку"""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Для выгрузки в parquet установите пакет pyarrow")
+
+        schema = pa.schema([
+            (column, pa.int64() if column in ("id", "user_id", "payments_count", "payments_total") else pa.string())
+            for column in columns
+        ])
+        rows_count = 0
+        with pq.ParquetWriter(path, schema) as writer:
+            for batch in batches:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                rows_count += len(batch)
+        return rows_count
+
+    def get_daily_stats(self, since: Optional[str] = None, until: Optional[str] = None,
+                        user_id: Optional[int] = None) -> List[Dict]:
+        """
+        Возвращает дневные сводки из message_daily_stats.
+
+        Args:
+            since: Первый день (YYYY-MM-DD, включительно)
+            until: Последний день (YYYY-MM-DD, включительно)
+            user_id: Только один пользователь
+
+        Returns:
+            List[Dict]: day, user_id, message_type, messages_count, total_length, max_length, avg_length
+        """
+        conditions = []
+        params = []
+        if since is not None:
+            conditions.append("day >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("day <= ?")
+            params.append(until)
+        if user_id is not None:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        conn = self._connect()
+        try:
+            cursor = conn.execute(f'''
+                SELECT day, user_id, message_type, messages_count, total_length, max_length,
+                       ROUND(CAST(total_length AS REAL) / messages_count, 1) AS avg_length
+                FROM message_daily_stats
+                {where}
+                ORDER BY day, user_id, message_type
+            ''', params)
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+
+def main():
+    """Выгрузка истории из командной строки"""
+    parser = argparse.ArgumentParser(description="Выгрузка истории сообщений бота")
+    parser.add_argument("output", help="Файл выгрузки")
+    parser.add_argument("--db", default="bot_database.db", help="Путь к базе SQLite")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="jsonl")
+    parser.add_argument("--with-users", action="store_true", help="Добавить данные пользователей")
+    parser.add_argument("--with-payments", action="store_true", help="Добавить агрегаты платежей")
+    parser.add_argument("--user-id", type=int)
+    parser.add_argument("--since", help="Начало периода (YYYY-MM-DD)")
+    parser.add_argument("--until", help="Конец периода, не включительно (YYYY-MM-DD)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    exporter = HistoryExporter(args.db, args.batch_size)
+    rows_count = exporter.export(
+        args.output, args.format, args.with_users, args.with_payments,
+        args.user_id, args.since, args.until
+    )
+    print(f"Выгружено строк: {rows_count} -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
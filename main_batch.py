@@ -1,5 +1,8 @@
 import os
+import hmac
+import atexit
 import time
+import asyncio
 import json
 import threading
 from datetime import datetime
@@ -11,6 +14,11 @@ from flask import Flask, request, jsonify
 from dotenv import load_dotenv
 
 from debounce import DebounceManager
+from update_ingestion import UpdateIngestor, ACCEPTED, DUPLICATE, INVALID, DEFERRED_ACK
+from update_journal import UpdateJournal
+from typing_presence import TypingPresence
+from make_forwarder import MakeForwarder
+from batch_window import AdaptiveBatchWindow
 
 # Загружаем переменные окружения
 load_dotenv()
@@ -21,13 +29,27 @@ ADMIN_CHAT_ID = os.getenv('ADMIN_CHAT_ID')
 DEBOUNCE_SECONDS = int(os.getenv('DEBOUNCE_SECONDS', 4))
 MAX_WAIT_SECONDS = int(os.getenv('MAX_WAIT_SECONDS', 15))
 MAKE_WEBHOOK_URL = os.getenv('MAKE_WEBHOOK_URL')
-BATCH_TIMEOUT = 10  # секунды для батчинга сообщений
+MAKE_OUTBOX_PATH = os.getenv('MAKE_OUTBOX_PATH', 'make_outbox.db')  # Очередь событий для Make на диске
+# 1 - по событию в запросе в прежнем формате; больше - пачки {event_type: batch, events: [...]} (нужен новый сценарий Make)
+MAKE_BATCH_EVENTS = int(os.getenv('MAKE_BATCH_EVENTS', 1))
+MAKE_FLUSH_SECONDS = float(os.getenv('MAKE_FLUSH_SECONDS', 2.0))  # Максимальное ожидание пачки
+MAKE_GZIP = os.getenv('MAKE_GZIP', 'false').lower() == 'true'  # Сценарий должен принимать Content-Encoding: gzip
+MAKE_VERIFY_SSL = os.getenv('MAKE_VERIFY_SSL', 'true').lower() == 'true'
+# Попыток отправки события до статуса dead; 0 - повторять, пока Make не ответит (не чаще раза в 10 минут)
+MAKE_MAX_ATTEMPTS = int(os.getenv('MAKE_MAX_ATTEMPTS', 0))
+BATCH_TIMEOUT = 10  # секунды для батчинга сообщений (верхняя граница адаптивного окна)
+TYPING_SIMULATION_SECONDS = 7  # Сколько показывать набор перед ответом на батч
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')  # secret_token из setWebhook; пусто - без проверки
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', 4))  # Потоки обработки обновлений
+INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', 10000))
+UPDATE_JOURNAL_PATH = os.getenv('UPDATE_JOURNAL_PATH', 'updates_journal.db')  # Пусто - очередь только в памяти
 
 # Глобальное состояние
 last_update_id = 0
-processed_updates: Set[int] = set()
 message_batches = defaultdict(list)  # user_id -> [messages]
+batch_update_ids = defaultdict(list)  # user_id -> [update_id], подтверждаются в журнале после отправки батча
 batch_timers: Dict[int, threading.Timer] = {}
+batch_lock = threading.Lock()  # Батчи меняют потоки-обработчики и таймеры
 paid_invoices: Set[str] = set()
 
 # Инициализация Flask и DebounceManager
@@ -36,27 +58,42 @@ debounce_manager = DebounceManager(
     debounce_seconds=DEBOUNCE_SECONDS,
     max_wait_seconds=MAX_WAIT_SECONDS
 )
+# Окно батча подстраивается под паузы пользователя, но не дольше MAX_WAIT_SECONDS от первого сообщения
+batch_window = AdaptiveBatchWindow(max_window=BATCH_TIMEOUT, max_wait=MAX_WAIT_SECONDS)
+# События для Make.com отправляются пачками в фоне и повторяются при сбоях
+make_forwarder = MakeForwarder(
+    MAKE_WEBHOOK_URL,
+    db_path=MAKE_OUTBOX_PATH,
+    max_batch_events=MAKE_BATCH_EVENTS,
+    flush_interval=MAKE_FLUSH_SECONDS,
+    compress=MAKE_GZIP,
+    verify=MAKE_VERIFY_SSL,
+    max_attempts=MAKE_MAX_ATTEMPTS or None
+)
 
 def get_timestamp() -> str:
     """Возвращает текущее время в формате HH:MM:SS"""
     return datetime.now().strftime("%H:%M:%S")
 
-def send_typing_action(user_id: int, chat_id: int) -> None:
-    """Отправляет действие набора текста в Telegram"""
-    try:
-        url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendChatAction"
-        data = {
-            'chat_id': chat_id,
-            'action': 'typing'
-        }
-        
-        with httpx.Client() as client:
-            response = client.post(url, json=data, timeout=5.0)
-            if response.status_code != 200:
-                print(f"[{get_timestamp()}] Error sending typing action: {response.text}")
-                
-    except Exception as e:
-        print(f"[{get_timestamp()}] Error sending typing action: {e}")
+# Один фоновый цикл событий для индикаторов набора и ответов на батчи вместо потока со sleep на каждый батч
+async_loop = asyncio.new_event_loop()
+async_client: Optional[httpx.AsyncClient] = None  # Создается в async_loop, соединения переиспользуются
+
+async def post_telegram_async(method: str, data: Dict) -> None:
+    """Вызывает метод Bot API из фонового цикла событий"""
+    global async_client
+    if async_client is None:
+        async_client = httpx.AsyncClient(timeout=5.0)
+    
+    response = await async_client.post(f"https://api.telegram.org/bot{BOT_TOKEN}/{method}", json=data)
+    if response.status_code != 200:
+        print(f"[{get_timestamp()}] Error calling {method}: {response.text}")
+
+async def send_chat_action_async(chat_id: int, action: str) -> None:
+    """Отправляет действие (набор текста) в Telegram"""
+    await post_telegram_async('sendChatAction', {'chat_id': chat_id, 'action': action})
+
+typing_presence = TypingPresence(send_chat_action_async)
 
 def send_message_to_user(chat_id: int, text: str, parse_mode: str = 'HTML') -> None:
     """Отправляет сообщение пользователю"""
@@ -76,8 +113,8 @@ def send_message_to_user(chat_id: int, text: str, parse_mode: str = 'HTML') -> N
     except Exception as e:
         print(f"[{get_timestamp()}] Error sending message: {e}")
 
-def send_batch_to_make(user_id: int, messages: List[Dict]) -> None:
-    """Отправляет батч сообщений в Make.com"""
+def send_batch_to_make(user_id: int, messages: List[Dict]) -> bool:
+    """Ставит батч сообщений в очередь отправки в Make.com; False - не удалось записать"""
     try:
         payload = {
             'event_type': 'message_batch',
@@ -87,68 +124,65 @@ def send_batch_to_make(user_id: int, messages: List[Dict]) -> None:
             'timestamp': datetime.now().isoformat()
         }
         
-        with httpx.Client(verify=False) as client:
-            response = client.post(MAKE_WEBHOOK_URL, json=payload, timeout=10.0)
-            print(f"[{get_timestamp()}] Отправлен батч в Make: {len(messages)} сообщений от {user_id}")
+        make_forwarder.enqueue(payload)
+        print(f"[{get_timestamp()}] Батч для Make в очереди: {len(messages)} сообщений от {user_id}")
+        return True
             
     except Exception as e:
         print(f"[{get_timestamp()}] Error sending batch to Make: {e}")
+        return False
+
+async def reply_with_typing(chat_id: int, messages: List[Dict]) -> None:
+    """Показывает набор текста и отвечает на батч"""
+    try:
+        async with typing_presence.typing(chat_id):
+            await asyncio.sleep(TYPING_SIMULATION_SECONDS)
+        
+        # Отправляем ответ (индикатор уже снят)
+        response_text = f"Обработано {len(messages)} сообщений"
+        await post_telegram_async('sendMessage', {'chat_id': chat_id, 'text': response_text, 'parse_mode': 'HTML'})
+        
+    except Exception as e:
+        print(f"[{get_timestamp()}] Error in typing simulation: {e}")
 
 def start_typing_simulation(user_id: int, messages: List[Dict]) -> None:
-    """Эмулирует человеческий набор текста"""
-    def typing_cycle():
-        try:
-            # Первый цикл набора (3 сек)
-            send_typing_action(user_id, messages[0]['chat']['id'])
-            time.sleep(3)
-            
-            # Пауза (2 сек)
-            time.sleep(2)
-            
-            # Второй цикл набора (2 сек)
-            send_typing_action(user_id, messages[0]['chat']['id'])
-            time.sleep(2)
-            
-            # Отправляем ответ
-            response_text = f"Обработано {len(messages)} сообщений"
-            send_message_to_user(messages[0]['chat']['id'], response_text)
-            
-        except Exception as e:
-            print(f"[{get_timestamp()}] Error in typing simulation: {e}")
-    
-    # Запускаем в отдельном потоке
-    typing_thread = threading.Thread(target=typing_cycle, daemon=True)
-    typing_thread.start()
+    """Эмулирует человеческий набор текста в фоновом цикле событий"""
+    asyncio.run_coroutine_threadsafe(reply_with_typing(messages[0]['chat']['id'], messages), async_loop)
 
 def process_batch(user_id: int) -> None:
     """Обрабатывает батч сообщений пользователя"""
-    if user_id in message_batches and message_batches[user_id]:
-        messages = message_batches[user_id].copy()
-        message_batches[user_id].clear()
-        
+    with batch_lock:
+        messages = message_batches.pop(user_id, [])
+        update_ids = batch_update_ids.pop(user_id, [])
+        batch_timers.pop(user_id, None)
+        batch_window.batch_closed(user_id)
+    
+    if messages:
         # Отправляем в Make
-        send_batch_to_make(user_id, messages)
+        if not send_batch_to_make(user_id, messages):
+            # Обновления остаются в журнале и повторятся после перезапуска
+            return
         
         # Эмулируем набор текста
         start_typing_simulation(user_id, messages)
-        
-        # Очищаем таймер
-        if user_id in batch_timers:
-            del batch_timers[user_id]
+    
+    if update_journal is not None:
+        update_journal.ack(update_ids)
 
-def schedule_batch_processing(user_id: int, delay: int = BATCH_TIMEOUT) -> None:
+def schedule_batch_processing(user_id: int, delay: float = BATCH_TIMEOUT) -> None:
     """Планирует обработку батча через указанное время"""
-    # Отменяем предыдущий таймер если есть
-    if user_id in batch_timers:
-        batch_timers[user_id].cancel()
-    
-    # Создаем новый таймер
-    timer = threading.Timer(delay, process_batch, args=[user_id])
-    timer.start()
-    batch_timers[user_id] = timer
+    with batch_lock:
+        # Отменяем предыдущий таймер если есть
+        if user_id in batch_timers:
+            batch_timers[user_id].cancel()
+        
+        # Создаем новый таймер
+        timer = threading.Timer(delay, process_batch, args=[user_id])
+        timer.start()
+        batch_timers[user_id] = timer
 
-def handle_message(message: Dict) -> None:
-    """Обрабатывает входящее сообщение"""
+def handle_message(message: Dict, update_id: Optional[int] = None) -> Optional[str]:
+    """Обрабатывает входящее сообщение; DEFERRED_ACK - обновление подтвердится после отправки батча"""
     user_id = message['from']['id']
     chat_id = message['chat']['id']
     
@@ -158,12 +192,16 @@ def handle_message(message: Dict) -> None:
         return
     
     # Добавляем сообщение в батч
-    message_batches[user_id].append(message)
+    with batch_lock:
+        message_batches[user_id].append(message)
+        if update_id is not None:
+            batch_update_ids[user_id].append(update_id)
     
-    # Планируем обработку батча
-    schedule_batch_processing(user_id)
+    # Планируем обработку батча через окно пользователя
+    schedule_batch_processing(user_id, batch_window.on_message(user_id, time.time()))
     
     print(f"[{get_timestamp()}] Сообщение от {user_id} добавлено в батч")
+    return DEFERRED_ACK
 
 def handle_pre_checkout_query(pre_checkout_query: Dict) -> None:
     """Обрабатывает pre_checkout_query от Telegram Payments"""
@@ -230,31 +268,28 @@ def proxy_to_make(event_type: str, data: Dict) -> None:
             'timestamp': datetime.now().isoformat()
         }
         
-        with httpx.Client(verify=False) as client:
-            response = client.post(MAKE_WEBHOOK_URL, json=payload, timeout=10.0)
-            print(f"[{get_timestamp()}] Проксировано в Make: {event_type}")
+        make_forwarder.enqueue(payload)
+        print(f"[{get_timestamp()}] В очереди для Make: {event_type}")
             
     except Exception as e:
         print(f"[{get_timestamp()}] Error proxying to Make: {e}")
 
-def process_update(update: Dict) -> None:
-    """Обрабатывает обновление от Telegram"""
-    update_id = update.get('update_id', 0)
-    
-    # Проверяем на дублирование
-    if update_id in processed_updates:
-        return
-    
-    processed_updates.add(update_id)
-    
+def process_update(update: Dict) -> Optional[str]:
+    """Обрабатывает обновление от Telegram (вызывается потоками update_ingestor, дубли уже отсечены)"""
     # Определяем тип обновления
     if 'message' in update:
-        handle_message(update['message'])
+        return handle_message(update['message'], update['update_id'])
     elif 'pre_checkout_query' in update:
         handle_pre_checkout_query(update['pre_checkout_query'])
     elif 'successful_payment' in update:
         handle_successful_payment(update['successful_payment'])
 
+# Очередь обновлений с пулом обработчиков: webhook и polling только ставят в нее обновления.
+# Журнал на диске переживает перезапуск: необработанные обновления и неотправленные батчи повторяются
+update_journal = UpdateJournal(UPDATE_JOURNAL_PATH) if UPDATE_JOURNAL_PATH else None
+update_ingestor = UpdateIngestor(process_update, workers=INGEST_WORKERS, max_queue_size=INGEST_QUEUE_SIZE,
+                                 journal=update_journal)
+
 def polling_worker() -> None:
     """Фоновая задача для получения обновлений от Telegram API"""
     global last_update_id
@@ -274,7 +309,11 @@ def polling_worker() -> None:
                 
                 if data.get('ok') and data.get('result'):
                     for update in data['result']:
-                        process_update(update)
+                        if update_ingestor.submit(update) not in (ACCEPTED, DUPLICATE, INVALID):
+                            # Очередь заполнена: не сдвигаем offset, Telegram вернет обновления снова
+                            print(f"[{get_timestamp()}] Update queue is full, pausing polling")
+                            time.sleep(1)
+                            break
                         last_update_id = max(last_update_id, update.get('update_id', 0))
                         
         except Exception as e:
@@ -289,23 +328,54 @@ def health_check():
         'last_update_id': last_update_id,
         'active_batches': len(message_batches),
         'batch_timers': len(batch_timers),
+        'typing_indicators': len(typing_presence.active),
+        'batch_window': batch_window.get_stats(),
         'active_users': debounce_manager.get_active_users_count(),
+        'update_queue_depth': update_ingestor.queue_depth(),
         'timestamp': datetime.now().isoformat()
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Метрики очереди обновлений (глубина, счетчики, задержки) и отправки в Make"""
+    return jsonify({**update_ingestor.get_metrics(), 'make_forwarder': make_forwarder.get_stats()})
+
 @app.route('/webhook', methods=['POST'])
 def webhook():
-    """Webhook endpoint для Telegram"""
-    try:
-        data = request.get_json()
-        if data:
-            process_update(data)
-        return jsonify({'status': 'ok'})
-    except Exception as e:
-        print(f"[{get_timestamp()}] Error in webhook: {e}")
-        return jsonify({'status': 'error', 'message': str(e)}), 500
+    """Webhook endpoint для Telegram: только проверка и постановка в очередь, ответ без ожидания обработки"""
+    if WEBHOOK_SECRET and not hmac.compare_digest(
+        request.headers.get('X-Telegram-Bot-Api-Secret-Token', ''), WEBHOOK_SECRET
+    ):
+        return jsonify({'status': 'forbidden'}), 403
+    
+    status = update_ingestor.submit(request.get_json(silent=True))
+    if status == INVALID:
+        return jsonify({'status': status}), 400
+    if status not in (ACCEPTED, DUPLICATE):
+        # Telegram повторит доставку позже
+        return jsonify({'status': status}), 503
+    return jsonify({'status': status})
 
 if __name__ == '__main__':
+    if update_journal is not None:
+        # Продолжаем polling с последнего записанного обновления
+        last_update_id = update_journal.last_update_id()
+        atexit.register(update_journal.close)
+    
+    # Потоки обработки очереди обновлений (с повтором необработанных из журнала)
+    update_ingestor.start()
+    
+    # Фоновая отправка событий в Make (включая оставшиеся с прошлого запуска).
+    # События, исчерпавшие попытки, возвращаются в очередь: перезапуск обычно следует за исправлением сценария
+    requeued = make_forwarder.requeue_dead()
+    if requeued:
+        print(f"[{get_timestamp()}] Make outbox: {requeued} dead events requeued")
+    make_forwarder.start()
+    atexit.register(make_forwarder.stop)
+    
+    # Цикл событий для индикаторов набора и ответов на батчи
+    threading.Thread(target=async_loop.run_forever, name="async-loop", daemon=True).start()
+    
     # Запуск polling в отдельном потоке
     polling_thread = threading.Thread(target=polling_worker, daemon=True)
     polling_thread.start()
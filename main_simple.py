@@ -1,18 +1,33 @@
 import os
 import json
-import tempfile
+import html
+import secrets
 import asyncio
+import inspect
 import logging
 from datetime import datetime, timezone, timedelta
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Union
+from urllib.parse import urlparse
 from dotenv import load_dotenv
-from telegram import Bot, Update, Message, Document, Audio, Voice
-from telegram.ext import Application, MessageHandler, filters, PreCheckoutQueryHandler
+from telegram import Bot, Update, Message, Document, Audio, Voice, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import Application, CommandHandler, MessageHandler, filters, PreCheckoutQueryHandler, CallbackQueryHandler
+from bot_application import build_application, DEFAULT_CONCURRENT_UPDATES
 from telegram.error import TelegramError
 from debounce import DebounceManager
-from database import DatabaseManager
+from cached_database import CachedDatabaseManager
 from openai_manager import OpenAIManager
 from make_documentation import MakeDocumentationManager
+from document_processor import DocumentProcessingPool, DocumentProcessingError, TEXT_EXTENSIONS
+from media_download import download_media, download_flight
+from transcription_cache import TranscriptionCache
+from speech_synthesizer import SpeechSynthesizer
+from retention import RetentionManager, RetentionPolicy
+from webhook_server import WebhookApp, serve
+from send_scheduler import SendScheduler, PRIORITY_PAYMENT
+from telegram_rate_limiter import TelegramRateLimiter
+from typing_presence import TypingPresence
+from response_templates import ResponseTemplates
+from command_router import CommandRouter
 
 # Настройка логирования
 logging.basicConfig(
@@ -30,6 +45,28 @@ DEBOUNCE_SECONDS = int(os.getenv('DEBOUNCE_SECONDS', 2))  # Уменьшаем 
 MAX_WAIT_SECONDS = int(os.getenv('MAX_WAIT_SECONDS', 15))
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 PROVIDER_TOKEN = os.getenv('PROVIDER_TOKEN')
+DOCUMENT_WORKERS = int(os.getenv('DOCUMENT_WORKERS', os.cpu_count() or 1))
+MAX_DOCUMENT_SIZE = int(os.getenv('MAX_DOCUMENT_SIZE', 20 * 1024 * 1024))  # Лимит Bot API на скачивание
+DOCUMENT_TIMEOUT_SECONDS = float(os.getenv('DOCUMENT_TIMEOUT_SECONDS', 30))
+MEDIA_SPILL_THRESHOLD = int(os.getenv('MEDIA_SPILL_THRESHOLD', 5 * 1024 * 1024))  # Больше - скачиваем на диск
+MEDIA_DOWNLOAD_TIMEOUT_SECONDS = float(os.getenv('MEDIA_DOWNLOAD_TIMEOUT_SECONDS', 60))
+TRANSCRIPTION_CACHE_TTL_DAYS = int(os.getenv('TRANSCRIPTION_CACHE_TTL_DAYS', 30))
+TRANSCRIPTION_CACHE_MAX_ENTRIES = int(os.getenv('TRANSCRIPTION_CACHE_MAX_ENTRIES', 5000))
+HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', 5))  # Записей на странице /payments и /schedule
+USER_CACHE_TTL_SECONDS = int(os.getenv('USER_CACHE_TTL_SECONDS', 300))
+PRE_CHECKOUT_TIMEOUT_SECONDS = float(os.getenv('PRE_CHECKOUT_TIMEOUT_SECONDS', 8))  # Telegram ждет ответ 10 секунд
+RETENTION_KEEP_MESSAGES = int(os.getenv('RETENTION_KEEP_MESSAGES', 200))  # Последние сообщения пользователя в истории
+RETENTION_MIN_AGE_DAYS = int(os.getenv('RETENTION_MIN_AGE_DAYS', 30))
+RETENTION_INTERVAL_HOURS = float(os.getenv('RETENTION_INTERVAL_HOURS', 6))  # 0 - архивирование выключено
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # Публичный https-адрес webhook; если не задан - long polling
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or secrets.token_urlsafe(32)
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8080))
+POLL_INTERVAL = float(os.getenv('POLL_INTERVAL', 3.0))
+DROP_PENDING_UPDATES = os.getenv('DROP_PENDING_UPDATES', 'false').lower() == 'true'  # true - отбрасывать накопившиеся при старте
+SEND_GLOBAL_RATE = float(os.getenv('SEND_GLOBAL_RATE', 30))  # Исходящих запросов в секунду на бота
+SEND_PER_CHAT_RATE = float(os.getenv('SEND_PER_CHAT_RATE', 1))  # Сообщений в секунду в один чат
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', DEFAULT_CONCURRENT_UPDATES))  # Обновлений в обработке одновременно
 
 # Московский часовой пояс (UTC+3)
 MOSCOW_TZ = timezone(timedelta(hours=3))
@@ -42,58 +79,168 @@ def get_moscow_datetime():
     """Возвращает текущее московское время"""
     return datetime.now(MOSCOW_TZ)
 
-def handle_payments_command(user_id: int, user_name: str) -> Dict:
-    """Обрабатывает команду /payments - показывает историю платежей"""
+DIVIDER = "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
+
+# Тексты статических команд; {user_name} подставляется при ответе (с HTML-экранированием)
+START_TEXT = """
+🤖 <b>Добро пожаловать в Make.com Помощник!</b>
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+Привет, {user_name}! Я ваш персональный эксперт по платформе Make.com.
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+🚀 <b>Что я умею:</b>
+• 📚 Отвечать на вопросы по Make.com
+• 🔍 Анализировать ваши сценарии
+• 💰 Принимать платежи за обучение
+• 📅 Планировать индивидуальные занятия
+• 🎤 Обрабатывать голосовые сообщения
+• 📄 Читать и анализировать документы
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+📋 <b>Основные команды:</b>
+• /start - запуск помощника
+• /help - подробная справка
+• /docs &lt;запрос&gt; - поиск документации
+• /payments - история платежей
+• /schedule - ваше расписание
+• /time - московское время
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+💡 <b>Для сложных задач</b> я предложу индивидуальные занятия с экспертом!
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+Отправьте мне любой вопрос по Make.com или загрузите сценарий для анализа.
+"""
+
+HELP_TEXT = """
+🤖 <b>Make.com Помощник - Справка</b>
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+📋 <b>Основные команды:</b>
+• `/start` - запуск помощника
+• `/help` - эта справка  
+• `/docs <запрос>` - поиск документации
+• `/payments` - история платежей
+• `/schedule` - ваше расписание
+• `/time` - московское время
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+🚀 <b>Возможности бота:</b>
+• 📚 Ответы на вопросы по Make.com
+• 🔍 Анализ ваших сценариев
+• 💰 Система платежей
+• 📅 Планирование занятий
+• 🎤 Голосовые сообщения
+• 📄 Обработка документов
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+💡 <b>Для сложных задач</b> бот предложит индивидуальные занятия с экспертом!
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+💰 <b>Пакеты обучения:</b>
+• 1 занятие (2 часа) - 10,000₽
+• 3 занятия - 25,000₽  
+• Месяц обучения - 60,000₽
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+
+def render_docs_categories() -> str:
+    """Текст /docs без запроса: список категорий документации"""
+    lines = ["📚 <b>Документация Make.com</b>", "", "Доступные категории:"]
+    lines.extend(f"• {html.escape(category)}" for category in make_docs_manager.get_categories())
+    lines.extend(["", "Используйте: /docs &lt;запрос&gt; для поиска"])
+    return "\n".join(lines)
+
+# Готовые ответы команд: строятся один раз при запуске, /docs - заново после изменения документации
+response_templates = ResponseTemplates()
+response_templates.register("start", lambda: START_TEXT, fields=("user_name",))
+response_templates.register("help", lambda: HELP_TEXT)
+response_templates.register("docs_categories", render_docs_categories, depends_on=("docs",))
+
+def build_pager_keyboard(kind: str, next_number: int, next_cursor: Optional[tuple], is_first_page: bool) -> Optional[InlineKeyboardMarkup]:
+    """Строит клавиатуру листания; курсор следующей страницы передается в callback_data"""
+    buttons = []
+    if not is_first_page:
+        buttons.append(InlineKeyboardButton("⏮ В начало", callback_data=f"{kind}|1"))
+    if next_cursor:
+        buttons.append(InlineKeyboardButton("Далее ▶", callback_data=f"{kind}|{next_number}|{next_cursor[0]}|{next_cursor[1]}"))
+    return InlineKeyboardMarkup([buttons]) if buttons else None
+
+def parse_pager_callback(data: str) -> tuple:
+    """Разбирает callback_data листания: (тип, номер первой записи, курсор или None)"""
+    parts = data.split("|")
+    kind, start_number = parts[0], int(parts[1])
+    after = (parts[2], int(parts[3])) if len(parts) == 4 else None
+    return kind, start_number, after
+
+def handle_payments_command(user_id: int, user_name: str, start_number: int = 1, after: Optional[tuple] = None) -> Dict:
+    """Обрабатывает команду /payments - показывает историю платежей постранично"""
     try:
-        payments = db_manager.get_user_payments(user_id)
+        payments, next_cursor = db_manager.get_user_payments_page(user_id, HISTORY_PAGE_SIZE, after)
         
         if not payments:
             return {"action": "reply", "reply_text": "💳 <b>История платежей</b>\n\nУ вас пока нет платежей.", "cta": None, "price": None}
         
-        response_text = "💳 <b>История платежей</b>\n"
-        response_text += "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
+        lines = ["💳 <b>История платежей</b>", DIVIDER, ""]
         
-        for i, payment in enumerate(payments, 1):
+        for i, payment in enumerate(payments, start_number):
             status_emoji = "✅" if payment['status'] == 'completed' else "⏳" if payment['status'] == 'pending' else "❌"
-            response_text += f"<b>Платеж #{i}</b>\n"
-            response_text += f"• {status_emoji} Сумма: {payment['amount']} {payment['currency']}\n"
-            response_text += f"• 📦 Пакет: {payment['invoice_payload']}\n"
-            response_text += f"• 📅 Дата: {payment['created_at']}\n"
-            response_text += f"• 🔄 Статус: {payment['status']}\n\n"
+            lines.extend((
+                f"<b>Платеж #{i}</b>",
+                f"• {status_emoji} Сумма: {payment['amount']} {payment['currency']}",
+                f"• 📦 Пакет: {payment['invoice_payload']}",
+                f"• 📅 Дата: {payment['created_at']}",
+                f"• 🔄 Статус: {payment['status']}",
+                "",
+            ))
         
-        response_text += "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
+        lines.append(DIVIDER)
         
-        return {"action": "reply", "reply_text": response_text, "cta": None, "price": None}
+        keyboard = build_pager_keyboard("payments", start_number + len(payments), next_cursor, after is None)
+        return {"action": "reply", "reply_text": "\n".join(lines), "cta": None, "price": None, "reply_markup": keyboard}
         
     except Exception as e:
         print(f"[{get_timestamp()}] Error in payments command: {e}")
         return {"action": "reply", "reply_text": "❌ Ошибка при получении истории платежей.", "cta": None, "price": None}
 
-def handle_schedule_command(user_id: int, user_name: str) -> Dict:
-    """Обрабатывает команду /schedule - показывает расписание"""
+def handle_schedule_command(user_id: int, user_name: str, start_number: int = 1, after: Optional[tuple] = None) -> Dict:
+    """Обрабатывает команду /schedule - показывает расписание постранично"""
     try:
-        schedule = db_manager.get_user_schedule(user_id)
+        schedule, next_cursor = db_manager.get_user_schedule_page(user_id, HISTORY_PAGE_SIZE, after)
         
         if not schedule:
             return {"action": "reply", "reply_text": "📅 <b>Ваше расписание</b>\n\nУ вас пока нет записей в расписании.", "cta": None, "price": None}
         
-        response_text = "📅 <b>Ваше расписание</b>\n"
-        response_text += "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
+        lines = ["📅 <b>Ваше расписание</b>", DIVIDER, ""]
         
-        for i, entry in enumerate(schedule, 1):
+        for i, entry in enumerate(schedule, start_number):
             status_emoji = "📚" if entry['status'] == 'scheduled' else "✅" if entry['status'] == 'completed' else "❌"
-            response_text += f"<b>Занятие #{i}</b>\n"
-            response_text += f"• {status_emoji} Тип: {entry['lesson_type']}\n"
-            response_text += f"• 🕐 Время: {entry['scheduled_datetime']}\n"
-            response_text += f"• ⏱️ Длительность: {entry['duration_minutes']} мин\n"
-            response_text += f"• 💰 Оплачено: {entry['amount']} {entry['currency']}\n"
+            lines.extend((
+                f"<b>Занятие #{i}</b>",
+                f"• {status_emoji} Тип: {entry['lesson_type']}",
+                f"• 🕐 Время: {entry['scheduled_datetime']}",
+                f"• ⏱️ Длительность: {entry['duration_minutes']} мин",
+                f"• 💰 Оплачено: {entry['amount']} {entry['currency']}",
+            ))
             if entry['notes']:
-                response_text += f"• 📝 Заметки: {entry['notes']}\n"
-            response_text += "\n"
+                lines.append(f"• 📝 Заметки: {entry['notes']}")
+            lines.append("")
         
-        response_text += "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
+        lines.append(DIVIDER)
         
-        return {"action": "reply", "reply_text": response_text, "cta": None, "price": None}
+        keyboard = build_pager_keyboard("schedule", start_number + len(schedule), next_cursor, after is None)
+        return {"action": "reply", "reply_text": "\n".join(lines), "cta": None, "price": None, "reply_markup": keyboard}
         
     except Exception as e:
         print(f"[{get_timestamp()}] Error in schedule command: {e}")
@@ -103,13 +250,8 @@ def handle_docs_command(user_id: int, user_name: str, query: str = "") -> Dict:
     """Обрабатывает команду /docs - поиск по документации Make.com"""
     try:
         if not query:
-            categories = make_docs_manager.get_categories()
-            response_text = "📚 <b>Документация Make.com</b>\n\n"
-            response_text += "Доступные категории:\n"
-            for category in categories:
-                response_text += f"• {category}\n"
-            response_text += "\nИспользуйте: /docs &lt;запрос&gt; для поиска"
-            return {"action": "reply", "reply_text": response_text, "cta": None, "price": None}
+            # Список категорий готов заранее и перестраивается только при изменении документации
+            return {"action": "reply", "reply_text": response_templates.format("docs_categories"), "cta": None, "price": None}
         
         # Ищем в документации
         docs_results = make_docs_manager.search_documentation(query, limit=3)
@@ -141,82 +283,11 @@ def handle_docs_command(user_id: int, user_name: str, query: str = "") -> Dict:
 
 def handle_help_command(user_id: int, user_name: str) -> Dict:
     """Обрабатывает команду /help - показывает справку"""
-    help_text = """
-🤖 <b>Make.com Помощник - Справка</b>
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-📋 <b>Основные команды:</b>
-• `/start` - запуск помощника
-• `/help` - эта справка  
-• `/docs <запрос>` - поиск документации
-• `/payments` - история платежей
-• `/schedule` - ваше расписание
-• `/time` - московское время
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-🚀 <b>Возможности бота:</b>
-• 📚 Ответы на вопросы по Make.com
-• 🔍 Анализ ваших сценариев
-• 💰 Система платежей
-• 📅 Планирование занятий
-• 🎤 Голосовые сообщения
-• 📄 Обработка документов
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-💡 <b>Для сложных задач</b> бот предложит индивидуальные занятия с экспертом!
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-💰 <b>Пакеты обучения:</b>
-• 1 занятие (2 часа) - 10,000₽
-• 3 занятия - 25,000₽  
-• Месяц обучения - 60,000₽
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-"""
-    return {"action": "reply", "reply_text": help_text, "cta": None, "price": None}
+    return {"action": "reply", "reply_text": response_templates.format("help"), "cta": None, "price": None}
 
 def handle_start_command(user_id: int, user_name: str) -> Dict:
     """Обрабатывает команду /start - приветствие и краткая справка"""
-    welcome_text = f"""
-🤖 <b>Добро пожаловать в Make.com Помощник!</b>
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-Привет, {user_name}! Я ваш персональный эксперт по платформе Make.com.
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-🚀 <b>Что я умею:</b>
-• 📚 Отвечать на вопросы по Make.com
-• 🔍 Анализировать ваши сценарии
-• 💰 Принимать платежи за обучение
-• 📅 Планировать индивидуальные занятия
-• 🎤 Обрабатывать голосовые сообщения
-• 📄 Читать и анализировать документы
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-📋 <b>Основные команды:</b>
-• /start - запуск помощника
-• /help - подробная справка
-• /docs &lt;запрос&gt; - поиск документации
-• /payments - история платежей
-• /schedule - ваше расписание
-• /time - московское время
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-💡 <b>Для сложных задач</b> я предложу индивидуальные занятия с экспертом!
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-Отправьте мне любой вопрос по Make.com или загрузите сценарий для анализа.
-"""
-    return {"action": "reply", "reply_text": welcome_text, "cta": None, "price": None}
+    return {"action": "reply", "reply_text": response_templates.format("start", user_name=user_name), "cta": None, "price": None}
 
 def handle_time_command() -> Dict:
     moscow_time = get_moscow_datetime()
@@ -235,153 +306,21 @@ def handle_time_command() -> Dict:
     
     return {"action": "reply", "reply_text": response_text, "cta": None, "price": None}
 
-def analyze_make_scenario(scenario_data: Dict) -> Dict:
-    """Анализирует JSON сценарий Make.com и возвращает рекомендации"""
-    try:
-        analysis = {
-            "modules_count": 0,
-            "connections_count": 0,
-            "errors": [],
-            "warnings": [],
-            "recommendations": [],
-            "complexity": "low",
-            "modules_details": []
-        }
-        
-        print(f"[{get_timestamp()}] Анализ JSON структуры. Ключи верхнего уровня: {list(scenario_data.keys())}")
-        
-        # Make.com blueprint структура: flow - массив модулей
-        if "flow" in scenario_data and isinstance(scenario_data["flow"], list):
-            all_modules = []
-            
-            def extract_modules_recursive(flow_list, depth=0):
-                """Рекурсивно извлекает все модули включая вложенные в routes"""
-                modules_found = []
-                for module_item in flow_list:
-                    if not isinstance(module_item, dict):
-                        continue
-                    
-                    # Добавляем основной модуль
-                    if "module" in module_item:
-                        modules_found.append(module_item)
-                        
-                        module_type = module_item.get("module", "unknown")
-                        module_id = module_item.get("id", "unknown")
-                        print(f"[{get_timestamp()}] {'  ' * depth}Модуль: ID={module_id}, тип={module_type}")
-                    
-                    # Проверяем routes для вложенных модулей
-                    if "routes" in module_item and isinstance(module_item["routes"], list):
-                        print(f"[{get_timestamp()}] {'  ' * depth}Найдены routes в модуле {module_item.get('id', 'unknown')}")
-                        for route in module_item["routes"]:
-                            if isinstance(route, dict) and "flow" in route:
-                                nested_modules = extract_modules_recursive(route["flow"], depth + 1)
-                                modules_found.extend(nested_modules)
-                
-                return modules_found
-            
-            all_modules = extract_modules_recursive(scenario_data["flow"])
-            analysis["modules_count"] = len(all_modules)
-            
-            print(f"[{get_timestamp()}] Всего найдено {len(all_modules)} модулей (включая вложенные)")
-            
-            # Анализируем каждый модуль
-            for i, module_item in enumerate(all_modules):
-                module_type = module_item.get("module", "unknown")
-                module_id = module_item.get("id", f"ID_{i+1}")
-                version = module_item.get("version", "не указана")
-                
-                # Детали модуля
-                module_detail = {
-                    "id": module_id,
-                    "type": module_type,
-                    "version": version,
-                    "has_parameters": "parameters" in module_item,
-                    "has_mapper": "mapper" in module_item
-                }
-                analysis["modules_details"].append(module_detail)
-                
-                # Проверки на ошибки
-                if not module_item.get("module"):
-                    analysis["errors"].append(f"Модуль {module_id} без указания типа")
-                
-                if "parameters" not in module_item and module_type != "builtin:BasicRouter":
-                    analysis["warnings"].append(f"Модуль {module_id} ({module_type}) без параметров")
-                
-                # Специфичные проверки
-                if "webhook" in module_type.lower() or "watch" in module_type.lower():
-                    params = module_item.get("parameters", {})
-                    if not params.get("hook") and not params.get("__IMTHOOK__"):
-                        analysis["warnings"].append(f"Webhook модуль {module_id} без hook")
-                
-                if "datastore" in module_type.lower():
-                    params = module_item.get("parameters", {})
-                    if not params.get("datastore"):
-                        analysis["warnings"].append(f"DataStore модуль {module_id} без указания хранилища")
-        
-        # Анализируем connections (соединения между модулями)
-        connections_found = 0
-        
-        # Проверяем mapper во всех найденных модулях
-        for module_item in all_modules:
-            if isinstance(module_item, dict) and "mapper" in module_item:
-                mapper = module_item["mapper"]
-                if isinstance(mapper, dict) and mapper:
-                    connections_found += len(mapper)
-        
-        analysis["connections_count"] = connections_found
-        
-        # Определяем сложность
-        if analysis["modules_count"] > 20:
-            analysis["complexity"] = "очень высокая"
-        elif analysis["modules_count"] > 10:
-            analysis["complexity"] = "высокая"
-        elif analysis["modules_count"] > 5:
-            analysis["complexity"] = "средняя"
-        else:
-            analysis["complexity"] = "низкая"
-        
-        # Генерируем рекомендации
-        if analysis["modules_count"] == 0:
-            analysis["recommendations"].append("❌ Сценарий пустой - добавьте модули")
-        else:
-            analysis["recommendations"].append(f"✅ Сценарий содержит {analysis['modules_count']} модулей")
-        
-        if analysis["modules_count"] > 15:
-            analysis["recommendations"].append("⚠️ Сложный сценарий - рекомендую разбить на части")
-        
-        if analysis["errors"]:
-            analysis["recommendations"].append("🔴 Найдены критические ошибки - требуют исправления")
-        
-        if analysis["warnings"]:
-            analysis["recommendations"].append(f"🟡 Найдено {len(analysis['warnings'])} предупреждений")
-        
-        if analysis["connections_count"] == 0 and analysis["modules_count"] > 1:
-            analysis["recommendations"].append("🔗 Проверьте соединения между модулями")
-        elif analysis["connections_count"] > 0:
-            analysis["recommendations"].append(f"✅ Настроено {analysis['connections_count']} соединений")
-        
-        # Анализ типов модулей
-        module_types = [m["type"] for m in analysis["modules_details"]]
-        unique_types = set(module_types)
-        analysis["recommendations"].append(f"📊 Используется {len(unique_types)} типов модулей: {', '.join(list(unique_types)[:5])}")
-        
-        print(f"[{get_timestamp()}] Результат анализа: {analysis['modules_count']} модулей, {analysis['connections_count']} соединений")
-        
-        return analysis
-        
-    except Exception as e:
-        print(f"[{get_timestamp()}] Ошибка анализа JSON: {e}")
-        import traceback
-        traceback.print_exc()
-        return {
-            "error": f"Ошибка анализа: {str(e)}",
-            "modules_count": 0,
-            "connections_count": 0,
-            "errors": [f"Ошибка парсинга: {str(e)}"],
-            "warnings": [],
-            "recommendations": ["Проверьте структуру JSON файла"],
-            "complexity": "неизвестно"
-        }
+async def run_docs_command(user_id: int, user_name: str, query: str) -> Dict:
+    """/docs: список категорий готов заранее, поиск в SQLite - в потоке"""
+    if not query:
+        return handle_docs_command(user_id, user_name)
+    # Одинаковые одновременные запросы объединяются в make_docs_manager
+    return await asyncio.get_running_loop().run_in_executor(None, handle_docs_command, user_id, user_name, query)
+
+# Команды бота: имя -> обработчик (user_id, user_name, аргументы)
+command_router = CommandRouter()
+command_router.register("start", lambda user_id, user_name, args: handle_start_command(user_id, user_name))
+command_router.register("help", lambda user_id, user_name, args: handle_help_command(user_id, user_name))
+command_router.register("docs", run_docs_command)
+command_router.register("payments", lambda user_id, user_name, args: handle_payments_command(user_id, user_name))
+command_router.register("schedule", lambda user_id, user_name, args: handle_schedule_command(user_id, user_name))
+command_router.register("time", lambda user_id, user_name, args: handle_time_command())
 
 def process_message_with_ai(user_id: int, message_text: str, user_name: str = None) -> Dict:
     """Обрабатывает сообщение через OpenAI"""
@@ -402,11 +341,12 @@ def process_message_with_ai(user_id: int, message_text: str, user_name: str = No
         print(f"[{get_timestamp()}] Error processing message with AI: {e}")
         return {"action": "reply", "reply_text": "Произошла ошибка при обработке запроса.", "cta": None, "price": None}
 
-def process_audio_message(user_id: int, audio_file_path: str, user_name: str = None) -> Dict:
-    """Обрабатывает аудио сообщение"""
+def process_audio_message(user_id: int, audio: Union[str, bytes], user_name: str = None, filename: str = "audio.ogg",
+                          file_unique_id: str = None, duration: int = None) -> Dict:
+    """Обрабатывает аудио сообщение (путь к файлу или байты в памяти)"""
     try:
-        # Транскрибируем аудио
-        transcript = openai_manager.transcribe_audio(audio_file_path)
+        # Транскрибируем аудио (повторные файлы берутся из кэша)
+        transcript = openai_manager.transcribe_audio(audio, filename, file_unique_id, duration)
         
         if transcript and transcript != "Ошибка при транскрибировании аудио":
             # Сохраняем транскрипт в историю
@@ -427,26 +367,22 @@ def process_audio_message(user_id: int, audio_file_path: str, user_name: str = N
         print(f"[{get_timestamp()}] Error processing audio: {e}")
         return {"action": "reply", "reply_text": "Ошибка при обработке аудио.", "cta": None, "price": None}
 
-def process_document_message(user_id: int, document_path: str, user_name: str = None, original_filename: str = None) -> Dict:
-    """Обрабатывает документ (JSON сценарии Make.com и другие файлы)"""
+async def process_document_message(user_id: int, document: Union[str, bytes], user_name: str = None, original_filename: str = None) -> Dict:
+    """Обрабатывает документ (JSON сценарии Make.com и другие файлы) в пуле процессов"""
     try:
-        file_extension = os.path.splitext(document_path)[1].lower()
-        filename = original_filename or os.path.basename(document_path)
+        filename = original_filename or (os.path.basename(document) if isinstance(document, str) else "document")
+        file_extension = os.path.splitext(filename)[1].lower() or '.txt'
         
         print(f"[{get_timestamp()}] Обрабатываем файл: {filename} (расширение: {file_extension})")
         
         # Обрабатываем JSON файлы (сценарии Make.com)
         if file_extension == '.json':
-            # Читаем и парсим JSON
-            with open(document_path, 'r', encoding='utf-8') as f:
-                try:
-                    scenario_data = json.load(f)
-                    print(f"[{get_timestamp()}] JSON успешно загружен. Размер данных: {len(str(scenario_data))} символов")
-                except json.JSONDecodeError as e:
-                    return {"action": "reply", "reply_text": f"Ошибка в JSON файле: {str(e)}", "cta": None, "price": None}
+            # Парсим и анализируем JSON в пуле процессов
+            result = await document_pool.analyze_json(document)
+            if "error" in result:
+                return {"action": "reply", "reply_text": result["error"], "cta": None, "price": None}
             
-            # Анализируем сценарий
-            analysis = analyze_make_scenario(scenario_data)
+            analysis = result["analysis"]
             
             print(f"[{get_timestamp()}] Анализ завершен: {analysis}")
             
@@ -480,22 +416,9 @@ def process_document_message(user_id: int, document_path: str, user_name: str =
             return {"action": "reply", "reply_text": response_text, "cta": None, "price": None}
         
         # Обрабатываем текстовые файлы
-        elif file_extension in ['.txt', '.py', '.js', '.html', '.css', '.md', '.csv', '.log']:
-            try:
-                with open(document_path, 'r', encoding='utf-8') as f:
-                    file_content = f.read()
-            except UnicodeDecodeError:
-                # Пробуем другие кодировки
-                try:
-                    with open(document_path, 'r', encoding='cp1251') as f:
-                        file_content = f.read()
-                except UnicodeDecodeError:
-                    with open(document_path, 'r', encoding='latin1') as f:
-                        file_content = f.read()
-            
-            # Ограничиваем размер содержимого
-            if len(file_content) > 10000:
-                file_content = file_content[:10000] + "\n... (файл обрезан)"
+        elif file_extension in TEXT_EXTENSIONS:
+            # Декодируем файл в пуле процессов (перебор кодировок и обрезка)
+            file_content = await document_pool.decode_text(document)
             
             # Сохраняем в историю
             db_manager.save_message(user_id, f"[ФАЙЛ {filename}] {file_content[:500]}...", 'user')
@@ -507,6 +430,9 @@ def process_document_message(user_id: int, document_path: str, user_name: str =
             # Неподдерживаемый тип файла
             return {"action": "reply", "reply_text": f"📄 Получен файл {filename} ({file_extension})\n\nЭтот тип файла не поддерживается для чтения. Поддерживаемые форматы: .txt, .py, .js, .html, .css, .md, .csv, .log", "cta": None, "price": None}
         
+    except DocumentProcessingError as e:
+        print(f"[{get_timestamp()}] Document rejected by pool: {e}")
+        return {"action": "reply", "reply_text": f"⚠️ {str(e)}", "cta": None, "price": None}
     except Exception as e:
         print(f"[{get_timestamp()}] Error processing document: {e}")
         return {"action": "reply", "reply_text": f"Ошибка при обработке файла: {str(e)}", "cta": None, "price": None}
@@ -524,85 +450,64 @@ async def handle_message(update: Update, context):
             
             print(f"[{get_timestamp()}] Обрабатываем сообщение от {user_id}: {message.text or '[медиа]'}...")
             
-            # Проверяем debounce только для обычных сообщений, не для команд
-            is_command = message.text and any(message.text.lower().startswith(cmd) for cmd in ('/start', '/help', '/docs', '/payments', '/schedule', '/time'))
+            # Первое слово разбирается один раз; debounce не применяется к командам, объявившим bypass_debounce
+            routed = command_router.route(message.text, context.bot.username)
+            if routed is not None and routed.foreign:
+                return
+            command = routed.command if routed is not None else None
             
-            if not is_command and debounce_manager.is_debounced(user_id):
+            if not (command and command.bypass_debounce) and debounce_manager.is_debounced(user_id):
                 print(f"[{get_timestamp()}] Сообщение от {user_id} заблокировано debounce")
                 return
             
-            # Отправляем индикатор набора
-            try:
-                await context.bot.send_chat_action(chat_id=user_id, action="typing")
-            except Exception as e:
-                print(f"[{get_timestamp()}] Error sending chat action: {e}")
-            
-            # Обрабатываем разные типы сообщений
-            if message.text:
-                # Проверяем специальные команды
-                if message.text.lower().startswith('/start'):
-                    response = handle_start_command(user_id, user_name)
-                elif message.text.lower().startswith('/help'):
-                    response = handle_help_command(user_id, user_name)
-                elif message.text.lower().startswith('/docs'):
-                    # Извлекаем запрос после /docs
-                    query = message.text[5:].strip() if len(message.text) > 5 else ""
-                    response = handle_docs_command(user_id, user_name, query)
-                elif message.text.lower().startswith('/payments'):
-                    response = handle_payments_command(user_id, user_name)
-                elif message.text.lower().startswith('/schedule'):
-                    response = handle_schedule_command(user_id, user_name)
-                elif message.text.lower().startswith('/time'):
-                    response = handle_time_command()
-                else:
-                    # Обычное текстовое сообщение
-                    response = process_message_with_ai(user_id, message.text, user_name)
-                
-            elif message.voice:
-                # Голосовое сообщение
-                file = await message.voice.get_file()
-                
-                # Создаем временный файл
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.ogg') as temp_file:
-                    await file.download_to_drive(temp_file.name)
-                    temp_file_path = temp_file.name
-                
-                response = process_audio_message(user_id, temp_file_path, user_name)
-                os.unlink(temp_file_path)  # Удаляем временный файл
+            # Индикатор набора обновляется, пока готовится ответ, и гаснет перед отправкой
+            async with typing_presence.typing(user_id):
+                # Обрабатываем разные типы сообщений
+                if message.text:
+                    if command is not None:
+                        response = command.handler(user_id, user_name, routed.args)
+                        if inspect.isawaitable(response):
+                            response = await response
+                    else:
+                        # Обычное текстовое сообщение: запрос к OpenAI в потоке, чтобы цикл событий обновлял индикатор
+                        response = await asyncio.get_running_loop().run_in_executor(
+                            None, process_message_with_ai, user_id, message.text, user_name
+                        )
                     
-            elif message.audio:
-                # Аудио файл
-                file = await message.audio.get_file()
-                
-                # Создаем временный файл
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as temp_file:
-                    await file.download_to_drive(temp_file.name)
-                    temp_file_path = temp_file.name
-                
-                response = process_audio_message(user_id, temp_file_path, user_name)
-                os.unlink(temp_file_path)
+                elif message.voice:
+                    # Голосовое сообщение
+                    file = await message.voice.get_file()
                     
-            elif message.document:
-                # Документ (JSON сценарии Make.com и другие файлы)
-                file = await message.document.get_file()
-                
-                # Получаем оригинальное имя файла и расширение
-                original_filename = message.document.file_name or "document"
-                file_extension = os.path.splitext(original_filename)[1] or '.txt'
-                
-                # Создаем временный файл с правильным расширением
-                with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
-                    temp_file_path = temp_file.name
-                
-                # Скачиваем файл
-                await file.download_to_drive(temp_file_path)
-                
-                print(f"[{get_timestamp()}] Скачан файл: {original_filename} -> {temp_file_path}")
-                
-                response = process_document_message(user_id, temp_file_path, user_name, original_filename)
-                os.unlink(temp_file_path)
-            else:
-                response = {"action": "reply", "reply_text": "Извините, я не понимаю этот тип сообщения.", "cta": None, "price": None}
+                    # Скачиваем в память (крупные файлы - во временный файл, удаляется автоматически)
+                    with await download_media(file, 'voice.ogg', MEDIA_SPILL_THRESHOLD, MEDIA_DOWNLOAD_TIMEOUT_SECONDS) as media:
+                        response = await asyncio.get_running_loop().run_in_executor(
+                            None, process_audio_message, user_id, media.source, user_name, media.filename,
+                            message.voice.file_unique_id, message.voice.duration
+                        )
+                        
+                elif message.audio:
+                    # Аудио файл
+                    file = await message.audio.get_file()
+                    audio_filename = message.audio.file_name or 'audio.mp3'
+                    
+                    with await download_media(file, audio_filename, MEDIA_SPILL_THRESHOLD, MEDIA_DOWNLOAD_TIMEOUT_SECONDS) as media:
+                        response = await asyncio.get_running_loop().run_in_executor(
+                            None, process_audio_message, user_id, media.source, user_name, media.filename,
+                            message.audio.file_unique_id, message.audio.duration
+                        )
+                        
+                elif message.document:
+                    # Документ (JSON сценарии Make.com и другие файлы)
+                    file = await message.document.get_file()
+                    
+                    # Получаем оригинальное имя файла
+                    original_filename = message.document.file_name or "document"
+                    
+                    with await download_media(file, original_filename, MEDIA_SPILL_THRESHOLD, MEDIA_DOWNLOAD_TIMEOUT_SECONDS) as media:
+                        print(f"[{get_timestamp()}] Скачан файл: {original_filename} ({media.size} байт, {'в памяти' if media.in_memory else media.path})")
+                        response = await process_document_message(user_id, media.source, user_name, original_filename)
+                else:
+                    response = {"action": "reply", "reply_text": "Извините, я не понимаю этот тип сообщения.", "cta": None, "price": None}
             
             # Отправляем ответ
             if response.get("action") == "reply":
@@ -610,27 +515,22 @@ async def handle_message(update: Update, context):
                 
                 # Отвечаем аудио только если получили аудио сообщение
                 if (message.voice or message.audio) and len(reply_text) > 50:
-                    audio_data = openai_manager.generate_speech(reply_text, voice="onyx")  # Мужской голос
+                    # Текст без HTML синтезируется частями параллельно (мужской голос)
+                    async with typing_presence.typing(user_id, "record_voice"):
+                        audio_data = await speech_synthesizer.synthesize(reply_text, voice="onyx")
                     if audio_data:
-                        # Сохраняем временный файл
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as temp_file:
-                            temp_file.write(audio_data)
-                            temp_file_path = temp_file.name
-                        
-                        # Отправляем голосовое сообщение
+                        # Отправляем голосовое сообщение напрямую из памяти
                         await context.bot.send_voice(
                             chat_id=user_id,
-                            voice=open(temp_file_path, 'rb'),
+                            voice=audio_data,
                             caption=reply_text[:100] + "..." if len(reply_text) > 100 else None
                         )
-                        
-                        # Удаляем временный файл
-                        os.unlink(temp_file_path)
                     else:
                         await context.bot.send_message(chat_id=user_id, text=reply_text, parse_mode='HTML')
                 else:
                     # Для всех остальных случаев отвечаем текстом
-                    await context.bot.send_message(chat_id=user_id, text=reply_text, parse_mode='HTML')
+                    await context.bot.send_message(chat_id=user_id, text=reply_text, parse_mode='HTML',
+                                                   reply_markup=response.get("reply_markup"))
                      
                     
             elif response.get("action") == "offer_mentorship":
@@ -685,14 +585,54 @@ async def handle_message(update: Update, context):
                 import asyncio
                 await asyncio.sleep(2 ** retry_count)  # Экспоненциальная задержка
 
+async def handle_pager_callback(update: Update, context):
+    """Обрабатывает кнопки листания /payments и /schedule"""
+    query = update.callback_query
+    try:
+        kind, start_number, after = parse_pager_callback(query.data)
+        user_id = query.from_user.id
+        
+        if kind == "payments":
+            response = handle_payments_command(user_id, query.from_user.first_name, start_number, after)
+        else:
+            response = handle_schedule_command(user_id, query.from_user.first_name, start_number, after)
+        
+        await query.answer()
+        await query.edit_message_text(
+            text=response["reply_text"],
+            parse_mode='HTML',
+            reply_markup=response.get("reply_markup")
+        )
+        
+    except Exception as e:
+        print(f"[{get_timestamp()}] Error handling pager callback: {e}")
+        try:
+            await query.answer("Не удалось загрузить страницу")
+        except Exception:
+            pass
+
 async def handle_pre_checkout_query(update: Update, context):
     """Обрабатывает предварительную проверку платежа"""
     try:
         query = update.pre_checkout_query
         print(f"[{get_timestamp()}] Pre-checkout query from {query.from_user.id}")
         
-        # Проверяем, не был ли уже обработан этот платеж
-        if db_manager.payment_exists(query.invoice_payload):
+        # Проверяем, не был ли уже обработан этот платеж.
+        # Pre-checkout обрабатывается сразу, без очереди за другими обновлениями (PaymentFirstUpdateProcessor),
+        # поэтому дедлайн отсчитывается почти с момента получения запроса.
+        # Промах кэша уходит в поток с дедлайном, чтобы запись в базу не задержала ответ Telegram
+        loop = asyncio.get_running_loop()
+        try:
+            already_paid = await asyncio.wait_for(
+                loop.run_in_executor(None, db_manager.payment_exists, query.invoice_payload),
+                PRE_CHECKOUT_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            print(f"[{get_timestamp()}] Pre-checkout check timed out for {query.from_user.id}")
+            await query.answer(ok=False, error_message="Сервис временно занят, попробуйте еще раз")
+            return
+        
+        if already_paid:
             await query.answer(ok=False, error_message="Платеж уже обработан")
             return
         
@@ -711,11 +651,6 @@ async def handle_successful_payment(update: Update, context):
         
         print(f"[{get_timestamp()}] Successful payment from {user_id}: {payment_info.total_amount} {payment_info.currency}")
         
-        # Проверяем, не был ли уже обработан этот платеж
-        if db_manager.payment_exists(payment_info.invoice_payload):
-            print(f"[{get_timestamp()}] Payment already processed: {payment_info.invoice_payload}")
-            return
-        
         # Сохраняем информацию о платеже
         payment_data = {
             'user_id': user_id,
@@ -731,18 +666,13 @@ async def handle_successful_payment(update: Update, context):
             }
         }
         
-        db_manager.save_payment(payment_data)
-        db_manager.update_payment_status(payment_info.invoice_payload, 'completed')
-        
-        # Создаем пользователя если его нет
-        if not db_manager.user_exists(user_id):
-            user_data = {
-                'user_id': user_id,
-                'first_name': message.from_user.first_name,
-                'last_name': message.from_user.last_name,
-                'username': message.from_user.username
-            }
-            db_manager.create_user(user_data)
+        # Пользователь создается при приеме платежа, если его еще нет
+        user_data = {
+            'user_id': user_id,
+            'first_name': message.from_user.first_name,
+            'last_name': message.from_user.last_name,
+            'username': message.from_user.username
+        }
         
         # Создаем запись в расписании на основе типа платежа
         lesson_type = "Индивидуальное занятие"
@@ -772,7 +702,11 @@ async def handle_successful_payment(update: Update, context):
             'notes': f'Оплачено: {payment_info.invoice_payload}'
         }
         
-        db_manager.save_schedule(schedule_data)
+        # Платеж, пользователь и расписание сохраняются одной транзакцией
+        schedule_id = db_manager.ingest_payment(payment_data, user_data, schedule_data)
+        if schedule_id is None:
+            print(f"[{get_timestamp()}] Payment already processed: {payment_info.invoice_payload}")
+            return
         
         # Уведомляем администратора
         admin_message = f"""
@@ -782,15 +716,17 @@ async def handle_successful_payment(update: Update, context):
 💳 Сумма: {payment_data['total_amount']} {payment_data['currency']}
 📦 Пакет: {payment_data['invoice_payload']}
 🆔 ID платежа: {payment_data['provider_payment_charge_id']}
-📅 Создана запись в расписании: {lesson_type}
+📅 Создана запись в расписании: {lesson_type} (#{schedule_id})
         """
-        await context.bot.send_message(chat_id=ADMIN_CHAT_ID, text=admin_message, parse_mode='HTML')
+        await context.bot.send_message(chat_id=ADMIN_CHAT_ID, text=admin_message, parse_mode='HTML',
+                                       rate_limit_args={"priority": PRIORITY_PAYMENT})
         
         # Отправляем подтверждение пользователю
         await context.bot.send_message(
             chat_id=user_id, 
             text=f"✅ Спасибо за оплату! Ваш платеж на сумму {payment_info.total_amount} {payment_info.currency} успешно обработан. Мы свяжемся с вами в ближайшее время.",
-            parse_mode='HTML'
+            parse_mode='HTML',
+            rate_limit_args={"priority": PRIORITY_PAYMENT}
         )
         
     except Exception as e:
@@ -808,6 +744,10 @@ async def error_handler(update: Update, context):
         print(f"[{get_timestamp()}] Connection error - network issues")
     elif "Timed out" in str(error):
         print(f"[{get_timestamp()}] Request timeout - increasing timeouts")
+    elif "Flood control" in str(error):
+        # Планировщик отправки уже повторял запрос; еще одно сообщение пользователю только продлит блокировку
+        print(f"[{get_timestamp()}] Flood control exceeded after retries: {send_scheduler.get_stats()}")
+        return
     else:
         print(f"[{get_timestamp()}] Unknown error type: {type(error)}")
     
@@ -824,42 +764,115 @@ async def error_handler(update: Update, context):
     
     return
 
+async def shutdown_workers(application: Application):
+    """Останавливает фоновые пулы при завершении бота"""
+    await typing_presence.close()
+    print(f"[{get_timestamp()}] Single-flight stats: docs={make_docs_manager.flight.get_stats()}, "
+          f"media={download_flight.get_stats()}")
+    document_pool.shutdown()
+    speech_synthesizer.shutdown()
+    retention_manager.stop()
+
+async def run_webhook(application: Application):
+    """Запускает бота в режиме webhook: ASGI-сервер отвечает Telegram сразу, обработка идет в очереди Application"""
+    async def submit(data: Dict):
+        await application.update_queue.put(Update.de_json(data, application.bot))
+    
+    webhook_app = WebhookApp(submit, WEBHOOK_SECRET, urlparse(WEBHOOK_URL).path or "/")
+    
+    async with application:
+        # Накопившиеся за перезапуск обновления Telegram доставит на webhook (если DROP_PENDING_UPDATES=false)
+        await application.bot.set_webhook(
+            url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES,
+            drop_pending_updates=DROP_PENDING_UPDATES
+        )
+        await application.start()
+        print(f"[{get_timestamp()}] Webhook server on {WEBHOOK_HOST}:{WEBHOOK_PORT}, path {webhook_app.path}")
+        try:
+            await serve(webhook_app, WEBHOOK_HOST, WEBHOOK_PORT)
+        finally:
+            await application.stop()
+            # post_shutdown вызывается только в run_polling/run_webhook
+            await shutdown_workers(application)
+
 def main():
     """Основная функция для запуска бота"""
     # Инициализация компонентов
-    global debounce_manager, db_manager, openai_manager, make_docs_manager
+    global debounce_manager, db_manager, openai_manager, make_docs_manager, document_pool, speech_synthesizer, retention_manager
+    global send_scheduler, typing_presence
     debounce_manager = DebounceManager(DEBOUNCE_SECONDS)
-    db_manager = DatabaseManager()
-    openai_manager = OpenAIManager(OPENAI_API_KEY)
+    db_manager = CachedDatabaseManager(user_ttl_seconds=USER_CACHE_TTL_SECONDS)
+    transcription_cache = TranscriptionCache(
+        db_manager.db_path,
+        ttl_seconds=TRANSCRIPTION_CACHE_TTL_DAYS * 24 * 3600,
+        max_entries=TRANSCRIPTION_CACHE_MAX_ENTRIES
+    )
+    openai_manager = OpenAIManager(OPENAI_API_KEY, transcription_cache)
+    speech_synthesizer = SpeechSynthesizer(openai_manager.generate_speech)
     make_docs_manager = MakeDocumentationManager()
+    make_docs_manager.add_change_listener(lambda: response_templates.invalidate("docs"))
+    response_templates.warm_up()
+    document_pool = DocumentProcessingPool(DOCUMENT_WORKERS, MAX_DOCUMENT_SIZE, DOCUMENT_TIMEOUT_SECONDS)
+    retention_manager = RetentionManager(
+        db_manager.db_path,
+        RetentionPolicy(keep_last_messages=RETENTION_KEEP_MESSAGES, min_age_days=RETENTION_MIN_AGE_DAYS),
+        interval_seconds=RETENTION_INTERVAL_HOURS * 3600
+    )
+    send_scheduler = SendScheduler(global_rate=SEND_GLOBAL_RATE, per_chat_rate=SEND_PER_CHAT_RATE)
 
-    # Принудительно инициализируем базу данных
-    print(f"[{get_timestamp()}] Инициализация базы данных...")
-    db_manager.init_database()
+    # Схема базы уже приведена к актуальной версии миграциями в DatabaseManager
     print(f"[{get_timestamp()}] База данных инициализирована: {db_manager.db_path}")
     
     print(f"[{get_timestamp()}] Telegram bot started")
     print(f"[{get_timestamp()}] Database: {db_manager.db_path}")
     print(f"[{get_timestamp()}] OpenAI: {'Connected' if OPENAI_API_KEY else 'Missing API Key'}")
     
-    # Создаем приложение с обработкой ошибок
-    application = Application.builder().token(BOT_TOKEN).build()
+    # Прогреваем процессы обработки документов до начала приема сообщений
+    document_pool.start()
+    print(f"[{get_timestamp()}] Document workers: {document_pool.max_workers}")
+    
+    # Архивирование старой истории в фоне
+    if RETENTION_INTERVAL_HOURS > 0:
+        retention_manager.start()
+    
+    # Создаем приложение: обновления разных чатов обрабатываются параллельно
+    application = build_application(
+        BOT_TOKEN,
+        concurrent_updates=CONCURRENT_UPDATES,
+        rate_limiter=TelegramRateLimiter(send_scheduler),
+        post_shutdown=shutdown_workers
+    )
+    # Индикаторы набора идут через тот же планировщик отправки (приоритет ниже ответов, повторы объединяются)
+    typing_presence = TypingPresence(
+        lambda chat_id, action: application.bot.send_chat_action(chat_id=chat_id, action=action)
+    )
     
     # Добавляем обработчики (специфичные первыми!)
     application.add_handler(MessageHandler(filters.SUCCESSFUL_PAYMENT, handle_successful_payment))
     application.add_handler(PreCheckoutQueryHandler(handle_pre_checkout_query))
+    application.add_handler(CallbackQueryHandler(handle_pager_callback, pattern=r'^(payments|schedule)\|'))
+    # Известные команды отбирает CommandHandler (сущность bot_command в начале, /cmd@bot_username других ботов
+    # отсеивается до вызова); остальное, включая неизвестные команды, - общий обработчик
+    application.add_handler(CommandHandler(command_router.names(), handle_message, filters=filters.UpdateType.MESSAGE))
     application.add_handler(MessageHandler(filters.ALL, handle_message))
     
     # Добавляем обработчик ошибок
     application.add_error_handler(error_handler)
     
+    if WEBHOOK_URL:
+        print(f"[{get_timestamp()}] Starting webhook: {WEBHOOK_URL}")
+        asyncio.run(run_webhook(application))
+        return
+    
     # Запускаем бота с повышенными таймаутами
     print(f"[{get_timestamp()}] Starting polling...")
     application.run_polling(
         allowed_updates=Update.ALL_TYPES,
         timeout=60,  # Увеличиваем таймаут до 60 секунд
-        poll_interval=3.0,  # Увеличиваем интервал между запросами
-        drop_pending_updates=True,  # Игнорируем старые обновления
+        poll_interval=POLL_INTERVAL,  # Интервал между запросами
+        drop_pending_updates=DROP_PENDING_UPDATES,  # Игнорировать старые обновления
         close_loop=False  # Не закрываем loop при ошибках
     )
 
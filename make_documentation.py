@@ -4,106 +4,75 @@
 """
 
 import sqlite3
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
 import json
 from datetime import datetime
+from migrations import apply_migrations
+from single_flight import SingleFlight
+
+# Базовая документация, загружается миграцией схемы
+DEFAULT_DOCUMENTATION = [
+    {
+        "category": "Основы",
+        "title": "Что такое Make.com",
+        "content": "Make.com (ранее Integromat) - это платформа для автоматизации рабочих процессов. Позволяет соединять различные приложения и сервисы без программирования.",
+        "keywords": "make, integromat, автоматизация, workflow",
+        "difficulty_level": "beginner"
+    },
+    {
+        "category": "Основы",
+        "title": "Модули и соединения",
+        "content": "Модули - это блоки, представляющие действия в приложениях. Соединения (connections) связывают модули и определяют поток данных между ними.",
+        "keywords": "модули, connections, соединения, блоки",
+        "difficulty_level": "beginner"
+    },
+    {
+        "category": "Основы",
+        "title": "Сценарии (Scenarios)",
+        "content": "Сценарий - это последовательность модулей, которая выполняет определенную задачу автоматизации. Сценарии запускаются по триггерам или расписанию.",
+        "keywords": "сценарии, scenarios, триггеры, расписание",
+        "difficulty_level": "beginner"
+    },
+    {
+        "category": "Продвинутые",
+        "title": "Обработка ошибок",
+        "content": "В Make.com важно настроить обработку ошибок через модули Error Handler и Router. Это предотвращает сбои сценариев и обеспечивает надежность.",
+        "keywords": "ошибки, error handler, router, обработка ошибок",
+        "difficulty_level": "intermediate"
+    },
+    {
+        "category": "Продвинутые",
+        "title": "Оптимизация производительности",
+        "content": "Для оптимизации используйте фильтры, ограничения и правильное планирование выполнения. Избегайте избыточных операций и используйте кэширование.",
+        "keywords": "оптимизация, производительность, фильтры, кэширование",
+        "difficulty_level": "advanced"
+    }
+]
 
 class MakeDocumentationManager:
     def __init__(self, db_path: str = "bot_database.db"):
         self.db_path = db_path
+        # Одинаковые одновременные запросы (/docs без аргументов, один и тот же поиск) читают базу один раз;
+        # результат общий для всех ожидавших, вызывающий код не должен его изменять
+        self.flight = SingleFlight("make_docs")
+        self.change_listeners: List[Callable[[], None]] = []  # Вызываются после изменения документации или FAQ
         self.init_documentation_db()
     
     def init_documentation_db(self):
-        """Инициализирует таблицы для документации Make.com"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Таблица документации
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS make_documentation (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                category TEXT NOT NULL,
-                title TEXT NOT NULL,
-                content TEXT NOT NULL,
-                keywords TEXT,
-                difficulty_level TEXT DEFAULT 'beginner',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Таблица FAQ
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS make_faq (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                question TEXT NOT NULL,
-                answer TEXT NOT NULL,
-                category TEXT,
-                tags TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Таблица учебных материалов
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS make_tutorials (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                description TEXT,
-                content TEXT NOT NULL,
-                difficulty_level TEXT DEFAULT 'beginner',
-                estimated_time INTEGER DEFAULT 30,
-                prerequisites TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        
-        # Загружаем базовую документацию
-        self.load_default_documentation()
+        """Инициализирует таблицы для документации Make.com (через миграции схемы)"""
+        apply_migrations(self.db_path)
+    
+    def add_change_listener(self, listener: Callable[[], None]) -> None:
+        """Подписывает на изменения документации (например, для сброса готовых ответов /docs)"""
+        self.change_listeners.append(listener)
+    
+    def _notify_changed(self) -> None:
+        for listener in self.change_listeners:
+            listener()
     
     def load_default_documentation(self):
         """Загружает базовую документацию Make.com"""
-        default_docs = [
-            {
-                "category": "Основы",
-                "title": "Что такое Make.com",
-                "content": "Make.com (ранее Integromat) - это платформа для автоматизации рабочих процессов. Позволяет соединять различные приложения и сервисы без программирования.",
-                "keywords": "make, integromat, автоматизация, workflow",
-                "difficulty_level": "beginner"
-            },
-            {
-                "category": "Основы",
-                "title": "Модули и соединения",
-                "content": "Модули - это блоки, представляющие действия в приложениях. Соединения (connections) связывают модули и определяют поток данных между ними.",
-                "keywords": "модули, connections, соединения, блоки",
-                "difficulty_level": "beginner"
-            },
-            {
-                "category": "Основы",
-                "title": "Сценарии (Scenarios)",
-                "content": "Сценарий - это последовательность модулей, которая выполняет определенную задачу автоматизации. Сценарии запускаются по триггерам или расписанию.",
-                "keywords": "сценарии, scenarios, триггеры, расписание",
-                "difficulty_level": "beginner"
-            },
-            {
-                "category": "Продвинутые",
-                "title": "Обработка ошибок",
-                "content": "В Make.com важно настроить обработку ошибок через модули Error Handler и Router. Это предотвращает сбои сценариев и обеспечивает надежность.",
-                "keywords": "ошибки, error handler, router, обработка ошибок",
-                "difficulty_level": "intermediate"
-            },
-            {
-                "category": "Продвинутые",
-                "title": "Оптимизация производительности",
-                "content": "Для оптимизации используйте фильтры, ограничения и правильное планирование выполнения. Избегайте избыточных операций и используйте кэширование.",
-                "keywords": "оптимизация, производительность, фильтры, кэширование",
-                "difficulty_level": "advanced"
-            }
-        ]
-        
-        for doc in default_docs:
+        for doc in DEFAULT_DOCUMENTATION:
             self.add_documentation_entry(
                 category=doc["category"],
                 title=doc["title"],
@@ -125,9 +94,13 @@ class MakeDocumentationManager:
         
         conn.commit()
         conn.close()
+        self._notify_changed()
     
     def search_documentation(self, query: str, limit: int = 5) -> List[Dict]:
         """Ищет документацию по запросу"""
+        return self.flight.do(("docs", query, limit), lambda: self._search_documentation(query, limit))
+    
+    def _search_documentation(self, query: str, limit: int) -> List[Dict]:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
@@ -184,6 +157,9 @@ class MakeDocumentationManager:
     
     def get_categories(self) -> List[str]:
         """Получает список всех категорий"""
+        return self.flight.do(("categories",), self._get_categories)
+    
+    def _get_categories(self) -> List[str]:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
@@ -205,9 +181,13 @@ class MakeDocumentationManager:
         
         conn.commit()
         conn.close()
+        self._notify_changed()
     
     def search_faq(self, query: str, limit: int = 3) -> List[Dict]:
         """Ищет в FAQ"""
+        return self.flight.do(("faq", query, limit), lambda: self._search_faq(query, limit))
+    
+    def _search_faq(self, query: str, limit: int) -> List[Dict]:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
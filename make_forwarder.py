@@ -0,0 +1,292 @@
+"""
+Модуль пересылки событий в Make.com
+События сначала записываются в очередь на диске, затем отправляются пачками (по числу событий, размеру
+или времени) сжатыми gzip. Неудачные пачки повторяются с экспоненциальной задержкой и не теряются при сбоях Make
+"""
+
+import gzip
+import json
+import time
+import random
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set
+
+# post(url, body, headers) -> HTTP статус
+PostFunction = Callable[[str, bytes, Dict[str, str]], int]
+
+
+class MakeForwarder:
+    """
+    Пересылка событий в Make.com пачками с очередью повторов в SQLite.
+    При max_batch_events=1 каждое событие отправляется отдельно в исходном виде (формат до пакетной отправки).
+    """
+
+    def __init__(self, url: str, db_path: str = "make_outbox.db", max_batch_events: int = 50,
+                 max_batch_bytes: int = 256 * 1024, flush_interval: float = 2.0, max_concurrency: int = 4,
+                 timeout: float = 10.0, compress: bool = True, verify: bool = True, max_attempts: Optional[int] = None,
+                 base_backoff: float = 2.0, max_backoff: float = 600.0, post: Optional[PostFunction] = None):
+        self.url = url
+        self.db_path = db_path
+        self.max_batch_events = max_batch_events
+        self.max_batch_bytes = max_batch_bytes    # Ограничение по размеру несжатого JSON
+        self.flush_interval = flush_interval      # Событие ждет пачку не дольше
+        self.max_concurrency = max_concurrency    # Одновременных запросов к Make
+        self.timeout = timeout
+        self.compress = compress
+        self.verify = verify
+        self.max_attempts = max_attempts          # После этого событие остается в очереди со статусом dead (None - без предела)
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.post = post
+        self.client = None
+        self.inflight: Set[int] = set()           # ID событий в отправляемых пачках
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.slots = threading.Semaphore(max_concurrency)
+        self.stats = {"enqueued": 0, "batches_sent": 0, "events_sent": 0, "failures": 0, "dead_lettered": 0,
+                      "bytes_sent": 0, "bytes_raw": 0}
+        self.init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode = WAL')
+        return conn
+
+    def init_database(self) -> None:
+        """Создает таблицу очереди"""
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS make_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    payload TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    last_error TEXT
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_make_outbox_ready
+                ON make_outbox(next_attempt_at, id) WHERE status = 'pending'
+            ''')
+
+    def enqueue(self, event: Dict) -> None:
+        """
+        Записывает событие в очередь на диске; отправка произойдет в фоне.
+
+        Args:
+            event: JSON-совместимое событие (event_type, данные, timestamp)
+        """
+        payload = json.dumps(event, ensure_ascii=False)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO make_outbox (payload, size, created_at, next_attempt_at) VALUES (?, ?, ?, ?)',
+                (payload, len(payload.encode('utf-8')), now, now)
+            )
+            pending = conn.execute("SELECT COUNT(*) FROM make_outbox WHERE status = 'pending'").fetchone()[0]
+        with self.lock:
+            self.stats["enqueued"] += 1
+        if pending - len(self.inflight) >= self.max_batch_events:
+            # Набралась полная пачка - не ждем flush_interval
+            self.wakeup.set()
+
+    def start(self) -> None:
+        """Запускает фоновую отправку"""
+        if self.thread is not None:
+            return
+        if self.post is None:
+            self.post = self._create_httpx_post()
+        self.stop_event.clear()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="make-forwarder")
+        self.thread = threading.Thread(target=self._run, name="make-forwarder", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Отправляет готовое и останавливает фоновую отправку; неотправленное остается на диске"""
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.wakeup.set()
+        self.thread.join(timeout)
+        self.thread = None
+        self.executor.shutdown(wait=True)
+        self.executor = None
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+    def _create_httpx_post(self) -> PostFunction:
+        """Общий httpx.Client: соединения с Make переиспользуются между пачками"""
+        import httpx
+
+        self.client = httpx.Client(
+            verify=self.verify,
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency)
+        )
+
+        def post(url: str, body: bytes, headers: Dict[str, str]) -> int:
+            return self.client.post(url, content=body, headers=headers).status_code
+
+        return post
+
+    def _run(self) -> None:
+        """Цикл фонового потока: ждет полную пачку или flush_interval и отправляет готовые события"""
+        while not self.stop_event.is_set():
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Make forwarder error: {e}")
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Make forwarder error: {e}")
+
+    def flush(self, wait: bool = False) -> int:
+        """
+        Отправляет все готовые события пачками.
+
+        Args:
+            wait: Дождаться ответов Make (иначе пачки уходят в пул потоков)
+
+        Returns:
+            int: Число запущенных пачек
+        """
+        futures = []
+        batches = 0
+        while True:
+            self.slots.acquire()
+            batch = self._claim_batch()
+            if not batch:
+                self.slots.release()
+                break
+            batches += 1
+            if self.executor is None:
+                self._send_batch(batch)
+            else:
+                futures.append(self.executor.submit(self._send_batch, batch))
+        if wait:
+            for future in futures:
+                future.result()
+        return batches
+
+    def _claim_batch(self) -> List[tuple]:
+        """Выбирает готовые события в пачку в пределах max_batch_events и max_batch_bytes"""
+        with self.lock:
+            exclude = list(self.inflight)
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, payload, size, attempts FROM make_outbox "
+                "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (time.time(), self.max_batch_events + len(exclude))
+            ).fetchall()
+
+        batch = []
+        size = 0
+        excluded = set(exclude)
+        for row in rows:
+            if row[0] in excluded:
+                continue
+            if batch and (len(batch) >= self.max_batch_events or size + row[2] > self.max_batch_bytes):
+                break
+            batch.append(row)
+            size += row[2]
+        with self.lock:
+            self.inflight.update(row[0] for row in batch)
+        return batch
+
+    def _send_batch(self, batch: List[tuple]) -> None:
+        """Отправляет пачку и удаляет ее из очереди или планирует повтор"""
+        ids = [row[0] for row in batch]
+        try:
+            events = [json.loads(row[1]) for row in batch]
+            if self.max_batch_events == 1:
+                # Прежний формат: одно событие в запросе без обертки, как его ждут существующие сценарии Make
+                message = events[0]
+            else:
+                message = {
+                    'event_type': 'batch',
+                    'events': events,
+                    'batch_size': len(events),
+                    'timestamp': datetime.now().isoformat()
+                }
+            body = json.dumps(message, ensure_ascii=False).encode('utf-8')
+            headers = {'Content-Type': 'application/json'}
+            raw_size = len(body)
+            if self.compress:
+                body = gzip.compress(body, compresslevel=6)
+                headers['Content-Encoding'] = 'gzip'
+
+            try:
+                status = self.post(self.url, body, headers)
+                error = None if 200 <= status < 300 else f"HTTP {status}"
+            except Exception as e:
+                error = str(e) or type(e).__name__
+
+            if error is None:
+                with self._connect() as conn:
+                    conn.executemany('DELETE FROM make_outbox WHERE id = ?', [(event_id,) for event_id in ids])
+                with self.lock:
+                    self.stats["batches_sent"] += 1
+                    self.stats["events_sent"] += len(ids)
+                    self.stats["bytes_sent"] += len(body)
+                    self.stats["bytes_raw"] += raw_size
+            else:
+                self._schedule_retry(batch, error)
+        finally:
+            with self.lock:
+                self.inflight.difference_update(ids)
+            self.slots.release()
+
+    def _schedule_retry(self, batch: List[tuple], error: str) -> None:
+        """Откладывает события пачки с экспоненциальной задержкой и случайным разбросом"""
+        now = time.time()
+        updates = []
+        dead = 0
+        for event_id, _, _, attempts in batch:
+            attempts += 1
+            delay = min(self.max_backoff, self.base_backoff * (2 ** min(attempts - 1, 30))) * random.uniform(0.8, 1.2)
+            status = 'dead' if self.max_attempts and attempts >= self.max_attempts else 'pending'
+            dead += status == 'dead'
+            updates.append((attempts, now + delay, status, error[:500], event_id))
+        with self._connect() as conn:
+            conn.executemany(
+                'UPDATE make_outbox SET attempts = ?, next_attempt_at = ?, status = ?, last_error = ? WHERE id = ?',
+                updates
+            )
+        with self.lock:
+            self.stats["failures"] += 1
+            self.stats["dead_lettered"] += dead
+        print(f"Make forwarder: batch of {len(batch)} failed ({error}), will retry")
+
+    def requeue_dead(self) -> int:
+        """Возвращает в очередь события, исчерпавшие попытки (например, после восстановления сценария Make)"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE make_outbox SET status = 'pending', attempts = 0, next_attempt_at = ? WHERE status = 'dead'",
+                (time.time(),)
+            )
+        self.wakeup.set()
+        return cursor.rowcount
+
+    def get_stats(self) -> Dict:
+        """Счетчики отправки и размер очереди"""
+        with self._connect() as conn:
+            counts = dict(conn.execute('SELECT status, COUNT(*) FROM make_outbox GROUP BY status').fetchall())
+        with self.lock:
+            stats = dict(self.stats)
+        stats["pending"] = counts.get('pending', 0)
+        stats["dead"] = counts.get('dead', 0)
+        stats["compression_ratio"] = round(stats["bytes_sent"] / stats["bytes_raw"], 3) if stats["bytes_raw"] else None
+        return stats
@@ -0,0 +1,104 @@
+"""
+Модуль для скачивания медиафайлов Telegram
+Небольшие файлы скачиваются в память, крупные - во временный файл на диске.
+Один и тот же небольшой файл, запрошенный одновременно (пересланный многими пользователями), скачивается один раз
+"""
+
+import os
+import asyncio
+import tempfile
+from typing import Optional, Union
+
+from single_flight import AsyncSingleFlight
+
+# Файлы больше этого размера (в байтах) сохраняются на диск
+DEFAULT_SPILL_THRESHOLD = 5 * 1024 * 1024
+
+# Скачивания в память по file_unique_id; байты неизменяемы, поэтому их можно отдать всем ожидавшим.
+# Файлы на диске не объединяются: у каждого MediaBuffer свой временный файл, который он удаляет сам
+download_flight = AsyncSingleFlight("media_download")
+
+
+class MediaBuffer:
+    """
+    Содержимое скачанного файла: байты в памяти или путь к временному файлу.
+    Используется как контекстный менеджер, временный файл удаляется при выходе.
+    """
+
+    def __init__(self, filename: str, data: Optional[bytes] = None, path: Optional[str] = None):
+        self.filename = filename
+        self.data = data
+        self.path = path
+
+    @property
+    def source(self) -> Union[bytes, str]:
+        """Байты файла или путь к нему на диске"""
+        return self.data if self.data is not None else self.path
+
+    @property
+    def in_memory(self) -> bool:
+        """True если файл целиком в памяти"""
+        return self.data is not None
+
+    @property
+    def size(self) -> int:
+        """Размер файла в байтах"""
+        if self.data is not None:
+            return len(self.data)
+        return os.path.getsize(self.path)
+
+    def close(self) -> None:
+        """Удаляет временный файл, если он был создан"""
+        if self.path and os.path.exists(self.path):
+            os.unlink(self.path)
+        self.path = None
+        self.data = None
+
+    def __enter__(self) -> "MediaBuffer":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+async def _download_bytes(telegram_file) -> bytes:
+    data = await telegram_file.download_as_bytearray()
+    return bytes(data)
+
+
+async def download_media(telegram_file, filename: str, spill_threshold: int = DEFAULT_SPILL_THRESHOLD,
+                         timeout: Optional[float] = None) -> MediaBuffer:
+    """
+    Скачивает файл Telegram в память или на диск в зависимости от размера.
+
+    Args:
+        telegram_file: Объект telegram.File
+        filename: Имя файла (нужно Whisper и обработчику документов для определения формата)
+        spill_threshold: Максимальный размер файла для скачивания в память
+        timeout: Сколько ждать скачивание в память (asyncio.TimeoutError по истечении)
+
+    Returns:
+        MediaBuffer: Скачанный файл
+    """
+    file_size = getattr(telegram_file, 'file_size', None)
+
+    if file_size is not None and file_size <= spill_threshold:
+        file_unique_id = getattr(telegram_file, 'file_unique_id', None)
+        if file_unique_id is None:
+            data = await asyncio.wait_for(_download_bytes(telegram_file), timeout)
+        else:
+            data = await download_flight.do(file_unique_id, lambda: _download_bytes(telegram_file), timeout)
+        return MediaBuffer(filename, data=data)
+
+    # Размер неизвестен или слишком большой - сохраняем на диск
+    suffix = os.path.splitext(filename)[1]
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+
+    try:
+        await telegram_file.download_to_drive(path)
+    except Exception:
+        os.unlink(path)
+        raise
+
+    return MediaBuffer(filename, path=path)
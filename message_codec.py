@@ -0,0 +1,179 @@
+"""
+Модуль сжатия текстов истории сообщений
+Длинные сообщения сжимаются zlib с общим словарем повторяющихся фрагментов ответов бота, короткие хранятся как текст
+"""
+
+import re
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Union
+
+# Сообщения короче (в байтах UTF-8) хранятся как есть: на них zlib почти ничего не выигрывает
+COMPRESSION_THRESHOLD = 256
+
+# Сжатое значение хранится, только если оно заметно меньше исходного
+MIN_COMPRESSION_RATIO = 0.9
+
+# Фрагменты словаря версии 1: шаблоны ответов анализа сценариев, файлов и HTML-разметка ответов ассистента.
+# zlib лучше находит совпадения ближе к концу словаря, поэтому самые частые фрагменты идут последними.
+# НЕ ИЗМЕНЯТЬ: этим словарем сжаты уже сохраненные сообщения. Новый словарь - новая версия в DICTIONARIES.
+_DICTIONARY_V1_FRAGMENTS = (
+    "<a href=\"https://www.make.com/en/help/",
+    "<pre>", "</pre>", "<code>", "</code>", "<i>", "</i>",
+    "Этот тип файла не поддерживается для чтения. Поддерживаемые форматы: .txt, .py, .js, .html, .css, .md, .csv, .log",
+    "📄 <b>Содержимое файла ",
+    "[ФАЙЛ ",
+    "[АУДИО] ",
+    "⛓ Глубина цепочки данных: ",
+    "📊 Используется ",
+    " типов модулей: ",
+    "builtin:BasicRouter, ",
+    "json:ParseJSON, ",
+    "http:ActionSendData, ",
+    "gateway:CustomWebHook, ",
+    "google-sheets:addRow, ",
+    "openai-gpt-3:CreateCompletion, ",
+    "Циклические зависимости между модулями: ",
+    " ссылается на несуществующий модуль ",
+    " не связан с другими модулями по данным",
+    "Webhook модуль ",
+    " без hook",
+    "DataStore модуль ",
+    " без указания хранилища",
+    " без указания типа",
+    " без параметров",
+    "🟡 Найдено ",
+    " предупреждений",
+    "✅ Настроено ",
+    " соединений",
+    "✅ Сценарий содержит ",
+    " модулей",
+    "Индивидуальное занятие (2 часа)",
+    "Пакет из 3 занятий",
+    "Месяц обучения",
+    "Make.com",
+    "сценарий",
+    "сценария",
+    "модуль",
+    "Модуль ",
+    "💡 <b>Рекомендации:</b>\n",
+    "⚠️ <b>Предупреждения:</b>\n",
+    "❌ <b>Ошибки:</b>\n",
+    "📈 Сложность: ",
+    "🔗 Соединений: ",
+    "🔢 Модулей: ",
+    "[JSON СЦЕНАРИЙ] 📊 <b>Анализ сценария Make.com</b>\n\n",
+    "</b>\n\n",
+    "<b>",
+    "</b>",
+    "\n• ",
+)
+
+MESSAGE_DICTIONARY_V1 = "".join(_DICTIONARY_V1_FRAGMENTS).encode('utf-8')
+
+# Версия словаря -> словарь. Версия записывается первым байтом сжатого значения.
+DICTIONARIES: Dict[int, bytes] = {
+    1: MESSAGE_DICTIONARY_V1,
+}
+CURRENT_DICTIONARY_VERSION = 1
+
+TOKEN_PATTERN = re.compile(r'\S+\s*')
+
+
+def encode_message(text: Optional[str], threshold: int = COMPRESSION_THRESHOLD,
+                   dictionary_version: int = CURRENT_DICTIONARY_VERSION) -> Union[str, bytes, None]:
+    """
+    Готовит текст сообщения к записи в message_history.
+
+    Args:
+        text: Текст сообщения
+        threshold: Минимальный размер в байтах для сжатия
+        dictionary_version: Версия словаря из DICTIONARIES
+
+    Returns:
+        Union[str, bytes, None]: Исходный текст или BLOB (байт версии + поток zlib)
+    """
+    if text is None:
+        return None
+
+    raw = text.encode('utf-8')
+    if len(raw) < threshold:
+        return text
+
+    compressor = zlib.compressobj(level=9, zdict=DICTIONARIES[dictionary_version])
+    compressed = bytes([dictionary_version]) + compressor.compress(raw) + compressor.flush()
+    if len(compressed) > len(raw) * MIN_COMPRESSION_RATIO:
+        return text
+    return compressed
+
+
+def decode_message(value: Union[str, bytes, None]) -> Optional[str]:
+    """Возвращает текст сообщения, распаковывая BLOB при необходимости"""
+    if not isinstance(value, (bytes, bytearray, memoryview)):
+        return value
+
+    value = bytes(value)
+    decompressor = zlib.decompressobj(zdict=DICTIONARIES[value[0]])
+    return (decompressor.decompress(value[1:]) + decompressor.flush()).decode('utf-8')
+
+
+def decode_rows(rows: Iterable[Dict], column: str = 'message_text') -> List[Dict]:
+    """Распаковывает колонку текста в строках выборки (сжатые значения - только у длинных сообщений)"""
+    rows = list(rows)
+    for row in rows:
+        if isinstance(row.get(column), bytes):
+            row[column] = decode_message(row[column])
+    return rows
+
+
+def build_dictionary(samples: Iterable[str], size: int = 32 * 1024, max_ngram: int = 6) -> bytes:
+    """
+    Обучает словарь zlib на корпусе сообщений.
+
+    Частые строки и последовательности слов оцениваются по сэкономленным байтам
+    (частота x длина); лучшие попадают в конец словаря, ближе к сжимаемым данным.
+
+    Args:
+        samples: Тексты сообщений
+        size: Максимальный размер словаря (zlib использует последние 32 КБ)
+        max_ngram: Максимальная длина последовательности слов
+
+    Returns:
+        bytes: Словарь для zlib.compressobj(zdict=...)
+    """
+    counts: Counter = Counter()
+    for sample in samples:
+        seen = set()
+        for line in sample.splitlines(keepends=True):
+            if len(line) > 3:
+                seen.add(line)
+        tokens = TOKEN_PATTERN.findall(sample)
+        for n in range(2, max_ngram + 1):
+            for i in range(len(tokens) - n + 1):
+                seen.add("".join(tokens[i:i + n]))
+        # Фрагмент считается один раз на сообщение: важно, в скольких сообщениях он встречается
+        counts.update(seen)
+
+    scored = [
+        (count * len(fragment.encode('utf-8')), fragment)
+        for fragment, count in counts.items()
+        if count > 1
+    ]
+    scored.sort(reverse=True)
+
+    selected = []
+    used = 0
+    for _, fragment in scored:
+        if size - used < 8:
+            break
+        encoded = fragment.encode('utf-8')
+        if used + len(encoded) > size:
+            continue
+        # Фрагмент внутри уже выбранного ничего не добавляет
+        if any(fragment in chosen for chosen in selected):
+            continue
+        selected.append(fragment)
+        used += len(encoded)
+
+    # Самые ценные фрагменты - в конец
+    return "".join(reversed(selected)).encode('utf-8')
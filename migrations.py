@@ -0,0 +1,350 @@
+"""
+Модуль версионных миграций схемы SQLite
+Версия схемы хранится в PRAGMA user_version, миграции применяются по порядку в транзакциях
+"""
+
+import sqlite3
+from typing import Callable, List, Tuple, Union
+
+MigrationStep = Union[str, Callable[[sqlite3.Cursor], None]]
+
+
+def _seed_default_documentation(cursor: sqlite3.Cursor) -> None:
+    """Загружает базовую документацию Make.com (без дублей в существующих базах)"""
+    from make_documentation import DEFAULT_DOCUMENTATION
+
+    for doc in DEFAULT_DOCUMENTATION:
+        cursor.execute('''
+            INSERT INTO make_documentation (category, title, content, keywords, difficulty_level)
+            SELECT ?, ?, ?, ?, ?
+            WHERE NOT EXISTS (SELECT 1 FROM make_documentation WHERE title = ?)
+        ''', (doc["category"], doc["title"], doc["content"], doc["keywords"], doc["difficulty_level"], doc["title"]))
+
+
+# Вторичные индексы схемы бота (без них каждый запрос менеджера - полный просмотр таблицы)
+SCHEMA_INDEXES = [
+    # get_user_messages: WHERE user_id = ? ORDER BY timestamp DESC LIMIT ?
+    '''CREATE INDEX IF NOT EXISTS idx_message_history_user_timestamp
+       ON message_history (user_id, timestamp)''',
+    # get_user_payments: WHERE user_id = ? ORDER BY created_at DESC
+    '''CREATE INDEX IF NOT EXISTS idx_payments_user_created
+       ON payments (user_id, created_at)''',
+    # get_user_schedule: WHERE s.user_id = ? ORDER BY s.scheduled_datetime DESC
+    '''CREATE INDEX IF NOT EXISTS idx_schedule_user_datetime
+       ON schedule (user_id, scheduled_datetime)''',
+    # get_schedule_for_date: WHERE date(scheduled_datetime) = date(?) AND status = 'scheduled'
+    '''CREATE INDEX IF NOT EXISTS idx_schedule_active_date
+       ON schedule (date(scheduled_datetime), scheduled_datetime)
+       WHERE status = 'scheduled' ''',
+    # check_schedule_conflict: диапазон по активным занятиям
+    '''CREATE INDEX IF NOT EXISTS idx_schedule_active_datetime
+       ON schedule (datetime(scheduled_datetime))
+       WHERE status = 'scheduled' ''',
+]
+
+# Начало и конец занятия в epoch-секундах (время без зоны трактуется одинаково везде, как UTC)
+SCHEDULE_STARTS_AT_SQL = "CAST(strftime('%s', scheduled_datetime) AS INTEGER)"
+SCHEDULE_ENDS_AT_SQL = "CAST(strftime('%s', scheduled_datetime) AS INTEGER) + duration_minutes * 60"
+
+# (версия, описание, шаги). Новые миграции добавляются только в конец списка.
+# Таблицы создаются с IF NOT EXISTS, чтобы базы до появления миграций обновлялись без ошибок.
+MIGRATIONS: List[Tuple[int, str, List[MigrationStep]]] = [
+    (1, "Таблицы пользователей, платежей, истории и расписания", [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            first_name TEXT,
+            last_name TEXT,
+            username TEXT,
+            thread_id TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS payments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            invoice_payload TEXT UNIQUE,
+            amount INTEGER,
+            currency TEXT DEFAULT 'RUB',
+            status TEXT DEFAULT 'pending',
+            provider_payment_charge_id TEXT,
+            telegram_payment_charge_id TEXT,
+            order_info TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS message_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            message_text TEXT,
+            message_type TEXT DEFAULT 'user',
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS schedule (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            payment_id INTEGER,
+            lesson_type TEXT,
+            scheduled_datetime TEXT,
+            duration_minutes INTEGER DEFAULT 120,
+            status TEXT DEFAULT 'scheduled',
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id),
+            FOREIGN KEY (payment_id) REFERENCES payments (id)
+        )
+        ''',
+    ]),
+    (2, "Вторичные индексы для запросов по пользователю и дате", SCHEMA_INDEXES),
+    (3, "Таблицы документации Make.com и базовые статьи", [
+        '''
+        CREATE TABLE IF NOT EXISTS make_documentation (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category TEXT NOT NULL,
+            title TEXT NOT NULL,
+            content TEXT NOT NULL,
+            keywords TEXT,
+            difficulty_level TEXT DEFAULT 'beginner',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS make_faq (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            question TEXT NOT NULL,
+            answer TEXT NOT NULL,
+            category TEXT,
+            tags TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS make_tutorials (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT,
+            content TEXT NOT NULL,
+            difficulty_level TEXT DEFAULT 'beginner',
+            estimated_time INTEGER DEFAULT 30,
+            prerequisites TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        _seed_default_documentation,
+    ]),
+    (4, "Интервалы занятий в epoch-секундах для поиска пересечений", [
+        'ALTER TABLE schedule ADD COLUMN starts_at INTEGER',
+        'ALTER TABLE schedule ADD COLUMN ends_at INTEGER',
+        f'''
+        UPDATE schedule SET
+            starts_at = {SCHEDULE_STARTS_AT_SQL},
+            ends_at = {SCHEDULE_ENDS_AT_SQL}
+        ''',
+        # Интервал пересчитывается при любой вставке или переносе занятия
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_schedule_interval_insert
+        AFTER INSERT ON schedule
+        BEGIN
+            UPDATE schedule SET
+                starts_at = CAST(strftime('%s', NEW.scheduled_datetime) AS INTEGER),
+                ends_at = CAST(strftime('%s', NEW.scheduled_datetime) AS INTEGER) + NEW.duration_minutes * 60
+            WHERE id = NEW.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_schedule_interval_update
+        AFTER UPDATE OF scheduled_datetime, duration_minutes ON schedule
+        BEGIN
+            UPDATE schedule SET
+                starts_at = CAST(strftime('%s', NEW.scheduled_datetime) AS INTEGER),
+                ends_at = CAST(strftime('%s', NEW.scheduled_datetime) AS INTEGER) + NEW.duration_minutes * 60
+            WHERE id = NEW.id;
+        END
+        ''',
+        # Заменяет индекс по datetime(scheduled_datetime) из миграции 2
+        'DROP INDEX IF EXISTS idx_schedule_active_datetime',
+        '''CREATE INDEX IF NOT EXISTS idx_schedule_active_interval
+           ON schedule (starts_at, ends_at)
+           WHERE status = 'scheduled' ''',
+        # MAX(duration_minutes) за O(log n) ограничивает диапазон поиска по starts_at
+        '''CREATE INDEX IF NOT EXISTS idx_schedule_active_duration
+           ON schedule (duration_minutes)
+           WHERE status = 'scheduled' ''',
+    ]),
+    (5, "Одна запись расписания на платеж", [
+        # Прежний прием платежа без транзакции при повторной доставке мог создать второе занятие;
+        # оставляем самую раннюю запись, иначе уникальный индекс не создастся
+        '''DELETE FROM schedule
+           WHERE payment_id IS NOT NULL
+             AND id NOT IN (SELECT MIN(id) FROM schedule WHERE payment_id IS NOT NULL GROUP BY payment_id)''',
+        # Цель ON CONFLICT при приеме платежа: повторная доставка не создает второе занятие
+        '''CREATE UNIQUE INDEX IF NOT EXISTS idx_schedule_payment_unique
+           ON schedule (payment_id)
+           WHERE payment_id IS NOT NULL''',
+    ]),
+    (6, "Дневные сводки по истории сообщений", [
+        '''
+        CREATE TABLE IF NOT EXISTS message_daily_stats (
+            day TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            message_type TEXT NOT NULL,
+            messages_count INTEGER NOT NULL DEFAULT 0,
+            total_length INTEGER NOT NULL DEFAULT 0,
+            max_length INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, user_id, message_type)
+        ) WITHOUT ROWID
+        ''',
+        # Отчеты по дням читают сводку, а не всю историю
+        '''CREATE INDEX IF NOT EXISTS idx_message_daily_stats_user_day
+           ON message_daily_stats (user_id, day)''',
+        '''
+        INSERT OR REPLACE INTO message_daily_stats
+            (day, user_id, message_type, messages_count, total_length, max_length)
+        SELECT date(timestamp), user_id, COALESCE(message_type, 'user'),
+               COUNT(*), COALESCE(SUM(length(message_text)), 0), COALESCE(MAX(length(message_text)), 0)
+        FROM message_history
+        WHERE user_id IS NOT NULL AND timestamp IS NOT NULL
+        GROUP BY date(timestamp), user_id, COALESCE(message_type, 'user')
+        ''',
+        # Сводка обновляется в той же транзакции, что и вставка сообщения
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_message_daily_stats
+        AFTER INSERT ON message_history
+        WHEN NEW.user_id IS NOT NULL AND NEW.timestamp IS NOT NULL
+        BEGIN
+            INSERT INTO message_daily_stats
+                (day, user_id, message_type, messages_count, total_length, max_length)
+            VALUES (date(NEW.timestamp), NEW.user_id, COALESCE(NEW.message_type, 'user'),
+                    1, COALESCE(length(NEW.message_text), 0), COALESCE(length(NEW.message_text), 0))
+            ON CONFLICT(day, user_id, message_type) DO UPDATE SET
+                messages_count = messages_count + 1,
+                total_length = total_length + excluded.total_length,
+                max_length = MAX(max_length, excluded.max_length);
+        END
+        ''',
+    ]),
+    (7, "Архив старой истории сообщений", [
+        # Пачка старых сообщений пользователя, сжатая zlib в JSON-список строк
+        '''
+        CREATE TABLE IF NOT EXISTS message_archive (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            first_message_id INTEGER NOT NULL,
+            last_message_id INTEGER NOT NULL,
+            first_timestamp TIMESTAMP,
+            last_timestamp TIMESTAMP,
+            messages_count INTEGER NOT NULL,
+            payload BLOB NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''CREATE INDEX IF NOT EXISTS idx_message_archive_user
+           ON message_archive (user_id, first_message_id)''',
+    ]),
+    (8, "Длина исходного текста для сжатых сообщений", [
+        # Длинные сообщения хранятся сжатыми (message_codec), length() BLOB - это размер после сжатия
+        'ALTER TABLE message_history ADD COLUMN message_length INTEGER',
+        'DROP TRIGGER IF EXISTS trg_message_daily_stats',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_message_daily_stats
+        AFTER INSERT ON message_history
+        WHEN NEW.user_id IS NOT NULL AND NEW.timestamp IS NOT NULL
+        BEGIN
+            INSERT INTO message_daily_stats
+                (day, user_id, message_type, messages_count, total_length, max_length)
+            VALUES (date(NEW.timestamp), NEW.user_id, COALESCE(NEW.message_type, 'user'), 1,
+                    COALESCE(NEW.message_length, length(NEW.message_text), 0),
+                    COALESCE(NEW.message_length, length(NEW.message_text), 0))
+            ON CONFLICT(day, user_id, message_type) DO UPDATE SET
+                messages_count = messages_count + 1,
+                total_length = total_length + excluded.total_length,
+                max_length = MAX(max_length, excluded.max_length);
+        END
+        ''',
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Возвращает текущую версию схемы"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection, migrations: List[Tuple[int, str, List[MigrationStep]]] = MIGRATIONS) -> int:
+    """
+    Применяет недостающие миграции к соединению.
+
+    Args:
+        conn: Соединение в режиме autocommit (isolation_level=None)
+        migrations: Список миграций по возрастанию версии
+
+    Returns:
+        int: Версия схемы после миграций
+    """
+    latest_version = migrations[-1][0] if migrations else 0
+
+    # Быстрый путь: схема актуальна - одно чтение pragma
+    version = get_schema_version(conn)
+    if version >= latest_version:
+        return version
+
+    # Новый файл: режим auto_vacuum задается до создания первой таблицы,
+    # тогда задача хранения освобождает страницы через PRAGMA incremental_vacuum
+    if version == 0 and conn.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()[0] == 0:
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+
+    # Блокируем запись, чтобы параллельно стартующие процессы не применили миграции дважды
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        version = get_schema_version(conn)
+        cursor = conn.cursor()
+
+        for migration_version, description, steps in migrations:
+            if migration_version <= version:
+                continue
+
+            print(f"Applying migration {migration_version}: {description}")
+            for step in steps:
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+
+            # PRAGMA user_version транзакционна и откатывается вместе с миграцией
+            cursor.execute(f'PRAGMA user_version = {int(migration_version)}')
+            version = migration_version
+
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+
+    return version
+
+
+def apply_migrations(db_path: str) -> int:
+    """
+    Приводит схему базы к последней версии.
+
+    Args:
+        db_path: Путь к файлу SQLite
+
+    Returns:
+        int: Версия схемы после миграций
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        return migrate(conn)
+    finally:
+        conn.close()
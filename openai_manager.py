@@ -1,15 +1,18 @@
 import os
 import json
 import tempfile
-from typing import Dict, List, Optional
+import threading
+from typing import Dict, List, Optional, Union
 from datetime import datetime
 from openai import OpenAI
+from transcription_cache import TranscriptionCache
 
 class OpenAIManager:
     """Менеджер для работы с OpenAI API используя официальную библиотеку"""
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, transcription_cache: Optional[TranscriptionCache] = None):
         self.api_key = api_key
+        self.transcription_cache = transcription_cache
         # Настраиваем httpx клиент с отключенным HTTP/2 и увеличенными таймаутами
         import httpx
         import ssl
@@ -48,9 +51,25 @@ class OpenAIManager:
             http_client=http_client
         )
         self.conversation_history = {}  # user_id -> [messages]
+        self.history_locks: Dict[int, threading.Lock] = {}  # user_id -> блокировка истории
+        self.history_locks_guard = threading.Lock()
     
     def send_message_to_user(self, user_id: int, message: str, user_name: str = None) -> Dict:
         """Отправляет сообщение пользователю и получает ответ"""
+        # Обновления обрабатываются параллельно: сообщения одного пользователя идут к модели по очереди,
+        # иначе чтение и дополнение его истории перемешаются
+        with self._history_lock(user_id):
+            return self._exchange(user_id, message, user_name)
+    
+    def _history_lock(self, user_id: int) -> threading.Lock:
+        with self.history_locks_guard:
+            lock = self.history_locks.get(user_id)
+            if lock is None:
+                lock = self.history_locks[user_id] = threading.Lock()
+            return lock
+    
+    def _exchange(self, user_id: int, message: str, user_name: str = None) -> Dict:
+        """Дополняет историю пользователя сообщением и ответом модели (под блокировкой истории)"""
         try:
             # Получаем историю разговора
             if user_id not in self.conversation_history:
@@ -153,20 +172,47 @@ class OpenAIManager:
             
             return {"action": "reply", "reply_text": "Произошла ошибка при обработке запроса.", "cta": None, "price": None}
     
-    def transcribe_audio(self, audio_file_path: str) -> str:
-        """Транскрибирует аудио файл в текст"""
+    def transcribe_audio(self, audio: Union[str, bytes], filename: str = "audio.ogg",
+                         file_unique_id: Optional[str] = None, duration: Optional[float] = None) -> str:
+        """Транскрибирует аудио (путь к файлу или байты в памяти) в текст, используя кэш если он подключен"""
         try:
-            with open(audio_file_path, "rb") as audio_file:
-                transcript = self.client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file,
-                    language="ru"
-                )
-                return transcript.text
+            if self.transcription_cache is None:
+                return self._request_transcription(audio, filename)
+            
+            hits_before = self.transcription_cache.hits
+            transcript = self.transcription_cache.get_or_transcribe(
+                audio,
+                lambda: self._request_transcription(audio, filename),
+                file_unique_id=file_unique_id,
+                duration_seconds=duration or 0
+            )
+            if self.transcription_cache.hits > hits_before:
+                stats = self.transcription_cache.get_stats()
+                print(f"Transcription cache hit: saved {stats['saved_latency_seconds']}s, ${stats['saved_cost_usd']} total")
+            return transcript
         except Exception as e:
             print(f"Error transcribing audio: {e}")
             return "Ошибка при транскрибировании аудио"
     
+    def _request_transcription(self, audio: Union[str, bytes], filename: str) -> str:
+        """Отправляет аудио в Whisper"""
+        if isinstance(audio, (bytes, bytearray)):
+            # Имя файла нужно Whisper для определения формата
+            transcript = self.client.audio.transcriptions.create(
+                model="whisper-1",
+                file=(filename, bytes(audio)),
+                language="ru"
+            )
+            return transcript.text
+        
+        with open(audio, "rb") as audio_file:
+            transcript = self.client.audio.transcriptions.create(
+                model="whisper-1",
+                file=audio_file,
+                language="ru"
+            )
+            return transcript.text
+    
     def generate_speech(self, text: str, voice: str = "onyx") -> bytes:
         """Генерирует аудио из текста (мужской голос по умолчанию)"""
         try:
@@ -0,0 +1,109 @@
+"""
+Модуль заранее подготовленных ответов на команды
+Статические и редко меняющиеся тексты (/start, /help, /docs без запроса) строятся один раз,
+при ответе подставляются только поля пользователя. Кэш сбрасывается по тегу при изменении источника данных
+"""
+
+import re
+import html
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+class ResponseTemplate:
+    """
+    Готовый текст ответа, заранее разбитый на статические части и поля вида {user_name}.
+    Подстановка - одна склейка частей; значения полей экранируются для parse_mode='HTML'.
+    """
+
+    def __init__(self, text: str, fields: Iterable[str] = ()):
+        self.text = text
+        self.fields = tuple(fields)
+        if self.fields:
+            pattern = re.compile("\\{(" + "|".join(re.escape(field) for field in self.fields) + ")\\}")
+            # Четные элементы - статический текст, нечетные - имена полей
+            self.parts: List[str] = pattern.split(text)
+        else:
+            self.parts = [text]
+
+    def format(self, **values) -> str:
+        """Подставляет значения полей (отсутствующие - пустой строкой)"""
+        if len(self.parts) == 1:
+            return self.text
+        parts = self.parts[:]
+        for i in range(1, len(parts), 2):
+            value = values.get(parts[i])
+            parts[i] = html.escape(str(value)) if value is not None else ""
+        return "".join(parts)
+
+
+class ResponseTemplates:
+    """
+    Реестр ответов: функция построения текста вызывается при прогреве или первом обращении,
+    затем ответ берется из кэша до вызова invalidate с одним из его тегов.
+    """
+
+    def __init__(self):
+        self.renderers: Dict[str, Tuple[Callable[[], str], Tuple[str, ...], Tuple[str, ...]]] = {}
+        self.cache: Dict[str, ResponseTemplate] = {}
+        self.generations: Dict[str, int] = {}  # Растет при каждом сбросе ответа
+        self.lock = threading.Lock()
+        self.renders = 0
+        self.hits = 0
+
+    def register(self, name: str, render: Callable[[], str], fields: Iterable[str] = (),
+                 depends_on: Iterable[str] = ()) -> None:
+        """
+        Регистрирует ответ.
+
+        Args:
+            name: Имя ответа
+            render: Строит полный текст; поля пользователя оставляются в виде {field}
+            fields: Имена полей, заполняемых при каждом ответе
+            depends_on: Теги источников данных (например, "docs"), при изменении которых текст перестраивается
+        """
+        with self.lock:
+            self.renderers[name] = (render, tuple(fields), tuple(depends_on))
+            self._drop(name)
+
+    def get(self, name: str) -> ResponseTemplate:
+        """Готовый шаблон ответа (строится при первом обращении после сброса)"""
+        template = self.cache.get(name)
+        if template is not None:
+            self.hits += 1
+            return template
+
+        with self.lock:
+            render, fields, _ = self.renderers[name]
+            generation = self.generations.get(name, 0)
+        template = ResponseTemplate(render(), fields)
+        with self.lock:
+            # Сброс во время построения оставляет кэш пустым: следующий вызов увидит новые данные
+            if self.generations.get(name, 0) == generation:
+                self.cache[name] = template
+            self.renders += 1
+        return template
+
+    def format(self, name: str, **values) -> str:
+        """Текст ответа с подставленными полями пользователя"""
+        return self.get(name).format(**values)
+
+    def invalidate(self, tag: Optional[str] = None) -> None:
+        """Сбрасывает ответы, зависящие от тега (без тега - все)"""
+        with self.lock:
+            for name, (_, _, depends_on) in self.renderers.items():
+                if tag is None or tag in depends_on:
+                    self._drop(name)
+
+    def _drop(self, name: str) -> None:
+        self.cache.pop(name, None)
+        self.generations[name] = self.generations.get(name, 0) + 1
+
+    def warm_up(self) -> None:
+        """Строит все зарегистрированные ответы заранее (при запуске бота)"""
+        for name in list(self.renderers):
+            self.get(name)
+
+    def get_stats(self) -> Dict:
+        """Число построений и попаданий в кэш"""
+        return {"templates": len(self.renderers), "cached": len(self.cache), "renders": self.renders, "hits": self.hits}
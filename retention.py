@@ -0,0 +1,225 @@
+"""
+Модуль хранения истории сообщений
+Переносит старые сообщения в сжатый архив небольшими пачками, освобождает страницы и сбрасывает WAL
+"""
+
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from message_codec import decode_rows
+
+
+class RetentionPolicy:
+    """
+    Настройки хранения истории.
+    """
+
+    def __init__(self, keep_last_messages: int = 200, min_age_days: int = 30, batch_size: int = 500,
+                 pause_seconds: float = 0.05, vacuum_pages: int = 200):
+        self.keep_last_messages = keep_last_messages  # Последние N сообщений пользователя не трогаем
+        self.min_age_days = min_age_days              # Архивируем только сообщения старше
+        self.batch_size = batch_size                  # Строк в одной транзакции
+        self.pause_seconds = pause_seconds            # Пауза между пачками, чтобы бот успевал писать
+        self.vacuum_pages = vacuum_pages              # Страниц за один шаг incremental_vacuum
+
+
+class RetentionManager:
+    """
+    Фоновая задача хранения: архив старых сообщений, incremental vacuum и checkpoint WAL.
+    Каждая пачка - отдельная короткая транзакция, блокировка записи не держится дольше одной пачки.
+    """
+
+    def __init__(self, db_path: str = "bot_database.db", policy: Optional[RetentionPolicy] = None,
+                 interval_seconds: float = 6 * 3600):
+        self.db_path = db_path
+        self.policy = policy or RetentionPolicy()
+        self.interval_seconds = interval_seconds
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Запускает периодическую задачу в фоновом потоке"""
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Останавливает задачу после текущей пачки"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=10)
+            self.thread = None
+
+    def _run(self) -> None:
+        """Цикл фонового потока"""
+        while not self.stop_event.wait(self.interval_seconds):
+            try:
+                stats = self.run_once()
+                print(f"Retention: archived {stats['archived_messages']} messages, "
+                      f"freed {stats['freed_pages']} pages")
+            except Exception as e:
+                print(f"Retention error: {e}")
+
+    def run_once(self) -> Dict:
+        """
+        Выполняет один проход хранения.
+
+        Returns:
+            Dict: archived_messages, archive_blobs, freed_pages
+        """
+        archived_messages = 0
+        archive_blobs = 0
+
+        for user_id in self._get_users_over_limit():
+            if self.stop_event.is_set():
+                break
+            while not self.stop_event.is_set():
+                count = self._archive_batch(user_id)
+                if count == 0:
+                    break
+                archived_messages += count
+                archive_blobs += 1
+                time.sleep(self.policy.pause_seconds)
+
+        freed_pages = self.vacuum()
+        self.checkpoint()
+
+        return {
+            "archived_messages": archived_messages,
+            "archive_blobs": archive_blobs,
+            "freed_pages": freed_pages,
+        }
+
+    def _get_users_over_limit(self) -> List[int]:
+        """Пользователи, у которых сообщений больше, чем нужно хранить"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT user_id FROM message_history
+                WHERE user_id IS NOT NULL
+                GROUP BY user_id
+                HAVING COUNT(*) > ?
+            ''', (self.policy.keep_last_messages,))
+            return [row[0] for row in cursor.fetchall()]
+
+    def _archive_batch(self, user_id: int) -> int:
+        """
+        Переносит одну пачку старых сообщений пользователя в архив.
+
+        Args:
+            user_id: ID пользователя Telegram
+
+        Returns:
+            int: Количество перенесенных сообщений
+        """
+        age_cutoff = (datetime.now(timezone.utc) - timedelta(days=self.policy.min_age_days)).strftime('%Y-%m-%d %H:%M:%S')
+
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                # Самое новое сообщение, которое уже не входит в последние N (по индексу user_id, timestamp)
+                cursor.execute('''
+                    SELECT timestamp, id FROM message_history
+                    WHERE user_id = ?
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT 1 OFFSET ?
+                ''', (user_id, self.policy.keep_last_messages))
+                boundary = cursor.fetchone()
+                if boundary is None:
+                    cursor.execute('COMMIT')
+                    return 0
+
+                cursor.execute('''
+                    SELECT id, user_id, message_text, message_type, timestamp FROM message_history
+                    WHERE user_id = ? AND (timestamp, id) <= (?, ?) AND timestamp < ?
+                    ORDER BY timestamp, id
+                    LIMIT ?
+                ''', (user_id, boundary['timestamp'], boundary['id'], age_cutoff, self.policy.batch_size))
+                rows = decode_rows(dict(row) for row in cursor.fetchall())
+                if not rows:
+                    cursor.execute('COMMIT')
+                    return 0
+
+                payload = zlib.compress(json.dumps(rows, ensure_ascii=False).encode('utf-8'), 9)
+                message_ids = [row['id'] for row in rows]
+                cursor.execute('''
+                    INSERT INTO message_archive (
+                        user_id, first_message_id, last_message_id, first_timestamp, last_timestamp,
+                        messages_count, payload
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    user_id,
+                    min(message_ids),
+                    max(message_ids),
+                    rows[0]['timestamp'],
+                    rows[-1]['timestamp'],
+                    len(rows),
+                    payload
+                ))
+                cursor.executemany('DELETE FROM message_history WHERE id = ?', [(message_id,) for message_id in message_ids])
+
+                cursor.execute('COMMIT')
+                return len(rows)
+            except BaseException:
+                cursor.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+
+    def get_archived_messages(self, user_id: int) -> List[Dict]:
+        """Возвращает архивные сообщения пользователя по возрастанию времени"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT payload FROM message_archive
+                WHERE user_id = ?
+                ORDER BY first_message_id
+            ''', (user_id,))
+            messages = []
+            for (payload,) in cursor.fetchall():
+                messages.extend(json.loads(zlib.decompress(payload).decode('utf-8')))
+            return messages
+
+    def vacuum(self) -> int:
+        """
+        Возвращает свободные страницы файлу по vacuum_pages за шаг.
+        Работает, если база создана с auto_vacuum = INCREMENTAL (см. migrations.migrate).
+
+        Returns:
+            int: Количество освобожденных страниц
+        """
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                return 0
+
+            freed_pages = 0
+            while not self.stop_event.is_set():
+                free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+                if free_pages == 0:
+                    break
+                step = min(free_pages, self.policy.vacuum_pages)
+                conn.execute(f'PRAGMA incremental_vacuum({int(step)})').fetchall()
+                freed_pages += step
+                time.sleep(self.policy.pause_seconds)
+            return freed_pages
+        finally:
+            conn.close()
+
+    def checkpoint(self) -> None:
+        """Переносит WAL в основной файл и обрезает его (без WAL ничего не делает)"""
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+        finally:
+            conn.close()
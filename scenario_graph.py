@@ -0,0 +1,276 @@
+"""
+Модуль для построения графа потоков данных в сценариях Make.com
+Разбирает ссылки вида {{34.field}} в mapper и filter модулей
+"""
+
+import re
+import json
+import hashlib
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Set
+
+# Выражения Make.com: всё, что находится внутри {{ ... }}
+EXPRESSION_PATTERN = re.compile(r'\{\{(.*?)\}\}', re.DOTALL)
+
+# Ссылка на выход модуля внутри выражения: 34.field, 18.result.reply_text, 29.`key`
+# Не совпадает с дробными числами (0.3) и с путями вида a.34.b
+MODULE_REFERENCE_PATTERN = re.compile(r'(?<![\w.])(\d+)\.(?!\d)')
+
+# Модули, которые только управляют потоком и не производят данных
+FLOW_CONTROL_MODULES = {'builtin:BasicRouter'}
+
+_END_OF_FLOW = object()
+
+
+def get_blueprint_hash(scenario_data: Dict) -> str:
+    """Возвращает хеш blueprint для кэширования результатов анализа"""
+    canonical = json.dumps(scenario_data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ScenarioGraphAnalyzer:
+    """
+    Строит граф зависимостей по данным между модулями сценария Make.com.
+    Результаты кэшируются по хешу blueprint.
+    """
+
+    def __init__(self, cache_size: int = 128):
+        self.cache_size = cache_size
+        self.cache: "OrderedDict[str, Dict]" = OrderedDict()  # blueprint_hash -> результат
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def analyze(self, scenario_data: Dict, blueprint_hash: Optional[str] = None) -> Dict:
+        """
+        Анализирует сценарий с использованием кэша.
+
+        Args:
+            scenario_data: Распарсенный JSON blueprint
+            blueprint_hash: Готовый хеш blueprint (если уже посчитан)
+
+        Returns:
+            Dict: Граф зависимостей и найденные проблемы
+        """
+        key = blueprint_hash or get_blueprint_hash(scenario_data)
+
+        if key in self.cache:
+            self.cache_hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        self.cache_misses += 1
+        result = self.build_graph(scenario_data)
+        self.cache[key] = result
+
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        return result
+
+    def build_graph(self, scenario_data: Dict) -> Dict:
+        """
+        Строит граф без кэширования.
+
+        Args:
+            scenario_data: Распарсенный JSON blueprint
+
+        Returns:
+            Dict: Граф зависимостей и найденные проблемы
+        """
+        modules = self._collect_modules(scenario_data.get("flow", []))
+
+        # module_id -> тип модуля, в порядке появления в сценарии
+        module_types: Dict[int, str] = {}
+        for module_item in modules:
+            module_id = self._normalize_id(module_item.get("id"))
+            if module_id is not None:
+                module_types[module_id] = module_item.get("module", "unknown")
+
+        # Список смежности: источник данных -> модули, которые его используют
+        consumers: Dict[int, Set[int]] = {module_id: set() for module_id in module_types}
+        dependencies: Dict[int, Set[int]] = {module_id: set() for module_id in module_types}
+        dangling_references: List[Dict] = []
+        references_count = 0
+
+        for module_item in modules:
+            module_id = self._normalize_id(module_item.get("id"))
+            if module_id is None:
+                continue
+
+            for source_id in self._scan_references(module_item):
+                references_count += 1
+                if source_id not in module_types:
+                    dangling_references.append({"module": module_id, "reference": source_id})
+                elif source_id != module_id:
+                    consumers[source_id].add(module_id)
+                    dependencies[module_id].add(source_id)
+                else:
+                    # Модуль ссылается сам на себя - это тоже цикл
+                    consumers[module_id].add(module_id)
+                    dependencies[module_id].add(module_id)
+
+        cycle_modules = self._find_cycle_modules(consumers)
+        critical_path = self._find_critical_path(consumers, dependencies, cycle_modules)
+
+        unused_modules = []
+        if len(module_types) > 1:
+            for module_id, module_type in module_types.items():
+                if module_type in FLOW_CONTROL_MODULES:
+                    continue
+                if not consumers[module_id] and not dependencies[module_id]:
+                    unused_modules.append(module_id)
+
+        return {
+            "modules_count": len(module_types),
+            "references_count": references_count,
+            "edges_count": sum(len(targets) for targets in consumers.values()),
+            "adjacency": {module_id: sorted(targets) for module_id, targets in consumers.items()},
+            "unused_modules": unused_modules,
+            "dangling_references": dangling_references,
+            "cycle_modules": sorted(cycle_modules),
+            "critical_path": critical_path,
+            "critical_path_depth": len(critical_path),
+        }
+
+    def clear_cache(self) -> None:
+        """Очищает кэш результатов"""
+        self.cache.clear()
+
+    def _collect_modules(self, flow: List) -> List[Dict]:
+        """Собирает все модули, включая вложенные в routes, без рекурсии"""
+        modules_found = []
+        stack = [iter(flow if isinstance(flow, list) else [])]
+
+        while stack:
+            module_item = next(stack[-1], _END_OF_FLOW)
+            if module_item is _END_OF_FLOW:
+                stack.pop()
+                continue
+            if not isinstance(module_item, dict):
+                continue
+
+            if "module" in module_item:
+                modules_found.append(module_item)
+
+            routes = module_item.get("routes")
+            if isinstance(routes, list):
+                # Routes обходятся в порядке объявления
+                nested = [route.get("flow", []) for route in routes if isinstance(route, dict)]
+                for route_flow in reversed(nested):
+                    if isinstance(route_flow, list):
+                        stack.append(iter(route_flow))
+
+        return modules_found
+
+    def _scan_references(self, module_item: Dict) -> List[int]:
+        """Находит все ссылки на другие модули в mapper и filter модуля"""
+        references = []
+        pending = [module_item.get("mapper"), module_item.get("filter")]
+
+        while pending:
+            value = pending.pop()
+            if isinstance(value, str):
+                if '{{' not in value:
+                    continue
+                for expression in EXPRESSION_PATTERN.finditer(value):
+                    for match in MODULE_REFERENCE_PATTERN.finditer(expression.group(1)):
+                        references.append(int(match.group(1)))
+            elif isinstance(value, dict):
+                pending.extend(value.values())
+            elif isinstance(value, list):
+                pending.extend(value)
+
+        return references
+
+    def _find_cycle_modules(self, consumers: Dict[int, Set[int]]) -> Set[int]:
+        """
+        Возвращает модули, участвующие в циклических зависимостях: компоненты сильной связности
+        из нескольких модулей и модули, ссылающиеся сами на себя (итеративный алгоритм Тарьяна)
+        """
+        index: Dict[int, int] = {}
+        low_link: Dict[int, int] = {}
+        on_stack: Set[int] = set()
+        component_stack: List[int] = []
+        cycle_modules: Set[int] = set()
+
+        for root in consumers:
+            if root in index:
+                continue
+            # Стек обхода: (модуль, итератор по его потребителям)
+            work = [(root, iter(consumers[root]))]
+            index[root] = low_link[root] = len(index)
+            component_stack.append(root)
+            on_stack.add(root)
+
+            while work:
+                module_id, targets = work[-1]
+                target = next(targets, _END_OF_FLOW)
+                if target is not _END_OF_FLOW:
+                    if target not in index:
+                        index[target] = low_link[target] = len(index)
+                        component_stack.append(target)
+                        on_stack.add(target)
+                        work.append((target, iter(consumers[target])))
+                    elif target in on_stack:
+                        low_link[module_id] = min(low_link[module_id], index[target])
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low_link[parent] = min(low_link[parent], low_link[module_id])
+                if low_link[module_id] == index[module_id]:
+                    component = []
+                    while True:
+                        member = component_stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == module_id:
+                            break
+                    if len(component) > 1 or module_id in consumers[module_id]:
+                        cycle_modules.update(component)
+
+        return cycle_modules
+
+    def _find_critical_path(self, consumers: Dict[int, Set[int]], dependencies: Dict[int, Set[int]],
+                            cycle_modules: Set[int]) -> List[int]:
+        """Находит самую длинную цепочку зависимостей по данным (без учета циклов)"""
+        in_degree = {
+            module_id: len(sources - cycle_modules)
+            for module_id, sources in dependencies.items()
+            if module_id not in cycle_modules
+        }
+        queue = deque(module_id for module_id, degree in in_degree.items() if degree == 0)
+        depth = {module_id: 1 for module_id in in_degree}
+        previous: Dict[int, Optional[int]] = {module_id: None for module_id in in_degree}
+
+        while queue:
+            module_id = queue.popleft()
+            for target in consumers[module_id]:
+                if target in cycle_modules:
+                    continue
+                if depth[module_id] + 1 > depth[target]:
+                    depth[target] = depth[module_id] + 1
+                    previous[target] = module_id
+                in_degree[target] -= 1
+                if in_degree[target] == 0:
+                    queue.append(target)
+
+        if not depth:
+            return []
+
+        last = max(depth, key=lambda module_id: depth[module_id])
+        path = []
+        while last is not None:
+            path.append(last)
+            last = previous[last]
+        path.reverse()
+        return path
+
+    @staticmethod
+    def _normalize_id(module_id) -> Optional[int]:
+        """Приводит ID модуля к int"""
+        try:
+            return int(module_id)
+        except (TypeError, ValueError):
+            return None
@@ -0,0 +1,304 @@
+"""
+Модуль планировщика исходящих запросов к Telegram
+Token bucket на общий лимит (~30/с) и на каждый чат (~1/с, в группах 20/мин), приоритеты и повтор после 429.
+429 в чате приостанавливает только этот чат (платежные запросы проходят), 429 без чата - всю отправку
+"""
+
+import time
+import asyncio
+import bisect
+import itertools
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+# Приоритеты: меньше - раньше
+PRIORITY_PAYMENT = 0
+PRIORITY_ADMIN = 1
+PRIORITY_MESSAGE = 2
+PRIORITY_TYPING = 3
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Секунды ожидания из ошибки 429 (telegram.error.RetryAfter и аналоги), иначе None"""
+    retry_after = getattr(error, "retry_after", None)
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    if isinstance(retry_after, (int, float)):
+        return float(retry_after)
+    return None
+
+
+class TokenBucket:
+    """
+    Ведро токенов: rate токенов в секунду, не больше capacity.
+    """
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Через сколько секунд будет доступен токен"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _SendRequest:
+    """Запрос в очереди планировщика"""
+
+    def __init__(self, priority: int, seq: int, chat_id, callback: Callable[[], Awaitable], droppable: bool,
+                 enqueued_at: float):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.callback = callback
+        self.droppable = droppable
+        self.enqueued_at = enqueued_at
+        self.attempts = 0
+        self.not_before = 0.0  # Повтор после собственного 429 - не раньше retry_after
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def __lt__(self, other: "_SendRequest") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class SendScheduler:
+    """
+    Очередь исходящих запросов с одним диспетчером.
+    Отправляет самый приоритетный запрос, для чата которого есть токен; ожидающий чат не задерживает остальные.
+    Необязательные запросы (индикатор набора) объединяются по чату и отбрасываются, если устарели.
+    """
+
+    def __init__(self, global_rate: float = 30.0, per_chat_rate: float = 1.0, per_chat_burst: int = 3,
+                 group_rate: float = 20 / 60, group_burst: int = 20, max_droppable_delay: float = 3.0,
+                 max_retries: int = 3, clock: Callable[[], float] = time.monotonic):
+        self.global_rate = global_rate
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.group_rate = group_rate          # Лимит Telegram для групп: 20 сообщений в минуту
+        self.group_burst = group_burst
+        self.max_droppable_delay = max_droppable_delay  # Устаревший индикатор набора уже не нужен
+        self.max_retries = max_retries        # Повторы после 429
+        self.clock = clock
+        self.global_bucket = TokenBucket(global_rate, global_rate, clock())
+        self.chat_buckets: Dict[object, TokenBucket] = {}
+        self.pending: List[_SendRequest] = []
+        self.pending_droppable: Dict[object, _SendRequest] = {}
+        self.paused_until = 0.0               # Пауза всей отправки (429 на запрос без чата)
+        self.chat_paused_until: Dict[object, float] = {}  # Пауза отдельных чатов после 429
+        self.seq = itertools.count()
+        self.wakeup: Optional[asyncio.Event] = None
+        self.dispatcher: Optional[asyncio.Task] = None
+        self.tasks: Set[asyncio.Task] = set()
+        self.last_cleanup = clock()
+        self.stats = {"sent": 0, "dropped": 0, "coalesced": 0, "retried": 0, "throttled": 0, "failed": 0}
+
+    async def submit(self, callback: Callable[[], Awaitable], chat_id=None, priority: int = PRIORITY_MESSAGE,
+                     droppable: bool = False):
+        """
+        Ставит запрос в очередь и ждет его выполнения.
+
+        Args:
+            callback: Функция без аргументов, выполняющая запрос к Bot API
+            chat_id: Чат назначения (None - только общий лимит)
+            priority: PRIORITY_* (меньше - раньше)
+            droppable: Запрос можно объединить с таким же и отбросить при перегрузке
+
+        Returns:
+            Результат callback или None, если запрос отброшен
+        """
+        self._ensure_dispatcher()
+        if droppable and chat_id in self.pending_droppable:
+            # Такой же запрос для чата уже ждет отправки
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(self.pending_droppable[chat_id].future)
+
+        request = _SendRequest(priority, next(self.seq), chat_id, callback, droppable, self.clock())
+        if droppable:
+            self.pending_droppable[chat_id] = request
+        self._enqueue(request)
+        return await request.future
+
+    def _ensure_dispatcher(self) -> None:
+        if self.dispatcher is None or self.dispatcher.done():
+            self.wakeup = asyncio.Event()
+            self.dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+
+    def _enqueue(self, request: _SendRequest) -> None:
+        bisect.insort(self.pending, request)
+        self.wakeup.set()
+
+    def _chat_bucket(self, chat_id, now: float) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if _is_group(chat_id):
+                bucket = TokenBucket(self.group_rate, self.group_burst, now)
+            else:
+                bucket = TokenBucket(self.per_chat_rate, self.per_chat_burst, now)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def _dispatch(self) -> None:
+        """Цикл диспетчера: отправляет все, что разрешают лимиты, и спит до следующего токена"""
+        while True:
+            self.wakeup.clear()
+            delay = self._send_ready(self.clock())
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _send_ready(self, now: float) -> Optional[float]:
+        """Запускает готовые запросы и возвращает время до следующей возможной отправки (None - очередь пуста)"""
+        if now < self.paused_until:
+            return self.paused_until - now
+
+        next_delay = None
+        remaining = []
+        for index, request in enumerate(self.pending):
+            if request.future.done():
+                continue
+            if request.droppable and now - request.enqueued_at > self.max_droppable_delay:
+                self._drop(request)
+                continue
+
+            hold = self._hold_time(request, now)
+            if hold > 0:
+                remaining.append(request)
+                next_delay = hold if next_delay is None else min(next_delay, hold)
+                continue
+
+            global_wait = self.global_bucket.wait_time(now)
+            if global_wait > 0:
+                # Общий лимит исчерпан: остальные ждут в прежнем порядке
+                remaining.extend(self.pending[index:])
+                next_delay = global_wait
+                break
+
+            chat_wait = self._chat_bucket(request.chat_id, now).wait_time(now) if request.chat_id is not None else 0.0
+            if chat_wait > 0:
+                remaining.append(request)
+                next_delay = chat_wait if next_delay is None else min(next_delay, chat_wait)
+                continue
+
+            self.global_bucket.consume(now)
+            if request.chat_id is not None:
+                self.chat_buckets[request.chat_id].consume(now)
+            self._start(request)
+
+        self.pending = remaining
+        if now - self.last_cleanup > 60:
+            self._cleanup(now)
+        return next_delay
+
+    def _hold_time(self, request: _SendRequest, now: float) -> float:
+        """Сколько запрос должен ждать из-за 429: своего или другого запроса в том же чате"""
+        hold = request.not_before - now
+        if request.chat_id is not None and request.priority != PRIORITY_PAYMENT:
+            # Ответ на pre-checkout Telegram ждет не дольше 10 секунд - пауза чата его не задерживает
+            hold = max(hold, self.chat_paused_until.get(request.chat_id, 0.0) - now)
+        return max(0.0, hold)
+
+    def _start(self, request: _SendRequest) -> None:
+        if self.pending_droppable.get(request.chat_id) is request:
+            del self.pending_droppable[request.chat_id]
+        task = asyncio.get_running_loop().create_task(self._run(request))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _run(self, request: _SendRequest) -> None:
+        """Выполняет запрос; после 429 ставит паузу чату (без чата - всем) и возвращает запрос в очередь"""
+        request.attempts += 1
+        try:
+            result = await request.callback()
+        except Exception as e:
+            retry_after = get_retry_after(e)
+            if retry_after is not None:
+                self.stats["throttled"] += 1
+                resume_at = self.clock() + retry_after
+                request.not_before = resume_at
+                if request.chat_id is not None:
+                    self.chat_paused_until[request.chat_id] = max(
+                        self.chat_paused_until.get(request.chat_id, 0.0), resume_at
+                    )
+                else:
+                    self.paused_until = max(self.paused_until, resume_at)
+                if request.droppable:
+                    self._drop(request)
+                    return
+                if request.attempts <= self.max_retries:
+                    self.stats["retried"] += 1
+                    self._enqueue(request)
+                    return
+            self.stats["failed"] += 1
+            if not request.future.done():
+                request.future.set_exception(e)
+        else:
+            self.stats["sent"] += 1
+            if not request.future.done():
+                request.future.set_result(result)
+
+    def _drop(self, request: _SendRequest) -> None:
+        self.stats["dropped"] += 1
+        if self.pending_droppable.get(request.chat_id) is request:
+            del self.pending_droppable[request.chat_id]
+        if not request.future.done():
+            request.future.set_result(None)
+
+    def _cleanup(self, now: float) -> None:
+        """Удаляет полные ведра неактивных чатов - новое ведро для них будет таким же"""
+        waiting = {request.chat_id for request in self.pending}
+        for chat_id in [chat_id for chat_id, bucket in self.chat_buckets.items()
+                        if chat_id not in waiting and bucket.is_full(now)]:
+            del self.chat_buckets[chat_id]
+        for chat_id in [chat_id for chat_id, until in self.chat_paused_until.items() if until <= now]:
+            del self.chat_paused_until[chat_id]
+        self.last_cleanup = now
+
+    def get_stats(self) -> Dict:
+        """Счетчики отправки и глубина очереди"""
+        return {
+            **self.stats,
+            "queue_depth": len(self.pending),
+            "paused_for": max(0.0, self.paused_until - self.clock()),
+            "paused_chats": sum(1 for until in self.chat_paused_until.values() if until > self.clock()),
+            "chats": len(self.chat_buckets),
+        }
+
+    async def close(self) -> None:
+        """Останавливает диспетчер, ожидающие запросы отменяются"""
+        if self.dispatcher is not None:
+            self.dispatcher.cancel()
+            try:
+                await self.dispatcher
+            except asyncio.CancelledError:
+                pass
+            self.dispatcher = None
+        for request in self.pending:
+            request.future.cancel()
+        self.pending = []
+        self.pending_droppable.clear()
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+def _is_group(chat_id) -> bool:
+    """Группы и каналы в Telegram имеют отрицательный ID"""
+    try:
+        return int(chat_id) < 0
+    except (TypeError, ValueError):
+        return str(chat_id).startswith("@")
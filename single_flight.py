@@ -0,0 +1,192 @@
+"""
+Модуль объединения одинаковых одновременных запросов (single-flight)
+Пока операция с ключом выполняется, остальные вызовы с тем же ключом ждут ее результат, а не запускают свою
+"""
+
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class _KeyStats:
+    """Счетчики одного ключа"""
+
+    def __init__(self):
+        self.calls = 0        # Все вызовы
+        self.executions = 0   # Реальные выполнения операции
+        self.shared = 0       # Вызовы, получившие чужой результат
+        self.timeouts = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "shared": self.shared,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "avg_seconds": round(self.total_seconds / self.executions, 4) if self.executions else None,
+        }
+
+
+class _Metrics:
+    """Метрики по ключам (хранятся для max_keys последних ключей) и общие"""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self.keys: "OrderedDict[Hashable, _KeyStats]" = OrderedDict()
+        self.total = _KeyStats()
+
+    def get(self, key: Hashable) -> _KeyStats:
+        stats = self.keys.get(key)
+        if stats is None:
+            stats = _KeyStats()
+            self.keys[key] = stats
+            if len(self.keys) > self.max_keys:
+                self.keys.popitem(last=False)
+        else:
+            self.keys.move_to_end(key)
+        return stats
+
+    def record(self, key: Hashable, **increments) -> None:
+        for stats in (self.get(key), self.total):
+            for name, value in increments.items():
+                setattr(stats, name, getattr(stats, name) + value)
+
+    def snapshot(self, top: int) -> Dict:
+        busiest = sorted(self.keys.items(), key=lambda item: item[1].shared, reverse=True)[:top]
+        return {
+            **self.total.as_dict(),
+            "in_flight_keys": 0,
+            "top_keys": {str(key): stats.as_dict() for key, stats in busiest if stats.shared},
+        }
+
+
+class _Call:
+    """Выполняющаяся операция"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Single-flight для синхронного кода, вызываемого из нескольких потоков.
+    """
+
+    def __init__(self, name: str, max_tracked_keys: int = 1000):
+        self.name = name
+        self.calls: Dict[Hashable, _Call] = {}
+        self.lock = threading.Lock()
+        self.metrics = _Metrics(max_tracked_keys)
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """
+        Выполняет fn или ждет результат уже запущенного вызова с тем же ключом.
+
+        Args:
+            key: Ключ операции
+            fn: Операция без аргументов
+            timeout: Сколько ждущий вызов готов ждать чужой результат (TimeoutError по истечении)
+
+        Returns:
+            Результат fn (общий для всех одновременных вызовов)
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _Call()
+                self.calls[key] = call
+                self.metrics.record(key, calls=1, executions=1)
+            else:
+                self.metrics.record(key, calls=1, shared=1)
+
+        if is_leader:
+            started = time.monotonic()
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self.lock:
+                    del self.calls[key]
+                    self.metrics.record(key, total_seconds=time.monotonic() - started,
+                                        errors=1 if call.error is not None else 0)
+                call.done.set()
+        elif not call.done.wait(timeout):
+            with self.lock:
+                self.metrics.record(key, timeouts=1)
+            raise TimeoutError(f"{self.name}: не дождались результата для {key!r}")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def get_stats(self, top: int = 5) -> Dict:
+        """Общие счетчики и ключи с наибольшим числом объединенных вызовов"""
+        with self.lock:
+            stats = self.metrics.snapshot(top)
+            stats["in_flight_keys"] = len(self.calls)
+        return stats
+
+
+class AsyncSingleFlight:
+    """
+    Single-flight для корутин одного цикла событий.
+    Операция выполняется в отдельной задаче: таймаут или отмена одного вызова не прерывает ее для остальных.
+    """
+
+    def __init__(self, name: str, max_tracked_keys: int = 1000):
+        self.name = name
+        self.tasks: Dict[Hashable, asyncio.Task] = {}
+        self.metrics = _Metrics(max_tracked_keys)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable], timeout: Optional[float] = None) -> Any:
+        """
+        Выполняет корутину fn() или ждет уже запущенную с тем же ключом.
+
+        Args:
+            key: Ключ операции
+            fn: Функция без аргументов, возвращающая корутину
+            timeout: Максимальное ожидание для этого вызова (asyncio.TimeoutError по истечении)
+
+        Returns:
+            Результат операции (общий для всех одновременных вызовов)
+        """
+        task = self.tasks.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._run(key, fn))
+            self.tasks[key] = task
+            self.metrics.record(key, calls=1, executions=1)
+        else:
+            self.metrics.record(key, calls=1, shared=1)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            self.metrics.record(key, timeouts=1)
+            raise
+
+    async def _run(self, key: Hashable, fn: Callable[[], Awaitable]) -> Any:
+        started = time.monotonic()
+        failed = False
+        try:
+            return await fn()
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            del self.tasks[key]
+            self.metrics.record(key, total_seconds=time.monotonic() - started, errors=1 if failed else 0)
+
+    def get_stats(self, top: int = 5) -> Dict:
+        """Общие счетчики и ключи с наибольшим числом объединенных вызовов"""
+        stats = self.metrics.snapshot(top)
+        stats["in_flight_keys"] = len(self.tasks)
+        return stats
@@ -0,0 +1,162 @@
+"""
+Модуль для синтеза речи из ответов бота
+Очищает HTML, делит длинный текст по предложениям и синтезирует части параллельно
+"""
+
+import re
+import html
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+# Разделители для озвучивания
+TAG_PATTERN = re.compile(r'<[^>]+>')
+DECORATION_PATTERN = re.compile(r'[━─═]{3,}')
+WHITESPACE_PATTERN = re.compile(r'[ \t]+')
+SENTENCE_END_PATTERN = re.compile(r'(?<=[.!?…])\s+|\n+')
+
+# Лимит tts-1 на длину входа - 4096 символов; части меньше, чтобы ответ начинался быстрее
+DEFAULT_CHUNK_SIZE = 800
+
+
+def strip_markup(text: str) -> str:
+    """Удаляет HTML теги, сущности и декоративные линии, оставляя текст для озвучивания"""
+    text = TAG_PATTERN.sub('', text)
+    text = html.unescape(text)
+    text = DECORATION_PATTERN.sub('', text)
+    text = WHITESPACE_PATTERN.sub(' ', text)
+    lines = [line.strip() for line in text.splitlines()]
+    return '\n'.join(line for line in lines if line)
+
+
+def split_text(text: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[str]:
+    """
+    Делит текст на части не длиннее chunk_size по границам предложений.
+
+    Args:
+        text: Очищенный текст
+        chunk_size: Максимальная длина части
+
+    Returns:
+        List[str]: Части текста в исходном порядке
+    """
+    chunks = []
+    current = ''
+
+    for sentence in SENTENCE_END_PATTERN.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+
+        # Слишком длинное предложение режем по словам
+        while len(sentence) > chunk_size:
+            cut = sentence.rfind(' ', 0, chunk_size)
+            if cut <= 0:
+                cut = chunk_size
+            if current:
+                chunks.append(current)
+                current = ''
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+
+        if current and len(current) + 1 + len(sentence) > chunk_size:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+
+    if current:
+        chunks.append(current)
+
+    return chunks
+
+
+class SpeechSynthesizer:
+    """
+    Синтезирует речь частями с параллельными запросами и кэшем одинаковых фрагментов.
+    """
+
+    def __init__(self, generate_speech: Callable[[str, str], bytes], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 max_workers: int = 4, max_cache_bytes: int = 20 * 1024 * 1024):
+        self.generate_speech = generate_speech  # (text, voice) -> bytes, b"" при ошибке
+        self.chunk_size = chunk_size
+        self.max_cache_bytes = max_cache_bytes
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts")
+        self.cache: "OrderedDict[str, bytes]" = OrderedDict()  # hash(voice + текст) -> аудио
+        self.cache_bytes = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.lock = threading.Lock()
+
+    async def synthesize(self, text: str, voice: str = "onyx") -> bytes:
+        """
+        Синтезирует текст ответа в одно аудио.
+
+        Args:
+            text: Текст ответа (может содержать HTML)
+            voice: Голос tts-1
+
+        Returns:
+            bytes: MP3 аудио или b"" если синтез не удался
+        """
+        chunks = split_text(strip_markup(text), self.chunk_size)
+        if not chunks:
+            return b""
+
+        loop = asyncio.get_running_loop()
+        parts = await asyncio.gather(*[
+            loop.run_in_executor(self.executor, self.synthesize_chunk, chunk, voice)
+            for chunk in chunks
+        ])
+
+        if not all(parts):
+            return b""
+
+        # MP3 фреймы независимы, поэтому части можно склеить подряд
+        return b"".join(parts)
+
+    def synthesize_chunk(self, chunk: str, voice: str) -> bytes:
+        """Синтезирует одну часть текста, используя кэш"""
+        key = hashlib.sha256(f"{voice}\n{chunk}".encode('utf-8')).hexdigest()
+
+        cached = self._get_cached(key)
+        if cached is not None:
+            return cached
+
+        audio_data = self.generate_speech(chunk, voice)
+        if audio_data:
+            self._put_cached(key, audio_data)
+        return audio_data
+
+    def shutdown(self) -> None:
+        """Останавливает потоки синтеза"""
+        self.executor.shutdown(wait=False)
+
+    def _get_cached(self, key: str) -> Optional[bytes]:
+        """Возвращает аудио из кэша"""
+        with self.lock:
+            audio_data = self.cache.get(key)
+            if audio_data is None:
+                self.cache_misses += 1
+                return None
+            self.cache_hits += 1
+            self.cache.move_to_end(key)
+            return audio_data
+
+    def _put_cached(self, key: str, audio_data: bytes) -> None:
+        """Сохраняет аудио в кэш, вытесняя самые давно использованные записи"""
+        if len(audio_data) > self.max_cache_bytes:
+            return
+
+        with self.lock:
+            if key in self.cache:
+                return
+            self.cache[key] = audio_data
+            self.cache_bytes += len(audio_data)
+
+            while self.cache_bytes > self.max_cache_bytes:
+                _, evicted = self.cache.popitem(last=False)
+                self.cache_bytes -= len(evicted)
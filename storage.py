@@ -0,0 +1,180 @@
+"""
+Модуль интерфейсов хранилища бота
+Общий набор методов для SQLite (DatabaseManager) и асинхронного серверного хранилища (AsyncDatabaseManager)
+"""
+
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+# Курсор страницы: (время сортировки, id последней строки)
+PageCursor = Tuple[str, int]
+
+
+class StorageBackend(ABC):
+    """
+    Синхронное хранилище пользователей, истории, платежей и расписания.
+    """
+
+    @abstractmethod
+    def user_exists(self, user_id: int) -> bool:
+        """Проверяет существование пользователя"""
+
+    @abstractmethod
+    def get_user(self, user_id: int) -> Optional[Dict]:
+        """Получает данные пользователя"""
+
+    @abstractmethod
+    def create_user(self, user_data: Dict) -> str:
+        """Создает нового пользователя и возвращает thread_id"""
+
+    @abstractmethod
+    def update_user_thread(self, user_id: int, thread_id: str) -> None:
+        """Обновляет thread_id пользователя"""
+
+    @abstractmethod
+    def save_message(self, user_id: int, message_text: str, message_type: str = 'user') -> None:
+        """Сохраняет сообщение в историю"""
+
+    @abstractmethod
+    def get_user_messages(self, user_id: int, limit: int = 10) -> List[Dict]:
+        """Получает последние сообщения пользователя"""
+
+    @abstractmethod
+    def save_payment(self, payment_data: Dict) -> None:
+        """Сохраняет информацию о платеже"""
+
+    @abstractmethod
+    def update_payment_status(self, invoice_payload: str, status: str) -> None:
+        """Обновляет статус платежа"""
+
+    @abstractmethod
+    def payment_exists(self, invoice_payload: str) -> bool:
+        """Проверяет существование платежа"""
+
+    @abstractmethod
+    def get_user_payments(self, user_id: int) -> List[Dict]:
+        """Получает все платежи пользователя"""
+
+    @abstractmethod
+    def get_user_payments_page(self, user_id: int, limit: int = 5,
+                               after: Optional[PageCursor] = None) -> Tuple[List[Dict], Optional[PageCursor]]:
+        """Получает страницу платежей пользователя и курсор следующей страницы"""
+
+    @abstractmethod
+    def get_payment_by_id(self, payment_id: int) -> Optional[Dict]:
+        """Получает платеж по ID"""
+
+    @abstractmethod
+    def save_schedule(self, schedule_data: Dict) -> int:
+        """Сохраняет запись в расписании"""
+
+    @abstractmethod
+    def add_schedule_entry(self, user_id: int, payment_id: int, lesson_type: str,
+                           scheduled_datetime: str, duration_minutes: int = 120, notes: str = "") -> int:
+        """Добавляет запись в расписание"""
+
+    @abstractmethod
+    def ingest_payment(self, payment_data: Dict, user_data: Dict, schedule_data: Dict) -> Optional[int]:
+        """Принимает успешный платеж одной транзакцией и возвращает ID записи расписания"""
+
+    @abstractmethod
+    def check_schedule_conflict(self, scheduled_datetime: str, duration_minutes: int = 120) -> bool:
+        """Проверяет, пересекается ли интервал с активными занятиями"""
+
+    @abstractmethod
+    def get_schedule_for_date(self, date_str: str) -> List[Dict]:
+        """Получает расписание на конкретную дату"""
+
+    @abstractmethod
+    def get_user_schedule(self, user_id: int) -> List[Dict]:
+        """Получает расписание пользователя"""
+
+    @abstractmethod
+    def get_user_schedule_page(self, user_id: int, limit: int = 5,
+                               after: Optional[PageCursor] = None) -> Tuple[List[Dict], Optional[PageCursor]]:
+        """Получает страницу расписания пользователя и курсор следующей страницы"""
+
+
+class AsyncStorageBackend(ABC):
+    """
+    Асинхронное хранилище с тем же набором методов, что и StorageBackend.
+    """
+
+    @abstractmethod
+    async def user_exists(self, user_id: int) -> bool:
+        """Проверяет существование пользователя"""
+
+    @abstractmethod
+    async def get_user(self, user_id: int) -> Optional[Dict]:
+        """Получает данные пользователя"""
+
+    @abstractmethod
+    async def create_user(self, user_data: Dict) -> str:
+        """Создает нового пользователя и возвращает thread_id"""
+
+    @abstractmethod
+    async def update_user_thread(self, user_id: int, thread_id: str) -> None:
+        """Обновляет thread_id пользователя"""
+
+    @abstractmethod
+    async def save_message(self, user_id: int, message_text: str, message_type: str = 'user') -> None:
+        """Сохраняет сообщение в историю"""
+
+    @abstractmethod
+    async def get_user_messages(self, user_id: int, limit: int = 10) -> List[Dict]:
+        """Получает последние сообщения пользователя"""
+
+    @abstractmethod
+    async def save_payment(self, payment_data: Dict) -> None:
+        """Сохраняет информацию о платеже"""
+
+    @abstractmethod
+    async def update_payment_status(self, invoice_payload: str, status: str) -> None:
+        """Обновляет статус платежа"""
+
+    @abstractmethod
+    async def payment_exists(self, invoice_payload: str) -> bool:
+        """Проверяет существование платежа"""
+
+    @abstractmethod
+    async def get_user_payments(self, user_id: int) -> List[Dict]:
+        """Получает все платежи пользователя"""
+
+    @abstractmethod
+    async def get_user_payments_page(self, user_id: int, limit: int = 5,
+                                     after: Optional[PageCursor] = None) -> Tuple[List[Dict], Optional[PageCursor]]:
+        """Получает страницу платежей пользователя и курсор следующей страницы"""
+
+    @abstractmethod
+    async def get_payment_by_id(self, payment_id: int) -> Optional[Dict]:
+        """Получает платеж по ID"""
+
+    @abstractmethod
+    async def save_schedule(self, schedule_data: Dict) -> int:
+        """Сохраняет запись в расписании"""
+
+    @abstractmethod
+    async def add_schedule_entry(self, user_id: int, payment_id: int, lesson_type: str,
+                                 scheduled_datetime: str, duration_minutes: int = 120, notes: str = "") -> int:
+        """Добавляет запись в расписание"""
+
+    @abstractmethod
+    async def ingest_payment(self, payment_data: Dict, user_data: Dict, schedule_data: Dict) -> Optional[int]:
+        """Принимает успешный платеж одной транзакцией и возвращает ID записи расписания"""
+
+    @abstractmethod
+    async def check_schedule_conflict(self, scheduled_datetime: str, duration_minutes: int = 120) -> bool:
+        """Проверяет, пересекается ли интервал с активными занятиями"""
+
+    @abstractmethod
+    async def get_schedule_for_date(self, date_str: str) -> List[Dict]:
+        """Получает расписание на конкретную дату"""
+
+    @abstractmethod
+    async def get_user_schedule(self, user_id: int) -> List[Dict]:
+        """Получает расписание пользователя"""
+
+    @abstractmethod
+    async def get_user_schedule_page(self, user_id: int, limit: int = 5,
+                                     after: Optional[PageCursor] = None) -> Tuple[List[Dict], Optional[PageCursor]]:
+        """Получает страницу расписания пользователя и курсор следующей страницы"""
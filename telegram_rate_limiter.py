@@ -0,0 +1,66 @@
+"""
+Модуль ограничения скорости запросов python-telegram-bot
+Все вызовы Bot API (send_message, send_chat_action, send_voice, send_invoice, ответы на запросы)
+проходят через SendScheduler с приоритетом по методу
+"""
+
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Union
+
+from telegram.ext import BaseRateLimiter
+
+from send_scheduler import SendScheduler, PRIORITY_PAYMENT, PRIORITY_MESSAGE, PRIORITY_TYPING
+
+# Приоритет по методу Bot API; остальные методы - PRIORITY_MESSAGE
+ENDPOINT_PRIORITIES = {
+    "answerPreCheckoutQuery": PRIORITY_PAYMENT,  # Telegram ждет ответ не дольше 10 секунд
+    "sendInvoice": PRIORITY_PAYMENT,
+    "sendChatAction": PRIORITY_TYPING,
+}
+
+# Служебные методы не расходуют лимит отправки (getUpdates к тому же висит до таймаута)
+BYPASS_ENDPOINTS = {"getUpdates", "getMe", "getFile", "setWebhook", "deleteWebhook", "getWebhookInfo"}
+
+
+class TelegramRateLimiter(BaseRateLimiter[Dict]):
+    """
+    Rate limiter для Application.builder().rate_limiter(...).
+    Приоритет можно задать вызову: bot.send_message(..., rate_limit_args={"priority": PRIORITY_PAYMENT})
+    """
+
+    def __init__(self, scheduler: Optional[SendScheduler] = None):
+        self.scheduler = scheduler or SendScheduler()
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        await self.scheduler.close()
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict, List[Dict]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Dict],
+    ) -> Union[bool, Dict, List[Dict]]:
+        if endpoint in BYPASS_ENDPOINTS:
+            return await callback(*args, **kwargs)
+
+        priority = ENDPOINT_PRIORITIES.get(endpoint, PRIORITY_MESSAGE)
+        if rate_limit_args and "priority" in rate_limit_args:
+            priority = rate_limit_args["priority"]
+
+        chat_id = data.get("chat_id")
+        try:
+            chat_id = int(chat_id) if chat_id is not None else None
+        except (TypeError, ValueError):
+            pass  # @username канала
+
+        is_typing = endpoint == "sendChatAction"
+        result = await self.scheduler.submit(
+            lambda: callback(*args, **kwargs), chat_id=chat_id, priority=priority, droppable=is_typing
+        )
+        # Отброшенный индикатор набора для вызывающего кода выглядит как успешный
+        return True if result is None and is_typing else result
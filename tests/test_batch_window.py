@@ -0,0 +1,55 @@
+import os
+import sys
+
+# Ensure the project root is on the path so that 'batch_window' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from batch_window import AdaptiveBatchWindow
+
+
+def send_series(window, user_id, start, gaps):
+    """Серия сообщений с заданными паузами; возвращает задержку после последнего"""
+    now = start
+    delay = window.on_message(user_id, now)
+    for gap in gaps:
+        now += gap
+        delay = window.on_message(user_id, now)
+    window.batch_closed(user_id)
+    return delay
+
+
+def test_fast_typist_gets_shorter_window_than_slow_typist():
+    window = AdaptiveBatchWindow(max_window=10, min_window=1)
+    start = 0
+    for _ in range(15):
+        send_series(window, 1, start, [0.8, 1.0, 0.9])
+        send_series(window, 2, start, [6.0, 7.0, 6.5])
+        start += 100
+
+    assert window.window(1) < 3
+    assert 7 < window.window(2) <= 10
+
+
+def test_new_user_window_is_below_fixed_timeout():
+    window = AdaptiveBatchWindow(max_window=10)
+    assert window.on_message(1, 0) == window.window(1) < 10
+
+
+def test_long_pauses_start_new_series_and_are_not_learned():
+    window = AdaptiveBatchWindow(max_window=10)
+    before = window.window(1)
+    for i in range(10):
+        send_series(window, 1, i * 60, [])
+
+    assert window.window(1) == before
+
+
+def test_batch_is_closed_by_max_wait():
+    window = AdaptiveBatchWindow(max_window=10, max_wait=15)
+    window.on_message(1, 0)
+    window.on_message(1, 5)
+    window.on_message(1, 10)
+
+    assert window.on_message(1, 14) == 1
+    window.batch_closed(1)
+    assert window.on_message(1, 16) > 1
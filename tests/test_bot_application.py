@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+import asyncio
+
+import pytest
+
+# Ensure the project root is on the path so that 'bot_application' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+pytest.importorskip("telegram")
+
+from telegram import PreCheckoutQuery, Update, User
+
+from bot_application import build_application
+from document_processor import DocumentProcessingPool
+
+
+def sleepy_job(source):
+    time.sleep(1)
+    return source
+
+
+def test_second_chat_is_served_while_document_is_processed():
+    application = build_application("123456:TEST", concurrent_updates=4)
+    processor = application.update_processor
+    pool = DocumentProcessingPool(max_workers=1, timeout_seconds=10)
+    served = []
+
+    async def document_chat():
+        await pool.run(sleepy_job, b"scenario")
+        served.append("document")
+
+    async def text_chat():
+        served.append("text")
+
+    async def scenario():
+        await processor.initialize()
+        try:
+            # Так же Application передает обновления из очереди в обработчики
+            document = asyncio.ensure_future(processor.process_update(object(), document_chat()))
+            await asyncio.sleep(0.1)
+            await asyncio.wait_for(processor.process_update(object(), text_chat()), 0.5)
+            assert not document.done()
+            await document
+        finally:
+            await processor.shutdown()
+
+    pool.start()
+    try:
+        asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+
+    assert processor.regular_limit == 4
+    assert served == ["text", "document"]
+
+
+def test_pre_checkout_is_answered_when_all_slots_are_busy():
+    processor = build_application("123456:TEST", concurrent_updates=1).update_processor
+    pre_checkout = Update(1, pre_checkout_query=PreCheckoutQuery(
+        "query", User(1, "Покупатель", False), "RUB", 1000000, "mentorship_1_1 занятие (2 часа)"
+    ))
+    release = None
+    served = []
+
+    async def slow_handler(name):
+        await release.wait()
+        served.append(name)
+
+    async def answer_pre_checkout():
+        served.append("pre_checkout")
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        await processor.initialize()
+        busy = asyncio.ensure_future(processor.process_update(object(), slow_handler("voice")))
+        waiting = asyncio.ensure_future(processor.process_update(object(), slow_handler("text")))
+        await asyncio.sleep(0.05)
+        await asyncio.wait_for(processor.process_update(pre_checkout, answer_pre_checkout()), 0.5)
+        assert not waiting.done()
+        release.set()
+        await asyncio.gather(busy, waiting)
+        await processor.shutdown()
+
+    asyncio.run(scenario())
+
+    assert served == ["pre_checkout", "voice", "text"]
@@ -0,0 +1,100 @@
+import os
+import sys
+import sqlite3
+
+import pytest
+
+# Ensure the project root is on the path so that 'cached_database' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from cached_database import CachedDatabaseManager
+from database import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    return CachedDatabaseManager(str(tmp_path / "bot.db"))
+
+
+def test_payment_negative_cache_invalidated_on_save(db):
+    assert db.payment_exists("invoice_1") is False
+    assert db.payment_exists("invoice_1") is False
+
+    db.save_payment({'user_id': 1, 'invoice_payload': "invoice_1", 'total_amount': 100})
+    assert db.payment_exists("invoice_1") is True
+    assert db.payment_exists("invoice_1") is True
+
+    stats = db.get_cache_stats()["payments"]
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+
+
+def test_user_cache_invalidated_on_writes(db):
+    assert db.user_exists(42) is False
+
+    thread_id = db.create_user({'user_id': 42, 'first_name': "Анна"})
+    assert db.user_exists(42) is True
+    assert db.get_user(42)["thread_id"] == thread_id
+
+    db.update_user_thread(42, "thread_new")
+    assert db.get_user(42)["thread_id"] == "thread_new"
+
+    # Изменение возвращенного словаря не портит кэш
+    db.get_user(42)["thread_id"] = "mutated"
+    assert db.get_user(42)["thread_id"] == "thread_new"
+
+
+def test_cached_reads_skip_database(db, monkeypatch):
+    db.create_user({'user_id': 7})
+    assert db.user_exists(7) is True
+    assert db.payment_exists("missing") is False
+
+    def fail(*args, **kwargs):
+        raise AssertionError("database should not be queried")
+
+    monkeypatch.setattr('database.sqlite3.connect', fail)
+    assert db.user_exists(7) is True
+    assert db.payment_exists("missing") is False
+
+
+def test_expired_entries_are_reloaded(tmp_path, monkeypatch):
+    db = CachedDatabaseManager(str(tmp_path / "bot.db"), negative_ttl_seconds=30)
+    now = [1000.0]
+    monkeypatch.setattr('cached_database.time.monotonic', lambda: now[0])
+
+    assert db.payment_exists("late") is False
+    # Платеж записан другим процессом мимо кэша
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("INSERT INTO payments (user_id, invoice_payload) VALUES (1, 'late')")
+
+    assert db.payment_exists("late") is False
+    now[0] += 31
+    assert db.payment_exists("late") is True
+
+
+def test_stale_negative_read_is_not_cached_after_concurrent_save(db, monkeypatch):
+    read_payment = DatabaseManager.payment_exists
+
+    def read_then_payment_arrives(self, invoice_payload):
+        exists = read_payment(self, invoice_payload)
+        # Платеж записан другим потоком после чтения, но до заполнения кэша
+        monkeypatch.undo()
+        self.save_payment({'user_id': 1, 'invoice_payload': invoice_payload, 'total_amount': 100})
+        return exists
+
+    monkeypatch.setattr(DatabaseManager, 'payment_exists', read_then_payment_arrives)
+
+    assert db.payment_exists("invoice_race") is False
+    assert db.payment_exists("invoice_race") is True
+
+
+def test_generations_stay_bounded(tmp_path):
+    db = CachedDatabaseManager(str(tmp_path / "bot.db"), max_entries=2)
+    generation = db.payments_cache.generation("a")
+    for key in ("a", "b", "c"):
+        db.payments_cache.invalidate(key)
+
+    # Поколение "a" вытеснено, но значение, прочитанное до его сброса, все равно не сохраняется
+    assert len(db.payments_cache.generations) == 2
+    db.payments_cache.set("a", False, 30, generation)
+    assert "a" not in db.payments_cache.entries
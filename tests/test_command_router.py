@@ -0,0 +1,69 @@
+import os
+import sys
+
+import pytest
+
+# Ensure the project root is on the path so that 'command_router' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from command_router import CommandRouter
+
+
+def make_router():
+    router = CommandRouter()
+    for name in ("start", "help", "docs", "time"):
+        router.register(name, lambda user_id, user_name, args, name=name: {"command": name, "args": args})
+    router.register("report", lambda user_id, user_name, args: {}, bypass_debounce=False)
+    return router
+
+
+def test_plain_text_is_not_a_command():
+    router = make_router()
+
+    assert router.route("как настроить вебхук?") is None
+    assert router.route("") is None
+    assert router.route(None) is None
+    assert router.route("/") is None
+
+
+def test_exact_names_only():
+    router = make_router()
+
+    assert router.route("/time").command.name == "time"
+    # Прежняя цепочка startswith отправляла /timezone в /time
+    routed = router.route("/timezone")
+    assert routed.command is None and routed.name == "timezone"
+
+
+def test_arguments_and_case():
+    router = make_router()
+
+    routed = router.route("/DOCS   Обработка ошибок ")
+    assert routed.command.name == "docs"
+    assert routed.args == "Обработка ошибок"
+    assert router.route("/docs\nвебхук").args == "вебхук"
+
+
+def test_bot_username_suffix():
+    router = make_router()
+
+    own = router.route("/start@MakeHelperBot", bot_username="makehelperbot")
+    assert own.command.name == "start" and not own.foreign
+
+    other = router.route("/start@OtherBot hello", bot_username="makehelperbot")
+    assert other.foreign and other.command is None
+
+
+def test_debounce_bypass_is_declared_per_command():
+    router = make_router()
+
+    assert router.route("/help").command.bypass_debounce
+    assert not router.route("/report").command.bypass_debounce
+
+
+def test_duplicate_registration_is_rejected():
+    router = make_router()
+
+    with pytest.raises(ValueError):
+        router.register("Start", lambda user_id, user_name, args: {})
+    assert router.names() == ["start", "help", "docs", "time", "report"]
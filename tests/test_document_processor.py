@@ -0,0 +1,116 @@
+import os
+import sys
+import json
+import time
+import asyncio
+
+import pytest
+
+# Ensure the project root is on the path so that 'document_processor' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from document_processor import (
+    DocumentProcessingError,
+    DocumentProcessingPool,
+    analyze_json_document,
+    decode_text_document,
+)
+
+
+def slow_job(source):
+    time.sleep(30)
+    return source
+
+
+def test_decode_text_document_falls_back_to_cp1251():
+    data = "Привет, Make.com".encode('cp1251')
+    assert decode_text_document(data) == "Привет, Make.com"
+
+
+def test_decode_text_document_truncates_long_files(tmp_path):
+    path = tmp_path / "big.txt"
+    path.write_text("a" * 20000, encoding='utf-8')
+
+    content = decode_text_document(str(path))
+
+    assert content.startswith("a" * 10000)
+    assert content.endswith("(файл обрезан)")
+
+
+def test_analyze_json_document_reports_errors():
+    assert "error" in analyze_json_document(b"{not json")
+
+    scenario = {"flow": [
+        {"id": 1, "module": "gateway:CustomWebHook", "parameters": {"hook": 1}},
+        {"id": 2, "module": "app:Action", "parameters": {}, "mapper": {"a": "{{1.text}}"}},
+    ]}
+    result = analyze_json_document(json.dumps(scenario).encode('utf-8'))
+
+    assert result["analysis"]["modules_count"] == 2
+    assert result["analysis"]["connections_count"] == 1
+
+
+def test_pool_enforces_size_and_time_limits():
+    pool = DocumentProcessingPool(max_workers=1, max_file_size=10, timeout_seconds=0.5)
+
+    async def scenario():
+        with pytest.raises(DocumentProcessingError):
+            await pool.decode_text(b"x" * 11)
+
+        assert await pool.decode_text(b"short") == "short"
+
+        with pytest.raises(DocumentProcessingError):
+            await pool.run(slow_job, b"slow")
+
+        # После зависшей задачи пул перезапускается и продолжает работать
+        assert await pool.decode_text(b"again") == "again"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+
+
+def test_restart_does_not_block_event_loop():
+    pool = DocumentProcessingPool(max_workers=2, timeout_seconds=0.5)
+
+    async def scenario():
+        with pytest.raises(DocumentProcessingError):
+            await pool.run(slow_job, b"slow")
+        assert pool.executor is None
+
+        ticks = 0
+        stop = asyncio.Event()
+
+        async def ticker():
+            nonlocal ticks
+            while not stop.is_set():
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker_task = asyncio.create_task(ticker())
+        # Два одновременных запроса запускают пул один раз, в потоке
+        results = await asyncio.gather(pool.decode_text(b"one"), pool.decode_text(b"two"))
+        stop.set()
+        await ticker_task
+        return results, ticks
+
+    try:
+        results, ticks = asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+
+    assert results == ["one", "two"]
+    # Запуск spawn-процессов занимает сотни миллисекунд; цикл событий все это время работал
+    assert ticks > 5
+
+
+def test_warm_up_wait_is_bounded():
+    pool = DocumentProcessingPool(max_workers=1, warm_up_timeout=0)
+    try:
+        started = time.monotonic()
+        pool.start()
+        assert time.monotonic() - started < 5
+        assert asyncio.run(pool.decode_text(b"ready")) == "ready"
+    finally:
+        pool.shutdown()
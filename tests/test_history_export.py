@@ -0,0 +1,104 @@
+import os
+import sys
+import csv
+import json
+import sqlite3
+
+import pytest
+
+# Ensure the project root is on the path so that 'history_export' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from database import DatabaseManager
+from history_export import HistoryExporter
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(str(tmp_path / "bot.db"))
+    db.create_user({'user_id': 1, 'first_name': "Анна", 'username': "anna"})
+    db.create_user({'user_id': 2, 'first_name': "Борис"})
+    with sqlite3.connect(db.db_path) as conn:
+        conn.executemany(
+            "INSERT INTO message_history (user_id, message_text, message_type, timestamp) VALUES (?, ?, ?, ?)",
+            [
+                (1, "привет", 'user', '2026-10-01 10:00:00'),
+                (1, "<b>Ответ</b>", 'assistant', '2026-10-01 10:00:05'),
+                (2, "вопрос", 'user', '2026-10-01 11:00:00'),
+                (1, "еще", 'user', '2026-10-02 09:00:00'),
+                (2, "длинный вопрос", 'user', '2026-10-02 12:00:00'),
+            ]
+        )
+        conn.execute("INSERT INTO payments (user_id, invoice_payload, amount, status) VALUES (1, 'p1', 5000, 'completed')")
+        conn.execute("INSERT INTO payments (user_id, invoice_payload, amount, status) VALUES (1, 'p2', 7000, 'pending')")
+    return db
+
+
+def test_batches_cover_all_rows_in_order(db):
+    exporter = HistoryExporter(db.db_path, batch_size=2)
+    batches = list(exporter.iter_batches())
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert [row["id"] for batch in batches for row in batch] == [1, 2, 3, 4, 5]
+
+
+def test_filters_and_joins(db):
+    exporter = HistoryExporter(db.db_path, batch_size=10)
+    rows = [row for batch in exporter.iter_batches(join_users=True, join_payments=True, user_id=1,
+                                                    since='2026-10-01', until='2026-10-02')
+            for row in batch]
+
+    assert [row["message_text"] for row in rows] == ["привет", "<b>Ответ</b>"]
+    assert rows[0]["username"] == "anna"
+    assert rows[0]["payments_count"] == 1
+    assert rows[0]["payments_total"] == 5000
+
+
+def test_export_jsonl_and_csv(db, tmp_path):
+    exporter = HistoryExporter(db.db_path, batch_size=2)
+
+    jsonl_path = str(tmp_path / "history.jsonl")
+    assert exporter.export(jsonl_path, "jsonl", join_users=True) == 5
+    with open(jsonl_path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    assert rows[2]["first_name"] == "Борис"
+
+    csv_path = str(tmp_path / "history.csv")
+    assert exporter.export(csv_path, "csv") == 5
+    with open(csv_path, encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert rows[1]["message_text"] == "<b>Ответ</b>"
+
+    with pytest.raises(ValueError):
+        exporter.export(csv_path, "xml")
+
+
+def test_daily_stats_follow_inserts(db):
+    exporter = HistoryExporter(db.db_path)
+    stats = exporter.get_daily_stats(since='2026-10-01', until='2026-10-01', user_id=1)
+
+    assert [(row["message_type"], row["messages_count"], row["total_length"]) for row in stats] == [
+        ('assistant', 1, len("<b>Ответ</b>")),
+        ('user', 1, len("привет")),
+    ]
+
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("INSERT INTO message_history (user_id, message_text, timestamp) VALUES (1, 'abcd', '2026-10-01 20:00:00')")
+    user_row = exporter.get_daily_stats(since='2026-10-01', until='2026-10-01', user_id=1)[1]
+    assert user_row["messages_count"] == 2
+    assert user_row["max_length"] == len("привет")
+    assert user_row["avg_length"] == 5.0
+
+
+def test_rollup_backfills_existing_history(tmp_path):
+    db_path = str(tmp_path / "old.db")
+    from migrations import migrate, MIGRATIONS
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    migrate(conn, MIGRATIONS[:5])
+    conn.execute("INSERT INTO message_history (user_id, message_text, timestamp) VALUES (3, 'old', '2025-01-01 00:00:00')")
+    conn.close()
+
+    DatabaseManager(db_path)
+    stats = HistoryExporter(db_path).get_daily_stats(user_id=3)
+    assert stats[0]["day"] == '2025-01-01'
+    assert stats[0]["messages_count"] == 1
@@ -0,0 +1,164 @@
+import os
+import sys
+import gzip
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+# Ensure the project root is on the path so that 'make_forwarder' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from make_forwarder import MakeForwarder
+
+
+class StandInMake:
+    """Локальный HTTP-сервер вместо вебхука Make.com"""
+
+    def __init__(self):
+        self.batches = []
+        self.fail = False
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                if self.headers.get('Content-Encoding') == 'gzip':
+                    body = gzip.decompress(body)
+                status = 500 if stand_in.fail else 200
+                if not stand_in.fail:
+                    stand_in.batches.append(json.loads(body))
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/hook"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def events(self):
+        return [event for batch in self.batches for event in batch['events']]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def urllib_post(url, body, headers):
+    request = urllib.request.Request(url, data=body, headers=headers, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+@pytest.fixture
+def make_server():
+    server = StandInMake()
+    yield server
+    server.close()
+
+
+def make_forwarder(tmp_path, url, **kwargs):
+    options = dict(db_path=str(tmp_path / "outbox.db"), post=urllib_post, flush_interval=0.05, base_backoff=0.01)
+    options.update(kwargs)
+    return MakeForwarder(url, **options)
+
+
+def test_events_are_batched_by_count_and_gzipped(tmp_path, make_server):
+    forwarder = make_forwarder(tmp_path, make_server.url, max_batch_events=4)
+    for i in range(10):
+        forwarder.enqueue({'event_type': 'message_batch', 'user_id': i, 'text': 'Привет ' * 20})
+    forwarder.flush(wait=True)
+
+    assert [batch['batch_size'] for batch in make_server.batches] == [4, 4, 2]
+    assert [event['user_id'] for event in make_server.events()] == list(range(10))
+    stats = forwarder.get_stats()
+    assert stats['pending'] == 0
+    assert stats['compression_ratio'] < 0.5
+
+
+def test_batch_respects_byte_limit(tmp_path, make_server):
+    forwarder = make_forwarder(tmp_path, make_server.url, max_batch_bytes=300)
+    for i in range(4):
+        forwarder.enqueue({'event_type': 'payment', 'data': 'x' * 100, 'n': i})
+    forwarder.flush(wait=True)
+
+    assert [batch['batch_size'] for batch in make_server.batches] == [2, 2]
+
+
+def test_failed_batches_survive_restart_and_are_retried(tmp_path, make_server):
+    make_server.fail = True
+    forwarder = make_forwarder(tmp_path, make_server.url)
+    forwarder.enqueue({'event_type': 'payment', 'id': 1})
+    forwarder.enqueue({'event_type': 'payment', 'id': 2})
+    forwarder.flush(wait=True)
+    stats = forwarder.get_stats()
+    assert stats['failures'] == 1
+    assert stats['pending'] == 2
+
+    # Make снова доступен, бот перезапущен
+    make_server.fail = False
+    restarted = make_forwarder(tmp_path, make_server.url)
+    restarted.start()
+    try:
+        deadline = threading.Event()
+        for _ in range(100):
+            if len(make_server.events()) == 2:
+                break
+            deadline.wait(0.05)
+    finally:
+        restarted.stop()
+
+    assert [event['id'] for event in make_server.events()] == [1, 2]
+    assert restarted.get_stats()['pending'] == 0
+
+
+def test_events_are_dead_lettered_after_max_attempts(tmp_path):
+    def unreachable(url, body, headers):
+        raise ConnectionError("connection refused")
+
+    forwarder = make_forwarder(tmp_path, "http://make.invalid", post=unreachable, max_attempts=2, base_backoff=0)
+    forwarder.enqueue({'event_type': 'payment', 'id': 1})
+    forwarder.flush(wait=True)
+    forwarder.flush(wait=True)
+
+    stats = forwarder.get_stats()
+    assert stats['dead'] == 1
+    assert stats['pending'] == 0
+    assert forwarder.requeue_dead() == 1
+    assert forwarder.get_stats()['pending'] == 1
+
+
+def test_events_are_retried_without_limit_by_default(tmp_path):
+    def unreachable(url, body, headers):
+        raise ConnectionError("connection refused")
+
+    forwarder = make_forwarder(tmp_path, "http://make.invalid", post=unreachable, base_backoff=0)
+    forwarder.enqueue({'event_type': 'payment', 'id': 1})
+    for _ in range(20):
+        forwarder.flush(wait=True)
+
+    stats = forwarder.get_stats()
+    assert stats['failures'] == 20
+    assert stats['dead'] == 0
+    assert stats['pending'] == 1
+
+
+def test_single_event_mode_keeps_original_payload(tmp_path, make_server):
+    forwarder = make_forwarder(tmp_path, make_server.url, max_batch_events=1, compress=False)
+    events = [{'event_type': 'message_batch', 'user_id': i, 'messages': []} for i in range(3)]
+    for event in events:
+        forwarder.enqueue(event)
+    forwarder.flush(wait=True)
+
+    # Существующий сценарий Make получает события по одному и без обертки
+    assert make_server.batches == events
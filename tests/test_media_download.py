@@ -0,0 +1,59 @@
+import os
+import sys
+import asyncio
+
+import pytest
+
+# Ensure the project root is on the path so that 'media_download' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from media_download import download_media
+
+
+class FakeTelegramFile:
+    def __init__(self, content, file_size, fail_on_drive=False):
+        self.content = content
+        self.file_size = file_size
+        self.fail_on_drive = fail_on_drive
+
+    async def download_as_bytearray(self):
+        return bytearray(self.content)
+
+    async def download_to_drive(self, path):
+        if self.fail_on_drive:
+            raise RuntimeError("network error")
+        with open(path, 'wb') as f:
+            f.write(self.content)
+
+
+def test_small_files_stay_in_memory():
+    media = asyncio.run(download_media(FakeTelegramFile(b"voice", 5), 'voice.ogg', spill_threshold=10))
+
+    with media:
+        assert media.in_memory
+        assert media.source == b"voice"
+        assert media.filename == 'voice.ogg'
+
+
+def test_large_or_unknown_files_spill_to_disk_and_are_removed():
+    for file_size in (100, None):
+        media = asyncio.run(download_media(FakeTelegramFile(b"x" * 100, file_size), 'doc.json', spill_threshold=10))
+
+        with media:
+            path = media.source
+            assert not media.in_memory
+            assert path.endswith('.json')
+            assert media.size == 100
+
+        assert not os.path.exists(path)
+
+
+def test_temp_file_is_removed_when_processing_fails():
+    media = asyncio.run(download_media(FakeTelegramFile(b"x" * 100, 100), 'doc.txt', spill_threshold=10))
+    path = media.path
+
+    with pytest.raises(ValueError):
+        with media:
+            raise ValueError("processing failed")
+
+    assert not os.path.exists(path)
@@ -0,0 +1,76 @@
+import os
+import sys
+import json
+import zlib
+import sqlite3
+
+import pytest
+
+# Ensure the project root is on the path so that 'message_codec' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from database import DatabaseManager
+from history_export import HistoryExporter
+from message_codec import build_dictionary, decode_message, encode_message
+
+REPORT = (
+    "[JSON СЦЕНАРИЙ] 📊 <b>Анализ сценария Make.com</b>\n\n🔢 Модулей: 12\n🔗 Соединений: 11\n\n"
+    "⚠️ <b>Предупреждения:</b>\n• Модуль 3 (json:ParseJSON) без параметров\n"
+    "• Модуль 7 не связан с другими модулями по данным\n\n"
+    "💡 <b>Рекомендации:</b>\n• ✅ Сценарий содержит 12 модулей\n• 🟡 Найдено 2 предупреждений\n"
+)
+
+
+def test_short_messages_stay_plain():
+    assert encode_message("привет") == "привет"
+    assert encode_message(None) is None
+    assert decode_message("привет") == "привет"
+
+
+def test_long_messages_roundtrip_compressed():
+    encoded = encode_message(REPORT)
+
+    assert isinstance(encoded, bytes)
+    assert len(encoded) < len(REPORT.encode('utf-8')) / 2
+    assert decode_message(encoded) == REPORT
+
+
+def test_poorly_compressible_text_stays_plain(monkeypatch):
+    monkeypatch.setattr('message_codec.MIN_COMPRESSION_RATIO', 0.1)
+    assert encode_message(REPORT) == REPORT
+
+
+def test_dictionary_beats_plain_zlib():
+    raw = REPORT.encode('utf-8')
+    assert len(encode_message(REPORT)) < len(zlib.compress(raw, 9))
+
+
+def test_trained_dictionary_helps_similar_messages():
+    samples = [REPORT.replace("12", str(n)) for n in range(20)]
+    zdict = build_dictionary(samples, size=4096)
+
+    assert 0 < len(zdict) <= 4096
+    compressor = zlib.compressobj(level=9, zdict=zdict)
+    with_dict = compressor.compress(REPORT.encode('utf-8')) + compressor.flush()
+    assert len(with_dict) < len(zlib.compress(REPORT.encode('utf-8'), 9)) / 2
+
+
+def test_message_store_is_transparent(tmp_path):
+    db = DatabaseManager(str(tmp_path / "bot.db"))
+    db.save_message(1, REPORT, 'user')
+    db.save_message(1, "короткое", 'user')
+
+    with sqlite3.connect(db.db_path) as conn:
+        types = [row[0] for row in conn.execute('SELECT typeof(message_text) FROM message_history ORDER BY id')]
+    assert types == ['blob', 'text']
+
+    assert sorted(row["message_text"] for row in db.get_user_messages(1)) == sorted([REPORT, "короткое"])
+
+    # Сводки и выгрузка видят исходный текст
+    stats = HistoryExporter(db.db_path).get_daily_stats(user_id=1)[0]
+    assert stats["total_length"] == len(REPORT) + len("короткое")
+
+    export_path = str(tmp_path / "history.jsonl")
+    HistoryExporter(db.db_path).export(export_path)
+    with open(export_path, encoding="utf-8") as f:
+        assert json.loads(f.readline())["message_text"] == REPORT
@@ -0,0 +1,107 @@
+import os
+import sys
+import sqlite3
+
+import pytest
+
+# Ensure the project root is on the path so that 'migrations' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from migrations import LATEST_VERSION, MIGRATIONS, apply_migrations, get_schema_version, migrate
+from database import DatabaseManager
+from make_documentation import DEFAULT_DOCUMENTATION, MakeDocumentationManager
+
+
+def test_fresh_database_reaches_latest_version(tmp_path):
+    db_path = str(tmp_path / "bot.db")
+
+    assert apply_migrations(db_path) == LATEST_VERSION
+
+    with sqlite3.connect(db_path) as conn:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        docs_count = conn.execute('SELECT COUNT(*) FROM make_documentation').fetchone()[0]
+
+    assert {'users', 'payments', 'message_history', 'schedule', 'make_documentation'} <= tables
+    assert docs_count == len(DEFAULT_DOCUMENTATION)
+
+
+def test_current_schema_costs_single_pragma_read(tmp_path):
+    db_path = str(tmp_path / "bot.db")
+    apply_migrations(db_path)
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        assert migrate(conn) == LATEST_VERSION
+    finally:
+        conn.close()
+
+    assert statements == ['PRAGMA user_version']
+
+
+def test_managers_do_not_duplicate_default_documentation(tmp_path):
+    db_path = str(tmp_path / "bot.db")
+
+    DatabaseManager(db_path)
+    MakeDocumentationManager(db_path)
+    MakeDocumentationManager(db_path)
+
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM make_documentation').fetchone()[0] == len(DEFAULT_DOCUMENTATION)
+
+
+def test_failed_migration_is_rolled_back(tmp_path):
+    db_path = str(tmp_path / "bot.db")
+    migrations = [
+        (1, "ok", ['CREATE TABLE first (id INTEGER)']),
+        (2, "broken", ['CREATE TABLE second (id INTEGER)', 'INSERT INTO missing_table VALUES (1)']),
+    ]
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            migrate(conn, migrations)
+
+        assert get_schema_version(conn) == 0
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert 'first' not in tables and 'second' not in tables
+    finally:
+        conn.close()
+
+
+def test_legacy_database_without_version_is_upgraded(tmp_path):
+    db_path = str(tmp_path / "bot.db")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('CREATE TABLE users (user_id INTEGER PRIMARY KEY, first_name TEXT, last_name TEXT, '
+                     'username TEXT, thread_id TEXT, created_at TIMESTAMP, updated_at TIMESTAMP)')
+        conn.execute("INSERT INTO users (user_id, first_name) VALUES (1, 'Иван')")
+
+    db = DatabaseManager(db_path)
+
+    assert db.get_user(1)['first_name'] == 'Иван'
+    with sqlite3.connect(db_path) as conn:
+        assert get_schema_version(conn) == LATEST_VERSION
+
+
+def test_duplicate_schedule_rows_are_removed_before_unique_index(tmp_path):
+    db_path = str(tmp_path / "bot.db")
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        # База до миграции 5: повторная доставка платежа создала второе занятие
+        assert migrate(conn, [m for m in MIGRATIONS if m[0] < 5]) == 4
+        conn.execute("INSERT INTO payments (user_id, invoice_payload, amount) VALUES (1, 'mentorship_1', 10000)")
+        for _ in range(2):
+            conn.execute("INSERT INTO schedule (user_id, payment_id, lesson_type, scheduled_datetime) "
+                         "VALUES (1, 1, '1 занятие', '2024-05-01 10:00:00')")
+        conn.execute("INSERT INTO schedule (user_id, payment_id, lesson_type, scheduled_datetime) "
+                     "VALUES (1, NULL, 'пробное', '2024-05-02 10:00:00')")
+    finally:
+        conn.close()
+
+    DatabaseManager(db_path)
+
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute('SELECT id, payment_id FROM schedule ORDER BY id').fetchall()
+        assert get_schema_version(conn) == LATEST_VERSION
+    assert rows == [(1, 1), (3, None)]
@@ -0,0 +1,63 @@
+import os
+import sys
+import sqlite3
+
+import pytest
+
+# Ensure the project root is on the path so that 'database' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from database import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / "bot.db"))
+    with sqlite3.connect(manager.db_path) as conn:
+        # Несколько платежей с одинаковым created_at проверяют разбиение по id
+        conn.executemany(
+            'INSERT INTO payments (user_id, invoice_payload, amount, created_at) VALUES (?, ?, ?, ?)',
+            [(1, f'payload_{i}', 1000 * i, f'2024-01-{i // 3 + 1:02d} 10:00:00') for i in range(11)]
+            + [(2, 'other_user', 1, '2024-01-01 10:00:00')]
+        )
+        conn.executemany(
+            'INSERT INTO schedule (user_id, lesson_type, scheduled_datetime, status) VALUES (?, ?, ?, ?)',
+            [(1, 'lesson', f'2024-02-{i + 1:02d} 12:00:00', 'scheduled') for i in range(7)]
+        )
+    return manager
+
+
+def collect_pages(fetch, limit):
+    pages = []
+    after = None
+    while True:
+        rows, after = fetch(limit=limit, after=after)
+        pages.append(rows)
+        if after is None:
+            return pages
+
+
+def test_payment_pages_cover_history_once_in_order(db):
+    pages = collect_pages(lambda **kwargs: db.get_user_payments_page(1, **kwargs), limit=4)
+
+    assert [len(page) for page in pages] == [4, 4, 3]
+    payloads = [row['invoice_payload'] for page in pages for row in page]
+    assert payloads == [row['invoice_payload'] for row in sorted(
+        db.get_user_payments(1), key=lambda row: (row['created_at'], row['id']), reverse=True
+    )]
+    assert len(set(payloads)) == 11
+
+
+def test_schedule_pages(db):
+    pages = collect_pages(lambda **kwargs: db.get_user_schedule_page(1, **kwargs), limit=5)
+
+    assert [len(page) for page in pages] == [5, 2]
+    assert pages[0][0]['scheduled_datetime'] == '2024-02-07 12:00:00'
+    assert pages[1][-1]['scheduled_datetime'] == '2024-02-01 12:00:00'
+
+
+def test_exact_page_has_no_next_cursor(db):
+    rows, after = db.get_user_schedule_page(1, limit=7)
+
+    assert len(rows) == 7
+    assert after is None
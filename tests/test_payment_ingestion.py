@@ -0,0 +1,109 @@
+import os
+import sys
+import sqlite3
+import threading
+
+import pytest
+
+# Ensure the project root is on the path so that 'database' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from database import DatabaseManager
+from cached_database import CachedDatabaseManager
+
+
+def make_payment(payload="mentorship_1"):
+    payment_data = {
+        'user_id': 5,
+        'invoice_payload': payload,
+        'total_amount': 500000,
+        'currency': 'RUB',
+        'provider_payment_charge_id': 'prov',
+        'telegram_payment_charge_id': 'tg',
+        'order_info': {'name': None},
+    }
+    user_data = {'user_id': 5, 'first_name': "Иван", 'last_name': None, 'username': "ivan"}
+    schedule_data = {
+        'user_id': 5,
+        'lesson_type': "Индивидуальное занятие",
+        'scheduled_datetime': '2026-10-19 10:00:00',
+        'duration_minutes': 120,
+        'status': 'scheduled',
+        'notes': f'Оплачено: {payload}',
+    }
+    return payment_data, user_data, schedule_data
+
+
+def count(db, table):
+    with sqlite3.connect(db.db_path) as conn:
+        return conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+@pytest.fixture
+def db(tmp_path):
+    return DatabaseManager(str(tmp_path / "bot.db"))
+
+
+def test_ingest_creates_user_payment_and_schedule(db):
+    schedule_id = db.ingest_payment(*make_payment())
+
+    assert schedule_id is not None
+    assert db.user_exists(5)
+    payment = db.get_user_payments(5)[0]
+    assert payment['status'] == 'completed'
+    with sqlite3.connect(db.db_path) as conn:
+        row = conn.execute('SELECT payment_id, starts_at FROM schedule WHERE id = ?', (schedule_id,)).fetchone()
+    assert row[0] == payment['id']
+    assert row[1] is not None
+
+
+def test_duplicate_delivery_is_ignored(db):
+    assert db.ingest_payment(*make_payment()) is not None
+    assert db.ingest_payment(*make_payment()) is None
+
+    assert count(db, 'payments') == 1
+    assert count(db, 'schedule') == 1
+    assert count(db, 'users') == 1
+
+
+def test_pending_payment_is_completed(db):
+    payment_data, user_data, schedule_data = make_payment()
+    db.save_payment(payment_data)
+
+    assert db.ingest_payment(payment_data, user_data, schedule_data) is not None
+    assert db.get_user_payments(5)[0]['status'] == 'completed'
+
+
+def test_concurrent_deliveries_book_once(db):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(db.ingest_payment(*make_payment())))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len([r for r in results if r is not None]) == 1
+    assert count(db, 'schedule') == 1
+
+
+def test_failure_rolls_back_everything(db):
+    payment_data, user_data, schedule_data = make_payment()
+    del schedule_data['lesson_type']
+
+    with pytest.raises(KeyError):
+        db.ingest_payment(payment_data, user_data, schedule_data)
+
+    assert count(db, 'payments') == 0
+    assert count(db, 'users') == 0
+
+
+def test_cached_manager_invalidates_on_ingest(tmp_path):
+    db = CachedDatabaseManager(str(tmp_path / "bot.db"))
+    assert db.payment_exists("mentorship_1") is False
+    assert db.user_exists(5) is False
+
+    db.ingest_payment(*make_payment())
+
+    assert db.payment_exists("mentorship_1") is True
+    assert db.user_exists(5) is True
@@ -0,0 +1,99 @@
+import os
+import sys
+import sqlite3
+
+import pytest
+
+# Ensure the project root is on the path so that 'database' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from database import (
+    DatabaseManager, USER_MESSAGES_SQL, USER_PAYMENTS_SQL, USER_SCHEDULE_SQL,
+    SCHEDULE_FOR_DATE_SQL, SCHEDULE_CONFLICT_SQL
+)
+
+# Размер тестовой базы; для проверки на боевом объеме: QUERY_PLAN_ROWS=2000000
+SEED_ROWS = int(os.getenv('QUERY_PLAN_ROWS', 20000))
+SEED_USERS = 1000
+
+
+@pytest.fixture(scope='module')
+def seeded_db(tmp_path_factory):
+    db_path = str(tmp_path_factory.mktemp('plans') / 'bot.db')
+    DatabaseManager(db_path)
+
+    with sqlite3.connect(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            'INSERT INTO users (user_id, first_name, thread_id) VALUES (?, ?, ?)',
+            ((user_id, f'user{user_id}', f'thread_{user_id}') for user_id in range(SEED_USERS))
+        )
+        cursor.executemany(
+            'INSERT INTO message_history (user_id, message_text, message_type, timestamp) VALUES (?, ?, ?, ?)',
+            ((i % SEED_USERS, f'message {i}', 'user', f'2024-{i % 12 + 1:02d}-{i % 28 + 1:02d} 12:00:00')
+             for i in range(SEED_ROWS))
+        )
+        cursor.executemany(
+            'INSERT INTO payments (user_id, invoice_payload, amount, status, created_at) VALUES (?, ?, ?, ?, ?)',
+            ((i % SEED_USERS, f'payload_{i}', 10000, 'completed', f'2024-{i % 12 + 1:02d}-01 10:00:00')
+             for i in range(SEED_ROWS // 10))
+        )
+        cursor.executemany(
+            'INSERT INTO schedule (user_id, payment_id, lesson_type, scheduled_datetime, status) VALUES (?, ?, ?, ?, ?)',
+            ((i % SEED_USERS, i + 1, 'lesson', f'2024-{i % 12 + 1:02d}-{i % 28 + 1:02d} {i % 24:02d}:00:00',
+              'scheduled' if i % 3 else 'completed')
+             for i in range(SEED_ROWS // 10))
+        )
+        cursor.execute('ANALYZE')
+        conn.commit()
+
+    return db_path
+
+
+def explain(db_path, sql, params):
+    with sqlite3.connect(db_path) as conn:
+        return [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+
+
+def assert_uses_index(plan, table, index_name):
+    assert any(index_name in step for step in plan), plan
+    assert not any(step.startswith(f'SCAN {table}') for step in plan), plan
+    assert not any('TEMP B-TREE' in step for step in plan), plan
+
+
+def test_user_messages_use_index(seeded_db):
+    plan = explain(seeded_db, USER_MESSAGES_SQL, (1, 10))
+    assert_uses_index(plan, 'message_history', 'idx_message_history_user_timestamp')
+
+
+def test_user_payments_use_index(seeded_db):
+    plan = explain(seeded_db, USER_PAYMENTS_SQL, (1,))
+    assert_uses_index(plan, 'payments', 'idx_payments_user_created')
+
+
+def test_user_schedule_uses_index(seeded_db):
+    plan = explain(seeded_db, USER_SCHEDULE_SQL, (1,))
+    assert_uses_index(plan, 's', 'idx_schedule_user_datetime')
+
+
+def test_schedule_for_date_uses_expression_index(seeded_db):
+    plan = explain(seeded_db, SCHEDULE_FOR_DATE_SQL, ('2024-03-03',))
+    assert_uses_index(plan, 's', 'idx_schedule_active_date')
+
+
+def test_schedule_conflict_uses_interval_index(seeded_db):
+    plan = explain(seeded_db, SCHEDULE_CONFLICT_SQL, (1709460000, 1709467200, 1709460000))
+    assert_uses_index(plan, 'schedule', 'idx_schedule_active_interval')
+    assert any('idx_schedule_active_duration' in step for step in plan), plan
+
+
+def test_manager_queries_return_expected_rows(seeded_db):
+    db = DatabaseManager(seeded_db)
+
+    messages = db.get_user_messages(1, limit=5)
+    assert len(messages) == 5
+    assert [m['timestamp'] for m in messages] == sorted((m['timestamp'] for m in messages), reverse=True)
+
+    for entry in db.get_schedule_for_date('2024-03-03'):
+        assert entry['scheduled_datetime'].startswith('2024-03-03')
+        assert entry['status'] == 'scheduled'
@@ -0,0 +1,70 @@
+import os
+import sys
+import tempfile
+
+# Ensure the project root is on the path so that 'response_templates' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from response_templates import ResponseTemplate, ResponseTemplates
+from make_documentation import MakeDocumentationManager
+
+
+def test_fields_are_escaped_and_other_braces_kept():
+    template = ResponseTemplate("Привет, {user_name}! Пример: {{1.data}} {unknown}", fields=("user_name",))
+
+    assert template.format(user_name="<Ann>") == "Привет, &lt;Ann&gt;! Пример: {{1.data}} {unknown}"
+    assert template.format() == "Привет, ! Пример: {{1.data}} {unknown}"
+
+
+def test_static_template_returns_same_string():
+    template = ResponseTemplate("справка")
+
+    assert template.format() is template.text
+
+
+def test_rendered_once_until_invalidated():
+    calls = []
+    templates = ResponseTemplates()
+    templates.register("docs", lambda: calls.append(1) or f"категорий: {len(calls)}", depends_on=("docs",))
+    templates.register("help", lambda: "справка")
+    templates.warm_up()
+
+    assert templates.format("docs") == "категорий: 1"
+    assert templates.format("docs") == "категорий: 1"
+    templates.invalidate("payments")
+    assert templates.format("docs") == "категорий: 1"
+
+    templates.invalidate("docs")
+    assert templates.format("docs") == "категорий: 2"
+    assert templates.get_stats()["renders"] == 3
+
+
+def test_invalidation_during_render_is_not_lost():
+    templates = ResponseTemplates()
+    version = [1]
+
+    def render():
+        text = f"версия {version[0]}"
+        # Документация изменилась, пока строился ответ
+        version[0] = 2
+        templates.invalidate("docs")
+        return text
+
+    templates.register("docs", render, depends_on=("docs",))
+
+    assert templates.format("docs") == "версия 1"
+    assert "docs" not in templates.cache
+
+
+def test_docs_change_invalidates_categories():
+    with tempfile.TemporaryDirectory() as tmp:
+        docs = MakeDocumentationManager(os.path.join(tmp, "docs.db"))
+        templates = ResponseTemplates()
+        templates.register("docs", lambda: ", ".join(docs.get_categories()), depends_on=("docs",))
+        docs.add_change_listener(lambda: templates.invalidate("docs"))
+        before = templates.format("docs")
+
+        docs.add_documentation_entry("Webhooks", "Вебхуки", "Прием данных по HTTP")
+
+        assert "Webhooks" not in before
+        assert "Webhooks" in templates.format("docs")
@@ -0,0 +1,85 @@
+import os
+import sys
+import sqlite3
+
+import pytest
+
+# Ensure the project root is on the path so that 'retention' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from database import DatabaseManager
+from history_export import HistoryExporter
+from retention import RetentionManager, RetentionPolicy
+
+
+def insert_messages(db_path, user_id, count, timestamp, text="сообщение"):
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO message_history (user_id, message_text, timestamp) VALUES (?, ?, ?)",
+            [(user_id, f"{text} {i}", timestamp) for i in range(count)]
+        )
+
+
+@pytest.fixture
+def db(tmp_path):
+    return DatabaseManager(str(tmp_path / "bot.db"))
+
+
+def make_manager(db, **policy):
+    policy.setdefault('pause_seconds', 0)
+    return RetentionManager(db.db_path, RetentionPolicy(**policy))
+
+
+def test_keeps_last_messages_and_archives_the_rest(db):
+    insert_messages(db.db_path, 1, 25, '2020-01-01 00:00:00')
+    insert_messages(db.db_path, 2, 3, '2020-01-01 00:00:00')
+    manager = make_manager(db, keep_last_messages=5, min_age_days=30, batch_size=7)
+
+    stats = manager.run_once()
+
+    assert stats["archived_messages"] == 20
+    assert stats["archive_blobs"] == 3
+    remaining = db.get_user_messages(1, limit=100)
+    assert sorted(row["id"] for row in remaining) == list(range(21, 26))
+    assert len(db.get_user_messages(2, limit=100)) == 3
+
+    archived = manager.get_archived_messages(1)
+    assert [row["id"] for row in archived] == list(range(1, 21))
+    assert archived[0]["message_text"] == "сообщение 0"
+
+    # Дневные сводки не зависят от архивации
+    assert HistoryExporter(db.db_path).get_daily_stats(user_id=1)[0]["messages_count"] == 25
+
+
+def test_recent_messages_are_not_archived(db):
+    insert_messages(db.db_path, 1, 10, '2020-01-01 00:00:00')
+    with sqlite3.connect(db.db_path) as conn:
+        conn.executemany("INSERT INTO message_history (user_id, message_text) VALUES (1, ?)",
+                         [(f"новое {i}",) for i in range(10)])
+
+    stats = make_manager(db, keep_last_messages=2, min_age_days=30).run_once()
+
+    assert stats["archived_messages"] == 10
+    assert len(db.get_user_messages(1, limit=100)) == 10
+
+
+def test_incremental_vacuum_shrinks_file(db):
+    insert_messages(db.db_path, 1, 3000, '2020-01-01 00:00:00', text=os.urandom(250).hex())
+    manager = make_manager(db, keep_last_messages=10, vacuum_pages=50)
+    manager.checkpoint()
+    size_before = os.path.getsize(db.db_path)
+
+    stats = manager.run_once()
+
+    assert stats["freed_pages"] > 0
+    assert os.path.getsize(db.db_path) < size_before / 2
+    with sqlite3.connect(db.db_path) as conn:
+        assert conn.execute('PRAGMA freelist_count').fetchone()[0] == 0
+
+
+def test_stop_interrupts_pass(db):
+    insert_messages(db.db_path, 1, 50, '2020-01-01 00:00:00')
+    manager = make_manager(db, keep_last_messages=0, batch_size=10)
+    manager.stop_event.set()
+
+    assert manager.run_once()["archived_messages"] == 0
@@ -0,0 +1,96 @@
+import os
+import sys
+
+# Ensure the project root is on the path so that 'scenario_graph' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scenario_graph import ScenarioGraphAnalyzer
+
+
+def make_module(module_id, module_type="app:Action", mapper=None, routes=None):
+    module = {"id": module_id, "module": module_type, "mapper": mapper or {}}
+    if routes is not None:
+        module["routes"] = [{"flow": flow} for flow in routes]
+    return module
+
+
+def test_builds_edges_from_mapper_references():
+    scenario = {"flow": [
+        make_module(1, "gateway:CustomWebHook"),
+        make_module(2, mapper={"key": "{{1.user_id}}"}),
+        make_module(3, "builtin:BasicRouter", routes=[
+            [make_module(4, mapper={"text": "{{2.result.reply}} / {{1.text}}", "temperature": "0.3"})],
+            [make_module(5, mapper={"data": {"items": ["{{formatDate(1.date; YYYY)}}"]}})],
+        ]),
+    ]}
+
+    graph = ScenarioGraphAnalyzer().build_graph(scenario)
+
+    assert graph["modules_count"] == 5
+    assert graph["adjacency"][1] == [2, 4, 5]
+    assert graph["adjacency"][2] == [4]
+    assert graph["edges_count"] == 4
+    assert graph["critical_path"] == [1, 2, 4]
+    assert graph["critical_path_depth"] == 3
+    assert graph["unused_modules"] == []
+    assert graph["dangling_references"] == []
+    assert graph["cycle_modules"] == []
+
+
+def test_detects_dangling_unused_and_cycles():
+    scenario = {"flow": [
+        make_module(1),
+        make_module(2, mapper={"a": "{{3.value}}", "b": "{{99.missing}}"}),
+        make_module(3, mapper={"a": "{{2.value}}"}),
+        make_module(4, mapper={"a": "{{3.value}}"}),
+        make_module(5, mapper={"a": "plain text 1.5"}),
+    ]}
+
+    graph = ScenarioGraphAnalyzer().build_graph(scenario)
+
+    assert graph["dangling_references"] == [{"module": 2, "reference": 99}]
+    assert graph["cycle_modules"] == [2, 3]
+    assert graph["unused_modules"] == [1, 5]
+    assert graph["critical_path_depth"] == 1
+
+
+def test_results_are_cached_per_blueprint():
+    analyzer = ScenarioGraphAnalyzer(cache_size=1)
+    first = {"flow": [make_module(1), make_module(2, mapper={"a": "{{1.x}}"})]}
+    second = {"flow": [make_module(1)]}
+
+    result = analyzer.analyze(first)
+    assert analyzer.analyze({"flow": [make_module(1), make_module(2, mapper={"a": "{{1.x}}"})]}) is result
+    assert analyzer.cache_hits == 1
+
+    analyzer.analyze(second)
+    assert len(analyzer.cache) == 1
+    assert analyzer.cache_misses == 2
+
+
+def test_scales_to_large_scenarios():
+    count = 5000
+    flow = [make_module(1)]
+    for module_id in range(2, count + 1):
+        flow.append(make_module(module_id, mapper={"value": f"{{{{{module_id - 1}.value}}}}"}))
+
+    graph = ScenarioGraphAnalyzer().build_graph({"flow": flow})
+
+    assert graph["edges_count"] == count - 1
+    assert graph["critical_path_depth"] == count
+
+
+def test_modules_between_two_cycles_are_not_cycle_members():
+    # 1 <-> 2, 2 -> 3, 3 -> 4, 4 <-> 5: модуль 3 только соединяет два цикла
+    scenario = {"flow": [
+        make_module(1, mapper={"a": "{{2.value}}"}),
+        make_module(2, mapper={"a": "{{1.value}}"}),
+        make_module(3, mapper={"a": "{{2.value}}"}),
+        make_module(4, mapper={"a": "{{3.value}} {{5.value}}"}),
+        make_module(5, mapper={"a": "{{4.value}}"}),
+        make_module(6, mapper={"a": "{{6.previous}}"}),
+    ]}
+
+    graph = ScenarioGraphAnalyzer().build_graph(scenario)
+
+    assert graph["cycle_modules"] == [1, 2, 4, 5, 6]
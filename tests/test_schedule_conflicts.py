@@ -0,0 +1,62 @@
+import os
+import sys
+import sqlite3
+
+import pytest
+
+# Ensure the project root is on the path so that 'database' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from database import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / "bot.db"))
+    # Занятие 10:00-12:00 и отмененное занятие 14:00-16:00
+    for scheduled_datetime, status in (('2024-01-01 10:00:00', 'scheduled'), ('2024-01-01 14:00:00', 'cancelled')):
+        manager.save_schedule({
+            'user_id': 1,
+            'lesson_type': 'Индивидуальное занятие',
+            'scheduled_datetime': scheduled_datetime,
+            'duration_minutes': 120,
+            'status': status,
+            'notes': ''
+        })
+    return manager
+
+
+def test_detects_true_interval_overlap(db):
+    # Начинается во время идущего занятия (старая проверка это пропускала)
+    assert db.check_schedule_conflict('2024-01-01 11:00:00', 30) is True
+    # Охватывает занятие целиком
+    assert db.check_schedule_conflict('2024-01-01 09:00:00', 240) is True
+    # Стык интервалов не считается пересечением
+    assert db.check_schedule_conflict('2024-01-01 08:00:00', 120) is False
+    assert db.check_schedule_conflict('2024-01-01 12:00:00', 60) is False
+    # Отмененные занятия не мешают
+    assert db.check_schedule_conflict('2024-01-01 14:30:00', 60) is False
+
+
+def test_interval_follows_reschedule(db):
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("UPDATE schedule SET scheduled_datetime = '2024-01-02 10:00:00' WHERE status = 'scheduled'")
+
+    assert db.check_schedule_conflict('2024-01-01 11:00:00', 30) is False
+    assert db.check_schedule_conflict('2024-01-02 11:00:00', 30) is True
+
+
+def test_find_free_slots(db):
+    slots = db.find_free_slots('2024-01-01 09:00:00', '2024-01-01 18:00:00', 60)
+
+    assert slots == [
+        {'start': '2024-01-01 09:00:00', 'end': '2024-01-01 10:00:00'},
+        {'start': '2024-01-01 12:00:00', 'end': '2024-01-01 18:00:00'},
+    ]
+    # Окно 09:00-10:00 короче 90 минут
+    assert db.find_free_slots('2024-01-01 09:00:00', '2024-01-01 18:00:00', 90) == [
+        {'start': '2024-01-01 12:00:00', 'end': '2024-01-01 18:00:00'},
+    ]
+    assert db.find_free_slots('2024-01-01 08:00:00', '2024-01-01 11:00:00', 60) == [
+        {'start': '2024-01-01 08:00:00', 'end': '2024-01-01 10:00:00'},
+    ]
@@ -0,0 +1,173 @@
+import os
+import sys
+import time
+import asyncio
+
+# Ensure the project root is on the path so that 'send_scheduler' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from send_scheduler import (
+    SendScheduler, TokenBucket, PRIORITY_PAYMENT, PRIORITY_MESSAGE, PRIORITY_TYPING, get_retry_after
+)
+
+
+class FloodError(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Flood control exceeded. Retry in {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+def recorder(sent):
+    def make(name, result=None):
+        async def callback():
+            sent.append(name)
+            return result if result is not None else name
+        return callback
+    return make
+
+
+def test_token_bucket_refills_at_rate():
+    bucket = TokenBucket(rate=2, capacity=1, now=0)
+    assert bucket.wait_time(0) == 0
+    bucket.consume(0)
+    assert bucket.wait_time(0) == 0.5
+    assert bucket.wait_time(0.5) == 0
+
+
+def test_higher_priority_goes_first_when_global_limit_is_exhausted():
+    async def scenario():
+        sent = []
+        make = recorder(sent)
+        scheduler = SendScheduler(global_rate=50)
+        scheduler.global_bucket.tokens = 0
+        await asyncio.gather(
+            scheduler.submit(make("typing"), chat_id=1, priority=PRIORITY_TYPING, droppable=True),
+            scheduler.submit(make("message"), chat_id=2, priority=PRIORITY_MESSAGE),
+            scheduler.submit(make("payment"), chat_id=3, priority=PRIORITY_PAYMENT),
+        )
+        await scheduler.close()
+        return sent
+
+    assert asyncio.run(scenario()) == ["payment", "message", "typing"]
+
+
+def test_throttled_chat_does_not_block_other_chats():
+    async def scenario():
+        sent = []
+        make = recorder(sent)
+        scheduler = SendScheduler(per_chat_rate=5, per_chat_burst=1)
+        await asyncio.gather(
+            scheduler.submit(make("a1"), chat_id=1),
+            scheduler.submit(make("a2"), chat_id=1),
+            scheduler.submit(make("b1"), chat_id=2),
+        )
+        await scheduler.close()
+        return sent
+
+    assert asyncio.run(scenario()) == ["a1", "b1", "a2"]
+
+
+def test_group_chats_use_group_limit():
+    async def scenario():
+        scheduler = SendScheduler(group_rate=1, group_burst=1)
+        make = recorder([])
+        await scheduler.submit(make("first"), chat_id=-100)
+        started = time.monotonic()
+        await scheduler.submit(make("second"), chat_id=-100)
+        await scheduler.close()
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) >= 0.9
+
+
+def test_retry_after_pauses_and_retries():
+    async def scenario():
+        calls = []
+
+        async def flaky():
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                raise FloodError(0.1)
+            return "ok"
+
+        scheduler = SendScheduler()
+        result = await scheduler.submit(flaky, chat_id=1)
+        stats = scheduler.get_stats()
+        await scheduler.close()
+        return result, calls, stats
+
+    result, calls, stats = asyncio.run(scenario())
+    assert result == "ok"
+    assert calls[1] - calls[0] >= 0.09
+    assert stats["throttled"] == 1
+    assert stats["retried"] == 1
+
+
+def test_typing_is_coalesced_and_dropped_when_stale():
+    async def scenario():
+        sent = []
+        make = recorder(sent)
+        scheduler = SendScheduler(global_rate=10, max_droppable_delay=0.05)
+        scheduler.global_bucket.tokens = 0
+        results = await asyncio.gather(
+            scheduler.submit(make("typing"), chat_id=1, droppable=True),
+            scheduler.submit(make("typing"), chat_id=1, droppable=True),
+            scheduler.submit(make("message"), chat_id=2),
+        )
+        stats = scheduler.get_stats()
+        await scheduler.close()
+        return sent, results, stats
+
+    sent, results, stats = asyncio.run(scenario())
+    assert sent == ["message"]
+    assert results == [None, None, "message"]
+    assert stats["coalesced"] == 1
+    assert stats["dropped"] == 1
+
+
+def test_get_retry_after_accepts_seconds_and_timedelta():
+    from datetime import timedelta
+
+    assert get_retry_after(FloodError(3)) == 3.0
+    assert get_retry_after(FloodError(timedelta(seconds=2))) == 2.0
+    assert get_retry_after(ValueError("other")) is None
+
+
+def test_flood_in_one_chat_does_not_delay_other_chats_or_payments():
+    async def scenario():
+        scheduler = SendScheduler()
+        started = time.monotonic()
+        finished = {}
+        attempts = []
+
+        async def flooded():
+            attempts.append(time.monotonic() - started)
+            if len(attempts) == 1:
+                raise FloodError(0.5)
+            return "a"
+
+        def make(name):
+            async def callback():
+                finished[name] = time.monotonic() - started
+                return name
+            return callback
+
+        first = asyncio.create_task(scheduler.submit(flooded, chat_id=1))
+        await asyncio.sleep(0.05)
+        # Чат 1 на паузе: обычное сообщение в него ждет, другой чат и ответ на pre-checkout - нет
+        await asyncio.gather(
+            first,
+            scheduler.submit(make("chat_a_message"), chat_id=1),
+            scheduler.submit(make("chat_b"), chat_id=2),
+            scheduler.submit(make("pre_checkout"), chat_id=1, priority=PRIORITY_PAYMENT),
+        )
+        stats = scheduler.get_stats()
+        await scheduler.close()
+        return finished, attempts, stats
+
+    finished, attempts, stats = asyncio.run(scenario())
+    assert finished["chat_b"] < 0.2
+    assert finished["pre_checkout"] < 0.2
+    assert finished["chat_a_message"] >= 0.45
+    assert attempts[1] >= 0.45
+    assert stats["paused_for"] == 0
@@ -0,0 +1,182 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+
+import pytest
+
+# Ensure the project root is on the path so that 'single_flight' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from single_flight import SingleFlight, AsyncSingleFlight
+from media_download import download_media, download_flight
+
+
+def run_concurrently(count, target):
+    results = [None] * count
+    errors = [None] * count
+
+    def worker(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test")
+    executions = []
+    release = threading.Event()
+
+    def slow():
+        executions.append(1)
+        release.wait(2)
+        return ["categories"]
+
+    def call():
+        return flight.do("categories", slow)
+
+    timer = threading.Timer(0.1, release.set)
+    timer.start()
+    results, errors = run_concurrently(8, call)
+
+    assert len(executions) == 1
+    assert errors == [None] * 8
+    assert all(result is results[0] for result in results)
+    stats = flight.get_stats()
+    assert stats["calls"] == 8 and stats["executions"] == 1 and stats["shared"] == 7
+    assert stats["top_keys"]["categories"]["shared"] == 7
+    assert stats["in_flight_keys"] == 0
+
+
+def test_sequential_calls_are_not_cached():
+    flight = SingleFlight("test")
+    counter = iter(range(10))
+
+    assert flight.do("key", lambda: next(counter)) == 0
+    assert flight.do("key", lambda: next(counter)) == 1
+
+
+def test_error_is_shared_and_counted():
+    flight = SingleFlight("test")
+    release = threading.Event()
+
+    def failing():
+        release.wait(2)
+        raise RuntimeError("db locked")
+
+    timer = threading.Timer(0.1, release.set)
+    timer.start()
+    _, errors = run_concurrently(3, lambda: flight.do("key", failing))
+
+    assert all(isinstance(error, RuntimeError) for error in errors)
+    assert flight.get_stats()["errors"] == 1
+
+
+def test_waiter_timeout_does_not_affect_leader():
+    flight = SingleFlight("test")
+    started = threading.Event()
+    release = threading.Event()
+    leader_result = []
+
+    def slow():
+        started.set()
+        release.wait(2)
+        return "done"
+
+    leader = threading.Thread(target=lambda: leader_result.append(flight.do("key", slow)))
+    leader.start()
+    started.wait(1)
+
+    with pytest.raises(TimeoutError):
+        flight.do("key", slow, timeout=0.05)
+
+    release.set()
+    leader.join()
+    assert leader_result == ["done"]
+    assert flight.get_stats()["timeouts"] == 1
+
+
+def test_per_key_metrics_are_bounded():
+    flight = SingleFlight("test", max_tracked_keys=3)
+    for i in range(10):
+        flight.do(i, lambda: None)
+
+    assert list(flight.metrics.keys) == [7, 8, 9]
+    assert flight.get_stats()["calls"] == 10
+
+
+def test_async_calls_share_one_task():
+    flight = AsyncSingleFlight("test")
+    executions = []
+
+    async def fetch():
+        executions.append(1)
+        await asyncio.sleep(0.05)
+        return b"data"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("file", fetch) for _ in range(5)))
+
+    results = asyncio.run(main())
+
+    assert results == [b"data"] * 5
+    assert len(executions) == 1
+    assert flight.get_stats()["shared"] == 4
+
+
+def test_async_timeout_leaves_shared_task_running():
+    flight = AsyncSingleFlight("test")
+
+    async def fetch():
+        await asyncio.sleep(0.1)
+        return "ok"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        with pytest.raises(asyncio.TimeoutError):
+            await flight.do("key", fetch, timeout=0.01)
+        return await leader
+
+    assert asyncio.run(main()) == "ok"
+    assert flight.get_stats()["timeouts"] == 1
+
+
+class FakeTelegramFile:
+    downloads = 0
+
+    def __init__(self, file_unique_id, content):
+        self.file_unique_id = file_unique_id
+        self.file_size = len(content)
+        self.content = content
+
+    async def download_as_bytearray(self):
+        FakeTelegramFile.downloads += 1
+        await asyncio.sleep(0.02)
+        return bytearray(self.content)
+
+
+def test_same_file_is_downloaded_once():
+    FakeTelegramFile.downloads = 0
+
+    async def main():
+        files = [FakeTelegramFile("AgADunique", b"voice") for _ in range(4)]
+        return await asyncio.gather(*(download_media(f, 'voice.ogg') for f in files))
+
+    buffers = asyncio.run(main())
+
+    assert FakeTelegramFile.downloads == 1
+    assert [buffer.data for buffer in buffers] == [b"voice"] * 4
+    # Каждый вызывающий закрывает свой буфер, не затрагивая остальные
+    buffers[0].close()
+    assert buffers[1].data == b"voice"
+    assert download_flight.get_stats()["in_flight_keys"] == 0
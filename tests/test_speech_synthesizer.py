@@ -0,0 +1,64 @@
+import os
+import sys
+import asyncio
+import threading
+
+# Ensure the project root is on the path so that 'speech_synthesizer' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from speech_synthesizer import SpeechSynthesizer, split_text, strip_markup
+
+
+def test_strip_markup_removes_tags_entities_and_rules():
+    text = "🤖 <b>Справка</b>\n━━━━━━━━━━\n• /docs &lt;запрос&gt; - <i>поиск</i>"
+
+    assert strip_markup(text) == "🤖 Справка\n• /docs <запрос> - поиск"
+
+
+def test_split_text_respects_sentence_boundaries_and_limit():
+    text = "Первое предложение. Второе предложение! Третье? " + "слово " * 50
+
+    chunks = split_text(text, chunk_size=45)
+
+    assert chunks[0] == "Первое предложение. Второе предложение!"
+    assert all(len(chunk) <= 45 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+
+def test_chunks_are_synthesized_in_order_and_cached():
+    calls = []
+    lock = threading.Lock()
+
+    def generate_speech(text, voice):
+        with lock:
+            calls.append(text)
+        return f"[{text}]".encode('utf-8')
+
+    synthesizer = SpeechSynthesizer(generate_speech, chunk_size=20)
+    try:
+        first = asyncio.run(synthesizer.synthesize("<b>Привет!</b> Как дела? Всё хорошо.", voice="onyx"))
+        second = asyncio.run(synthesizer.synthesize("Привет!", voice="onyx"))
+    finally:
+        synthesizer.shutdown()
+
+    assert first == "[Привет! Как дела?][Всё хорошо.]".encode('utf-8')
+    assert second == "[Привет!]".encode('utf-8')
+    assert len(calls) == 3
+
+    synthesizer = SpeechSynthesizer(generate_speech, chunk_size=20)
+    try:
+        asyncio.run(synthesizer.synthesize("Привет!", voice="onyx"))
+        asyncio.run(synthesizer.synthesize("Привет!", voice="onyx"))
+    finally:
+        synthesizer.shutdown()
+
+    assert synthesizer.cache_hits == 1
+
+
+def test_failed_chunk_returns_empty_audio():
+    synthesizer = SpeechSynthesizer(lambda text, voice: b"" if "ошибка" in text else b"ok", chunk_size=15)
+    try:
+        assert asyncio.run(synthesizer.synthesize("Всё хорошо. Тут ошибка.")) == b""
+        assert synthesizer.cache_bytes == 2
+    finally:
+        synthesizer.shutdown()
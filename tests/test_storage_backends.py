@@ -0,0 +1,129 @@
+import os
+import sys
+import asyncio
+import inspect
+
+import pytest
+
+# Ensure the project root is on the path so that 'storage' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from async_storage import AsyncDatabaseManager, SQLiteThreadDriver
+from database import DatabaseManager
+from storage import AsyncStorageBackend, StorageBackend
+
+
+class SyncFacade:
+    """Вызывает методы асинхронного хранилища из синхронного теста в одном цикле событий"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(storage.start())
+
+    def __getattr__(self, name):
+        method = getattr(self.storage, name)
+        return lambda *args, **kwargs: self.loop.run_until_complete(method(*args, **kwargs))
+
+    def close(self):
+        self.loop.run_until_complete(self.storage.close())
+        self.loop.close()
+
+
+@pytest.fixture(params=["sqlite", "async"])
+def storage(request, tmp_path):
+    if request.param == "sqlite":
+        yield DatabaseManager(str(tmp_path / "bot.db"))
+    else:
+        facade = SyncFacade(AsyncDatabaseManager(SQLiteThreadDriver()))
+        yield facade
+        facade.close()
+
+
+def payment(payload, user_id=7, amount=10000):
+    return {'user_id': user_id, 'invoice_payload': payload, 'total_amount': amount, 'currency': 'RUB'}
+
+
+def schedule(user_id=7, when='2026-10-20 10:00:00', duration=120):
+    return {'user_id': user_id, 'lesson_type': "Индивидуальное занятие", 'scheduled_datetime': when,
+            'duration_minutes': duration, 'status': 'scheduled', 'notes': ''}
+
+
+def test_interfaces_share_method_set():
+    sync_methods = {name for name, _ in inspect.getmembers(StorageBackend, inspect.isfunction)}
+    async_methods = {name for name, _ in inspect.getmembers(AsyncStorageBackend, inspect.isfunction)}
+    assert sync_methods == async_methods
+    assert issubclass(DatabaseManager, StorageBackend)
+    assert issubclass(AsyncDatabaseManager, AsyncStorageBackend)
+
+
+def test_users_and_messages(storage):
+    assert storage.user_exists(7) is False
+    thread_id = storage.create_user({'user_id': 7, 'first_name': "Анна"})
+    assert storage.get_user(7)['thread_id'] == thread_id
+
+    storage.update_user_thread(7, "thread_x")
+    assert storage.get_user(7)['thread_id'] == "thread_x"
+
+    storage.save_message(7, "первое")
+    storage.save_message(7, "второе", 'assistant')
+    texts = {row['message_text'] for row in storage.get_user_messages(7)}
+    assert texts == {"первое", "второе"}
+
+
+def test_payments_and_pages(storage):
+    for number in range(5):
+        storage.save_payment(payment(f"p{number}"))
+    storage.update_payment_status("p1", 'completed')
+
+    assert storage.payment_exists("p1") is True
+    assert storage.payment_exists("missing") is False
+    payments = storage.get_user_payments(7)
+    assert len(payments) == 5
+    assert storage.get_payment_by_id(payments[0]['id'])['invoice_payload'] == payments[0]['invoice_payload']
+
+    first, cursor = storage.get_user_payments_page(7, limit=3)
+    second, last_cursor = storage.get_user_payments_page(7, limit=3, after=cursor)
+    assert len(first) == 3 and len(second) == 2 and last_cursor is None
+    assert {row['id'] for row in first + second} == {row['id'] for row in payments}
+
+
+def test_ingest_payment_is_idempotent(storage):
+    schedule_id = storage.ingest_payment(payment("mentorship_1"), {'user_id': 7}, schedule())
+
+    assert schedule_id is not None
+    assert storage.ingest_payment(payment("mentorship_1"), {'user_id': 7}, schedule()) is None
+    assert storage.user_exists(7)
+    assert storage.get_user_payments(7)[0]['status'] == 'completed'
+    assert [row['id'] for row in storage.get_user_schedule(7)] == [schedule_id]
+
+
+def test_schedule_queries(storage):
+    storage.save_schedule(schedule(when='2026-10-20 10:00:00', duration=120))
+    storage.add_schedule_entry(7, None, "Разбор", '2026-10-21 09:00:00', 60)
+
+    assert storage.check_schedule_conflict('2026-10-20 11:00:00', 30) is True
+    assert storage.check_schedule_conflict('2026-10-20 12:00:00', 30) is False
+    assert [row['lesson_type'] for row in storage.get_schedule_for_date('2026-10-21')] == ["Разбор"]
+
+    page, cursor = storage.get_user_schedule_page(7, limit=1)
+    assert page[0]['scheduled_datetime'] == '2026-10-21 09:00:00'
+    page, cursor = storage.get_user_schedule_page(7, limit=1, after=cursor)
+    assert page[0]['scheduled_datetime'] == '2026-10-20 10:00:00' and cursor is None
+
+
+def test_concurrent_ingestion_books_once():
+    async def scenario():
+        storage = AsyncDatabaseManager(SQLiteThreadDriver())
+        await storage.start()
+        try:
+            results = await asyncio.gather(*[
+                storage.ingest_payment(payment("dup"), {'user_id': 7}, schedule()) for _ in range(10)
+            ])
+            return results, await storage.get_user_schedule(7)
+        finally:
+            await storage.close()
+
+    results, rows = asyncio.run(scenario())
+    assert len([r for r in results if r is not None]) == 1
+    assert len(rows) == 1
@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+# Ensure the project root is on the path so that 'transcription_cache' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from transcription_cache import TranscriptionCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return TranscriptionCache(str(tmp_path / "cache.db"), ttl_seconds=3600, max_entries=2)
+
+
+def test_hit_by_file_unique_id_and_content_hash(cache):
+    calls = []
+
+    def transcribe():
+        calls.append(1)
+        return "привет"
+
+    assert cache.get_or_transcribe(b"audio", transcribe, file_unique_id="A", duration_seconds=60) == "привет"
+    # Пересланное голосовое: тот же file_unique_id
+    assert cache.get_or_transcribe(b"other bytes", transcribe, file_unique_id="A") == "привет"
+    # Повторная загрузка того же файла: новый ID, то же содержимое
+    assert cache.get_or_transcribe(b"audio", transcribe, file_unique_id="B", duration_seconds=60) == "привет"
+
+    assert len(calls) == 1
+    stats = cache.get_stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["saved_cost_usd"] == pytest.approx(0.012)
+
+
+def test_ttl_and_size_eviction(cache, monkeypatch):
+    monkeypatch.setattr('transcription_cache.time.time', lambda: 1000)
+    cache.set("h1", "one")
+    monkeypatch.setattr('transcription_cache.time.time', lambda: 1001)
+    cache.set("h2", "two")
+    cache.set("h3", "three")
+
+    assert cache.get(content_hash="h1") is None
+    assert cache.get(content_hash="h3") == "three"
+
+    monkeypatch.setattr('transcription_cache.time.time', lambda: 1001 + 3601)
+    assert cache.get(content_hash="h3") is None
+
+
+def test_concurrent_identical_requests_share_one_call(cache):
+    calls = []
+    started = threading.Event()
+
+    def transcribe():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return "текст"
+
+    results = []
+    owner = threading.Thread(target=lambda: results.append(cache.get_or_transcribe(b"same", transcribe)))
+    owner.start()
+    started.wait()
+    waiter = threading.Thread(target=lambda: results.append(cache.get_or_transcribe(b"same", transcribe)))
+    waiter.start()
+    owner.join()
+    waiter.join()
+
+    assert results == ["текст", "текст"]
+    assert len(calls) == 1
+
+
+def test_errors_are_not_cached(cache):
+    def failing():
+        raise RuntimeError("API error")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_transcribe(b"audio", failing)
+
+    assert cache.get_or_transcribe(b"audio", lambda: "ok") == "ok"
@@ -0,0 +1,74 @@
+import os
+import sys
+import asyncio
+
+# Ensure the project root is on the path so that 'typing_presence' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from typing_presence import TypingPresence
+
+
+def test_action_is_refreshed_while_work_is_in_flight():
+    async def scenario():
+        sent = []
+
+        async def send_action(chat_id, action):
+            sent.append((chat_id, action))
+
+        presence = TypingPresence(send_action, interval=0.05)
+        async with presence.typing(1):
+            await asyncio.sleep(0.18)
+        count = len(sent)
+        await asyncio.sleep(0.1)
+        return sent, count, presence.get_stats()
+
+    sent, count, stats = asyncio.run(scenario())
+    assert count >= 3
+    assert len(sent) == count  # После выхода из блока обновления прекращаются
+    assert set(sent) == {(1, "typing")}
+    assert stats["active"] == 0
+
+
+def test_concurrent_work_in_one_chat_shares_one_task():
+    async def scenario():
+        sent = []
+
+        async def send_action(chat_id, action):
+            sent.append(chat_id)
+
+        presence = TypingPresence(send_action, interval=1.0)
+        presence.start(7)
+        presence.start(7)
+        await asyncio.sleep(0.01)
+        task = presence.active[(7, "typing")].task
+
+        presence.stop(7)
+        await asyncio.sleep(0.01)
+        still_active = not task.done()
+        presence.stop(7)
+        await asyncio.sleep(0.01)
+        presence.stop(7)  # Лишний stop не ломает счетчик
+        return sent, still_active, task.cancelled(), presence.get_stats()
+
+    sent, still_active, cancelled, stats = asyncio.run(scenario())
+    assert sent == [7]
+    assert still_active
+    assert cancelled
+    assert stats["active"] == 0
+
+
+def test_send_errors_do_not_stop_keepalive():
+    async def scenario():
+        calls = []
+
+        async def send_action(chat_id, action):
+            calls.append(chat_id)
+            raise RuntimeError("network")
+
+        presence = TypingPresence(send_action, interval=0.02)
+        async with presence.typing(1):
+            await asyncio.sleep(0.05)
+        await presence.close()
+        return calls
+
+    assert len(asyncio.run(scenario())) >= 2
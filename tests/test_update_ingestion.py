@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import threading
+
+# Ensure the project root is on the path so that 'update_ingestion' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from update_ingestion import UpdateIngestor, ACCEPTED, DUPLICATE, INVALID, QUEUE_FULL
+
+
+def message_update(update_id, user_id):
+    return {"update_id": update_id, "message": {"from": {"id": user_id}, "chat": {"id": user_id}, "text": str(update_id)}}
+
+
+def test_submit_does_not_wait_for_processing():
+    release = threading.Event()
+    processed = []
+
+    def process(update):
+        release.wait(5)
+        processed.append(update["update_id"])
+
+    ingestor = UpdateIngestor(process, workers=2)
+    ingestor.start()
+
+    started = time.monotonic()
+    assert ingestor.submit(message_update(1, 10)) == ACCEPTED
+    assert time.monotonic() - started < 0.1
+
+    release.set()
+    ingestor.stop()
+    assert processed == [1]
+
+
+def test_duplicates_and_invalid_updates():
+    ingestor = UpdateIngestor(lambda update: None, workers=1)
+
+    assert ingestor.submit(message_update(1, 10)) == ACCEPTED
+    assert ingestor.submit(message_update(1, 10)) == DUPLICATE
+    assert ingestor.submit({"message": {}}) == INVALID
+    assert ingestor.submit(None) == INVALID
+
+    metrics = ingestor.get_metrics()
+    assert metrics["accepted"] == 1
+    assert metrics["duplicates"] == 1
+    assert metrics["invalid"] == 2
+    assert metrics["queue_depth"] == 1
+
+
+def test_full_queue_rejects_without_marking_as_seen():
+    ingestor = UpdateIngestor(lambda update: None, workers=1, max_queue_size=1)
+
+    assert ingestor.submit(message_update(1, 10)) == ACCEPTED
+    assert ingestor.submit(message_update(2, 10)) == QUEUE_FULL
+
+    # Повторная доставка после освобождения очереди принимается
+    ingestor.start()
+    ingestor.stop()
+    assert ingestor.submit(message_update(2, 10)) == ACCEPTED
+    assert ingestor.get_metrics()["dropped"] == 1
+
+
+def test_updates_of_one_user_keep_order_and_failures_are_counted():
+    processed = []
+
+    def process(update):
+        if update["update_id"] == 3:
+            raise ValueError("boom")
+        processed.append((update["message"]["from"]["id"], update["update_id"]))
+
+    ingestor = UpdateIngestor(process, workers=4)
+    ingestor.start()
+    for update_id in range(1, 41):
+        ingestor.submit(message_update(update_id, update_id % 3))
+    ingestor.stop()
+
+    for user_id in range(3):
+        ids = [update_id for user, update_id in processed if user == user_id]
+        assert ids == sorted(ids)
+
+    metrics = ingestor.get_metrics()
+    assert metrics["processed"] == 39
+    assert metrics["failed"] == 1
+    assert metrics["queue_latency_ms"]["p50"] is not None
+
+
+def test_dedup_window_is_bounded():
+    ingestor = UpdateIngestor(lambda update: None, workers=1, dedup_size=2)
+    for update_id in (1, 2, 3):
+        ingestor.submit(message_update(update_id, 10))
+
+    assert len(ingestor.seen_updates) == 2
+    assert ingestor.submit(message_update(1, 10)) == ACCEPTED
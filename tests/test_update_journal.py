@@ -0,0 +1,139 @@
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+# Ensure the project root is on the path so that 'update_journal' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from update_journal import UpdateJournal, APPEND_NEW, APPEND_PENDING, APPEND_PROCESSED
+from update_ingestion import UpdateIngestor, ACCEPTED, DUPLICATE, DEFERRED_ACK, QUEUE_FULL
+
+
+def message_update(update_id, user_id=10):
+    return {"update_id": update_id, "message": {"from": {"id": user_id}, "text": f"текст {update_id}"}}
+
+
+def test_append_is_durable_and_deduplicated(tmp_path):
+    path = str(tmp_path / "journal.db")
+    journal = UpdateJournal(path)
+    assert journal.append(message_update(1)) == APPEND_NEW
+    assert journal.append(message_update(1)) == APPEND_PENDING
+    assert journal.append(message_update(2)) == APPEND_NEW
+    journal.ack([1])
+    journal.close()
+
+    # Новый экземпляр видит только необработанные обновления, повтор старого ID отсекается
+    reopened = UpdateJournal(path)
+    assert reopened.pending() == [message_update(2)]
+    assert reopened.append(message_update(1)) == APPEND_PROCESSED
+    assert reopened.last_update_id() == 2
+    reopened.close()
+
+
+def test_concurrent_appends_share_commits(tmp_path):
+    journal = UpdateJournal(str(tmp_path / "journal.db"), flush_interval=0.02)
+    threads = [threading.Thread(target=journal.append, args=(message_update(i),)) for i in range(1, 51)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = journal.get_stats()
+    journal.close()
+    assert stats["appended"] == 50
+    assert stats["pending"] == 50
+    assert stats["commits"] < 50
+
+
+def test_prune_keeps_pending_updates(tmp_path):
+    journal = UpdateJournal(str(tmp_path / "journal.db"), retention_seconds=-1)
+    journal.append(message_update(1))
+    journal.append(message_update(2))
+    journal.ack([1])
+    journal.close()
+
+    assert journal.prune() == 1
+    assert [update["update_id"] for update in journal.pending()] == [2]
+
+
+def test_ingestor_replays_unacknowledged_updates_after_restart(tmp_path):
+    path = str(tmp_path / "journal.db")
+    journal = UpdateJournal(path)
+    # Первый запуск: обновление 1 обработано, 2 отложено (батч не отправлен), 3 не дошло до обработки
+    first = UpdateIngestor(lambda update: DEFERRED_ACK if update["update_id"] == 2 else None,
+                           workers=1, journal=journal)
+    first.start()
+    assert first.submit(message_update(1)) == ACCEPTED
+    assert first.submit(message_update(2)) == ACCEPTED
+    first.stop()
+    journal.append(message_update(3))
+    journal.close()
+
+    processed = []
+    journal = UpdateJournal(path)
+    second = UpdateIngestor(lambda update: processed.append(update["update_id"]), workers=2, journal=journal)
+    second.start()
+    # Telegram повторно присылает уже записанные обновления
+    assert second.submit(message_update(1)) == DUPLICATE
+    assert second.submit(message_update(3)) == DUPLICATE
+    second.stop()
+    journal.close()
+
+    assert processed == [2, 3]
+    assert second.get_metrics()["replayed"] == 2
+    assert UpdateJournal(path).pending() == []
+
+
+def test_update_written_after_append_timeout_is_processed_on_redelivery(tmp_path):
+    journal = UpdateJournal(str(tmp_path / "journal.db"))
+    write_batch = journal._write_batch
+    release = threading.Event()
+
+    def slow_write_batch(conn, batch):
+        release.wait(2)
+        write_batch(conn, batch)
+
+    journal._write_batch = slow_write_batch
+    append = journal.append
+    journal.append = lambda update: append(update, timeout=0.05)
+
+    processed = []
+    ingestor = UpdateIngestor(lambda update: processed.append(update["update_id"]), workers=1, journal=journal)
+    ingestor.start()
+    # Запись не успела за таймаут, но остается в очереди писателя и позже будет сделана
+    with pytest.raises(TimeoutError):
+        ingestor.submit(message_update(1))
+    release.set()
+
+    # Повторная доставка Telegram: запись уже на диске, но обновление не обработано
+    assert ingestor.submit(message_update(1)) == ACCEPTED
+    ingestor.stop()
+    journal.close()
+    assert processed == [1]
+
+
+def test_full_queue_after_journal_write_does_not_block(tmp_path):
+    journal = UpdateJournal(str(tmp_path / "journal.db"))
+    ingestor = UpdateIngestor(lambda update: None, workers=1, max_queue_size=1, journal=journal)
+    append = journal.append
+
+    def append_while_other_thread_fills_queue(update):
+        status = append(update)
+        # Пока шла запись, другой поток занял последнее место в очереди
+        ingestor.queues[0].put_nowait((message_update(99), 0.0))
+        return status
+
+    journal.append = append_while_other_thread_fills_queue
+    started = time.monotonic()
+    assert ingestor.submit(message_update(1)) == QUEUE_FULL
+    assert time.monotonic() - started < 1
+
+    # Запись осталась ожидающей: повторная доставка после освобождения очереди ее обработает
+    journal.append = append
+    ingestor.queues[0].get_nowait()
+    assert [update["update_id"] for update in journal.pending()] == [1]
+    assert ingestor.submit(message_update(1)) == ACCEPTED
+    journal.close()
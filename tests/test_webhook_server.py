@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import asyncio
+
+# Ensure the project root is on the path so that 'webhook_server' can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from webhook_server import WebhookApp
+
+SECRET = "test-secret"
+
+
+def call(app, method="POST", path="/telegram", body=b"", secret=SECRET, chunk_size=None):
+    """Вызывает ASGI-приложение напрямую и возвращает (статус, тело)"""
+    headers = [(b"content-type", b"application/json")]
+    if secret is not None:
+        headers.append((b"x-telegram-bot-api-secret-token", secret.encode()))
+    scope = {"type": "http", "method": method, "path": path, "headers": headers}
+
+    chunk_size = chunk_size or max(len(body), 1)
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)] or [b""]
+    messages = [
+        {"type": "http.request", "body": chunk, "more_body": index < len(chunks) - 1}
+        for index, chunk in enumerate(chunks)
+    ]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return sent[0]["status"], sent[1]["body"]
+
+
+def make_app(**kwargs):
+    submitted = []
+
+    async def submit(data):
+        submitted.append(data)
+
+    return WebhookApp(submit, SECRET, **kwargs), submitted
+
+
+def test_valid_update_is_submitted_and_acknowledged():
+    app, submitted = make_app()
+    update = {"update_id": 7, "message": {"text": "hi"}}
+
+    status, body = call(app, body=json.dumps(update).encode(), chunk_size=5)
+
+    assert status == 200
+    assert body == b"ok"
+    assert submitted == [update]
+    assert app.get_stats()["received"] == 1
+
+
+def test_wrong_or_missing_secret_is_rejected():
+    app, submitted = make_app()
+    body = json.dumps({"update_id": 1}).encode()
+
+    assert call(app, body=body, secret="other")[0] == 403
+    assert call(app, body=body, secret=None)[0] == 403
+    assert submitted == []
+    assert app.get_stats()["rejected"] == 2
+
+
+def test_invalid_body_is_rejected():
+    app, submitted = make_app(max_body_size=64)
+
+    assert call(app, body=b"not json")[0] == 400
+    assert call(app, body=b'{"message": {}}')[0] == 400
+    assert call(app, body=b"[1, 2]")[0] == 400
+    assert call(app, body=json.dumps({"update_id": 1, "pad": "x" * 100}).encode(), chunk_size=16)[0] == 413
+    assert submitted == []
+
+
+def test_routing_and_healthz():
+    app, _ = make_app()
+
+    assert call(app, path="/other")[0] == 404
+    assert call(app, method="GET")[0] == 405
+
+    call(app, body=b'{"update_id": 1}')
+    status, body = call(app, method="GET", path="/healthz", secret=None)
+    stats = json.loads(body)
+    assert status == 200
+    assert stats["received"] == 1
+    assert stats["last_update_at"] is not None
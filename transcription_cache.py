@@ -0,0 +1,209 @@
+"""
+Модуль для кэширования транскрипций Whisper
+Повторно пересланные голосовые и одинаковые аудиофайлы не отправляются в API повторно
+"""
+
+import time
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Union
+
+# Стоимость whisper-1 в долларах за минуту аудио
+WHISPER_PRICE_PER_MINUTE = 0.006
+
+
+def get_content_hash(audio: Union[str, bytes]) -> str:
+    """Возвращает sha256 содержимого аудио (путь к файлу или байты)"""
+    digest = hashlib.sha256()
+    if isinstance(audio, (bytes, bytearray)):
+        digest.update(audio)
+    else:
+        with open(audio, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TranscriptionCache:
+    """
+    Кэш транскрипций в SQLite с TTL, ограничением размера и объединением одинаковых запросов.
+    """
+
+    def __init__(self, db_path: str = "bot_database.db", ttl_seconds: int = 30 * 24 * 3600,
+                 max_entries: int = 5000):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.in_flight: Dict[str, Future] = {}  # content_hash -> Future с транскрипцией
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.shared_requests = 0
+        self.saved_latency_seconds = 0.0
+        self.saved_cost_usd = 0.0
+        self.init_cache_db()
+
+    def init_cache_db(self) -> None:
+        """Создает таблицу кэша"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS transcription_cache (
+                    content_hash TEXT PRIMARY KEY,
+                    file_unique_id TEXT,
+                    transcript TEXT NOT NULL,
+                    duration_seconds REAL DEFAULT 0,
+                    latency_seconds REAL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_transcription_cache_file_unique_id
+                ON transcription_cache (file_unique_id)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_transcription_cache_last_used_at
+                ON transcription_cache (last_used_at)
+            ''')
+            conn.commit()
+
+    def get(self, file_unique_id: Optional[str] = None, content_hash: Optional[str] = None) -> Optional[str]:
+        """
+        Ищет транскрипцию по file_unique_id Telegram или хешу содержимого.
+
+        Args:
+            file_unique_id: Постоянный ID файла в Telegram
+            content_hash: sha256 содержимого аудио
+
+        Returns:
+            Optional[str]: Транскрипция или None
+        """
+        if not file_unique_id and not content_hash:
+            return None
+
+        now = time.time()
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT content_hash, transcript, duration_seconds, latency_seconds
+                FROM transcription_cache
+                WHERE (file_unique_id = ? OR content_hash = ?) AND created_at >= ?
+                LIMIT 1
+            ''', (file_unique_id, content_hash, now - self.ttl_seconds))
+            row = cursor.fetchone()
+
+            if row is None:
+                return None
+
+            cursor.execute('UPDATE transcription_cache SET last_used_at = ? WHERE content_hash = ?', (now, row[0]))
+            conn.commit()
+
+        self._record_hit(row[2], row[3])
+        return row[1]
+
+    def set(self, content_hash: str, transcript: str, file_unique_id: Optional[str] = None,
+            duration_seconds: float = 0, latency_seconds: float = 0) -> None:
+        """Сохраняет транскрипцию и вытесняет устаревшие записи"""
+        now = time.time()
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO transcription_cache (
+                    content_hash, file_unique_id, transcript, duration_seconds,
+                    latency_seconds, created_at, last_used_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (content_hash, file_unique_id, transcript, duration_seconds or 0, latency_seconds, now, now))
+
+            # Удаляем записи старше TTL и самые давно использованные сверх лимита
+            cursor.execute('DELETE FROM transcription_cache WHERE created_at < ?', (now - self.ttl_seconds,))
+            cursor.execute('''
+                DELETE FROM transcription_cache WHERE content_hash IN (
+                    SELECT content_hash FROM transcription_cache
+                    ORDER BY last_used_at DESC
+                    LIMIT -1 OFFSET ?
+                )
+            ''', (self.max_entries,))
+            conn.commit()
+
+    def get_or_transcribe(self, audio: Union[str, bytes], transcribe: Callable[[], Optional[str]],
+                          file_unique_id: Optional[str] = None, duration_seconds: float = 0) -> Optional[str]:
+        """
+        Возвращает транскрипцию из кэша или вызывает transcribe один раз для одинаковых запросов.
+
+        Args:
+            audio: Путь к файлу или байты аудио
+            transcribe: Функция, выполняющая запрос к Whisper (None - ошибка, не кэшируется)
+            file_unique_id: Постоянный ID файла в Telegram
+            duration_seconds: Длительность аудио для подсчета сэкономленной стоимости
+
+        Returns:
+            Optional[str]: Транскрипция
+        """
+        if file_unique_id:
+            transcript = self.get(file_unique_id=file_unique_id)
+            if transcript is not None:
+                return transcript
+
+        content_hash = get_content_hash(audio)
+        transcript = self.get(content_hash=content_hash)
+        if transcript is not None:
+            return transcript
+
+        with self.lock:
+            future = self.in_flight.get(content_hash)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self.in_flight[content_hash] = future
+
+        if not is_owner:
+            # Такой же файл уже транскрибируется - ждем общий результат
+            transcript = future.result()
+            if transcript is not None:
+                with self.lock:
+                    self.shared_requests += 1
+                self._record_hit(duration_seconds, 0)
+            return transcript
+
+        self.misses += 1
+        try:
+            started_at = time.monotonic()
+            transcript = transcribe()
+            latency = time.monotonic() - started_at
+
+            if transcript is not None:
+                self.set(content_hash, transcript, file_unique_id, duration_seconds, latency)
+
+            future.set_result(transcript)
+            return transcript
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.in_flight.pop(content_hash, None)
+
+    def get_stats(self) -> Dict:
+        """
+        Возвращает статистику кэша.
+
+        Returns:
+            Dict: Попадания, промахи, сэкономленные время и стоимость
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared_requests": self.shared_requests,
+            "saved_latency_seconds": round(self.saved_latency_seconds, 2),
+            "saved_cost_usd": round(self.saved_cost_usd, 4),
+        }
+
+    def _record_hit(self, duration_seconds: float, latency_seconds: float) -> None:
+        """Учитывает сэкономленный запрос к Whisper"""
+        with self.lock:
+            self.hits += 1
+            self.saved_latency_seconds += latency_seconds or 0
+            self.saved_cost_usd += (duration_seconds or 0) / 60 * WHISPER_PRICE_PER_MINUTE
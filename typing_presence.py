@@ -0,0 +1,85 @@
+"""
+Модуль индикатора набора текста
+Пока для чата идет работа, одна задача asyncio раз в несколько секунд обновляет действие (Telegram гасит его через 5 с)
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Tuple
+
+# Telegram показывает действие 5 секунд, обновляем чуть раньше
+REFRESH_INTERVAL = 4.0
+
+
+class _Presence:
+    """Активное действие в чате: число работ и задача обновления"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.count = 1
+
+
+class TypingPresence:
+    """
+    Менеджер индикаторов набора.
+    Несколько одновременных работ в одном чате разделяют одну задачу; она отменяется, когда завершилась последняя.
+    """
+
+    def __init__(self, send_action: Callable[[int, str], Awaitable], interval: float = REFRESH_INTERVAL):
+        self.send_action = send_action  # (chat_id, action) -> запрос sendChatAction
+        self.interval = interval
+        self.active: Dict[Tuple[int, str], _Presence] = {}
+        self.actions_sent = 0
+
+    @asynccontextmanager
+    async def typing(self, chat_id: int, action: str = "typing"):
+        """Показывает действие в чате на время блока async with"""
+        self.start(chat_id, action)
+        try:
+            yield
+        finally:
+            self.stop(chat_id, action)
+
+    def start(self, chat_id: int, action: str = "typing") -> None:
+        """Начинает показывать действие (вызов должен быть парным со stop)"""
+        key = (chat_id, action)
+        presence = self.active.get(key)
+        if presence is not None:
+            presence.count += 1
+            return
+        self.active[key] = _Presence(asyncio.get_running_loop().create_task(self._keepalive(chat_id, action)))
+
+    def stop(self, chat_id: int, action: str = "typing") -> None:
+        """Завершает одну работу; после последней задача обновления отменяется"""
+        key = (chat_id, action)
+        presence = self.active.get(key)
+        if presence is None:
+            return
+        presence.count -= 1
+        if presence.count <= 0:
+            presence.task.cancel()
+            del self.active[key]
+
+    async def _keepalive(self, chat_id: int, action: str) -> None:
+        """Отправляет действие сразу и затем каждые interval секунд до отмены"""
+        while True:
+            try:
+                await self.send_action(chat_id, action)
+                self.actions_sent += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error sending chat action to {chat_id}: {e}")
+            await asyncio.sleep(self.interval)
+
+    def get_stats(self) -> Dict:
+        """Число активных индикаторов и отправленных действий"""
+        return {"active": len(self.active), "actions_sent": self.actions_sent}
+
+    async def close(self) -> None:
+        """Отменяет все индикаторы"""
+        tasks = [presence.task for presence in self.active.values()]
+        self.active.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
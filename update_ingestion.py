@@ -0,0 +1,216 @@
+"""
+Модуль приема обновлений Telegram для main_batch
+Webhook и polling только проверяют, отсекают дубли и ставят обновление в очередь;
+обработку выполняет пул потоков-обработчиков. С журналом обновление сначала записывается на диск
+"""
+
+import time
+import queue
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional
+
+from update_journal import UpdateJournal, APPEND_PROCESSED
+
+# Результаты submit
+ACCEPTED = "accepted"
+DUPLICATE = "duplicate"
+INVALID = "invalid"
+QUEUE_FULL = "queue_full"
+
+# Возвращается обработчиком, если обновление будет подтверждено позже (например, после отправки батча)
+DEFERRED_ACK = "deferred_ack"
+
+# Типы обновлений, в которых есть отправитель
+USER_UPDATE_TYPES = ("message", "edited_message", "callback_query", "pre_checkout_query", "shipping_query")
+
+
+def get_update_key(update: Dict) -> int:
+    """Ключ распределения по обработчикам: ID отправителя, иначе update_id"""
+    for update_type in USER_UPDATE_TYPES:
+        sender = (update.get(update_type) or {}).get("from")
+        if sender and "id" in sender:
+            return int(sender["id"])
+    return int(update["update_id"])
+
+
+class LatencyWindow:
+    """
+    Задержки последних N обновлений для перцентилей.
+    """
+
+    def __init__(self, size: int = 1000):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentiles(self) -> Dict:
+        """p50/p95/p99/max в миллисекундах"""
+        with self.lock:
+            samples = sorted(self.samples)
+        if not samples:
+            return {"p50": None, "p95": None, "p99": None, "max": None}
+
+        def pick(share: float) -> float:
+            return round(samples[min(len(samples) - 1, int(len(samples) * share))] * 1000, 2)
+
+        return {"p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "max": round(samples[-1] * 1000, 2)}
+
+
+class UpdateIngestor:
+    """
+    Очередь обновлений с пулом обработчиков.
+    Обновления одного пользователя всегда попадают в один поток, поэтому порядок его сообщений сохраняется.
+    С журналом обработка at-least-once: необработанные обновления повторяются после перезапуска.
+    """
+
+    def __init__(self, process: Callable[[Dict], Optional[str]], workers: int = 4, max_queue_size: int = 10000,
+                 dedup_size: int = 100000, key_func: Callable[[Dict], int] = get_update_key,
+                 journal: Optional[UpdateJournal] = None):
+        self.process = process  # Обработчик одного обновления
+        self.journal = journal
+        self.key_func = key_func
+        self.dedup_size = dedup_size
+        self.queues: List[queue.Queue] = [
+            queue.Queue(maxsize=max(1, max_queue_size // workers)) for _ in range(workers)
+        ]
+        self.seen_updates: "OrderedDict[int, None]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.threads: List[threading.Thread] = []
+        self.queue_latency = LatencyWindow()  # От приема до начала обработки
+        self.process_latency = LatencyWindow()  # Время обработки
+        self.counters = {"accepted": 0, "duplicates": 0, "invalid": 0, "dropped": 0, "processed": 0, "failed": 0,
+                         "replayed": 0}
+
+    def start(self) -> None:
+        """Запускает потоки-обработчики и повторяет необработанные обновления из журнала"""
+        if self.threads:
+            return
+        for index, worker_queue in enumerate(self.queues):
+            thread = threading.Thread(target=self._worker, args=(worker_queue,), name=f"update-worker-{index}",
+                                      daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+        if self.journal is not None:
+            for update in self.journal.pending():
+                with self.lock:
+                    self.seen_updates[update["update_id"]] = None
+                self._queue_for(update).put((update, time.monotonic()))
+                self._count("replayed")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Дожидается обработки очереди и останавливает потоки"""
+        for worker_queue in self.queues:
+            worker_queue.put(None)
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def submit(self, update: Dict) -> str:
+        """
+        Проверяет обновление и ставит его в очередь без ожидания.
+
+        Args:
+            update: Обновление Telegram (разобранный JSON)
+
+        Returns:
+            str: ACCEPTED, DUPLICATE, INVALID или QUEUE_FULL
+        """
+        if not isinstance(update, dict) or not isinstance(update.get("update_id"), int):
+            self._count("invalid")
+            return INVALID
+        update_id = update["update_id"]
+
+        with self.lock:
+            if update_id in self.seen_updates:
+                self.counters["duplicates"] += 1
+                return DUPLICATE
+            self.seen_updates[update_id] = None
+            if len(self.seen_updates) > self.dedup_size:
+                self.seen_updates.popitem(last=False)
+
+        worker_queue = self._queue_for(update)
+        if self.journal is not None:
+            if worker_queue.full():
+                # Не пишем на диск то, что все равно не поместится в очередь
+                return self._reject_full(update_id)
+            try:
+                status = self.journal.append(update)
+            except Exception:
+                with self.lock:
+                    self.seen_updates.pop(update_id, None)
+                raise
+            if status == APPEND_PROCESSED:
+                # Уже обработано (повтор Telegram после перезапуска)
+                self._count("duplicates")
+                return DUPLICATE
+            # APPEND_PENDING: запись есть на диске, но в памяти обновления нет (например, прежний append
+            # завершился по таймауту, а запись все же сделана) - обрабатываем, иначе оно ждало бы перезапуска
+
+        # Webhook и polling не ждут места в очереди. Запись журнала остается ожидающей:
+        # повторная доставка Telegram поставит ее в очередь, иначе она повторится после перезапуска
+        try:
+            worker_queue.put_nowait((update, time.monotonic()))
+        except queue.Full:
+            return self._reject_full(update_id)
+
+        self._count("accepted")
+        return ACCEPTED
+
+    def _queue_for(self, update: Dict) -> queue.Queue:
+        return self.queues[self.key_func(update) % len(self.queues)]
+
+    def _reject_full(self, update_id: int) -> str:
+        """Telegram повторит доставку, поэтому ID не считается принятым"""
+        with self.lock:
+            self.seen_updates.pop(update_id, None)
+            self.counters["dropped"] += 1
+        return QUEUE_FULL
+
+    def _worker(self, worker_queue: queue.Queue) -> None:
+        while True:
+            item = worker_queue.get()
+            if item is None:
+                return
+            update, received_at = item
+            started = time.monotonic()
+            self.queue_latency.add(started - received_at)
+            result = None
+            try:
+                result = self.process(update)
+                self._count("processed")
+            except Exception as e:
+                # Ошибка обработки не повторяется после перезапуска, иначе одно обновление блокировало бы запуск
+                self._count("failed")
+                print(f"Error processing update {update.get('update_id')}: {e}")
+            finally:
+                self.process_latency.add(time.monotonic() - started)
+                if self.journal is not None and result != DEFERRED_ACK:
+                    self.journal.ack([update["update_id"]])
+
+    def _count(self, name: str) -> None:
+        with self.lock:
+            self.counters[name] += 1
+
+    def queue_depth(self) -> int:
+        """Обновлений в очереди"""
+        return sum(worker_queue.qsize() for worker_queue in self.queues)
+
+    def get_metrics(self) -> Dict:
+        """Глубина очереди, счетчики, перцентили задержек и состояние журнала"""
+        with self.lock:
+            counters = dict(self.counters)
+        metrics = {
+            "queue_depth": self.queue_depth(),
+            "workers": len(self.threads),
+            **counters,
+            "queue_latency_ms": self.queue_latency.percentiles(),
+            "process_latency_ms": self.process_latency.percentiles(),
+        }
+        if self.journal is not None:
+            metrics["journal"] = self.journal.get_stats()
+        return metrics
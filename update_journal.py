@@ -0,0 +1,206 @@
+"""
+Модуль журнала обновлений Telegram на диске
+Обновление записывается в SQLite до подтверждения Telegram и удаляется из ожидающих после обработки.
+Записи группируются: одна транзакция (один fsync) на пачку одновременно пришедших обновлений
+"""
+
+import json
+import time
+import queue
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+# Результаты append
+APPEND_NEW = "new"              # Записано впервые
+APPEND_PENDING = "pending"      # Уже было в журнале и еще не обработано
+APPEND_PROCESSED = "processed"  # Уже было в журнале и обработано
+
+
+class _AppendRequest:
+    """Ожидание записи одного обновления в журнал"""
+
+    def __init__(self, update: Dict):
+        self.update = update
+        self.done = threading.Event()
+        self.status = APPEND_NEW
+        self.error: Optional[Exception] = None
+
+
+class UpdateJournal:
+    """
+    Журнал обновлений с групповой записью.
+    Один поток-писатель держит соединение, вызывающие потоки ждут только commit своей пачки.
+    """
+
+    def __init__(self, db_path: str = "updates_journal.db", flush_interval: float = 0.0, max_batch: int = 500,
+                 retention_seconds: float = 24 * 3600):
+        self.db_path = db_path
+        self.flush_interval = flush_interval  # Дополнительное ожидание следующих обновлений перед commit
+        self.max_batch = max_batch
+        self.retention_seconds = retention_seconds  # Обработанные ID храним для отсечения повторов Telegram
+        self.requests: queue.Queue = queue.Queue()
+        self.stats = {"appended": 0, "duplicates": 0, "acked": 0, "commits": 0}
+        self.last_prune = 0.0
+        self.init_database()
+        self.writer = threading.Thread(target=self._writer, name="update-journal", daemon=True)
+        self.writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode = WAL')
+        # В WAL с FULL каждый commit - fsync; групповая запись делает его одним на пачку
+        conn.execute('PRAGMA synchronous = FULL')
+        return conn
+
+    def init_database(self) -> None:
+        """Создает таблицу журнала"""
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS update_journal (
+                    update_id INTEGER PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    status INTEGER NOT NULL DEFAULT 0,  -- 0 ожидает обработки, 1 обработано
+                    received_at REAL NOT NULL,
+                    processed_at REAL
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_update_journal_pending
+                ON update_journal(update_id) WHERE status = 0
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_update_journal_processed
+                ON update_journal(processed_at) WHERE status = 1
+            ''')
+
+    def append(self, update: Dict, timeout: float = 5.0) -> str:
+        """
+        Записывает обновление на диск и ждет commit.
+        После TimeoutError запись еще может быть сделана: повторный append вернет APPEND_PENDING.
+
+        Args:
+            update: Обновление Telegram с update_id
+            timeout: Максимальное ожидание записи
+
+        Returns:
+            str: APPEND_NEW, либо APPEND_PENDING / APPEND_PROCESSED, если такой update_id уже был в журнале
+        """
+        request = _AppendRequest(update)
+        self.requests.put(request)
+        if not request.done.wait(timeout):
+            raise TimeoutError("Журнал обновлений не успел записать обновление")
+        if request.error is not None:
+            raise request.error
+        return request.status
+
+    def ack(self, update_ids: Iterable[int]) -> None:
+        """Помечает обновления обработанными (без ожидания записи)"""
+        update_ids = list(update_ids)
+        if update_ids:
+            self.requests.put(update_ids)
+
+    def _writer(self) -> None:
+        """Поток-писатель: собирает пачку запросов и записывает ее одной транзакцией"""
+        conn = self._connect()
+        try:
+            while True:
+                first = self.requests.get()
+                if first is None:
+                    return
+                # Пока шел предыдущий commit, в очереди накопились следующие запросы - забираем их разом
+                batch = [first]
+                deadline = time.monotonic() + self.flush_interval
+                stop = False
+                while len(batch) < self.max_batch:
+                    try:
+                        remaining = deadline - time.monotonic()
+                        item = self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                        break
+                    batch.append(item)
+                self._write_batch(conn, batch)
+                if stop:
+                    return
+                if time.monotonic() - self.last_prune > 60:
+                    self.prune(conn)
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: List) -> None:
+        """Записывает новые обновления и подтверждения одной транзакцией"""
+        appends = [item for item in batch if isinstance(item, _AppendRequest)]
+        acked_ids = [(time.time(), update_id) for item in batch if isinstance(item, list) for update_id in item]
+        try:
+            with conn:
+                now = time.time()
+                for request in appends:
+                    cursor = conn.execute(
+                        'INSERT OR IGNORE INTO update_journal (update_id, payload, received_at) VALUES (?, ?, ?)',
+                        (request.update["update_id"], json.dumps(request.update, ensure_ascii=False), now)
+                    )
+                    if cursor.rowcount == 1:
+                        request.status = APPEND_NEW
+                    else:
+                        (status,) = conn.execute(
+                            'SELECT status FROM update_journal WHERE update_id = ?', (request.update["update_id"],)
+                        ).fetchone()
+                        request.status = APPEND_PENDING if status == 0 else APPEND_PROCESSED
+                if acked_ids:
+                    conn.executemany(
+                        'UPDATE update_journal SET status = 1, processed_at = ? WHERE update_id = ? AND status = 0',
+                        acked_ids
+                    )
+            self.stats["commits"] += 1
+            self.stats["acked"] += len(acked_ids)
+            for request in appends:
+                self.stats["appended" if request.status == APPEND_NEW else "duplicates"] += 1
+        except Exception as e:
+            for request in appends:
+                request.error = e
+        finally:
+            for request in appends:
+                request.done.set()
+
+    def prune(self, conn: Optional[sqlite3.Connection] = None) -> int:
+        """Удаляет обработанные записи старше retention_seconds"""
+        self.last_prune = time.monotonic()
+        own_conn = conn is None
+        conn = conn or self._connect()
+        try:
+            with conn:
+                cursor = conn.execute(
+                    'DELETE FROM update_journal WHERE status = 1 AND processed_at < ?',
+                    (time.time() - self.retention_seconds,)
+                )
+            return cursor.rowcount
+        finally:
+            if own_conn:
+                conn.close()
+
+    def pending(self) -> List[Dict]:
+        """Необработанные обновления в порядке update_id (для восстановления после перезапуска)"""
+        with self._connect() as conn:
+            rows = conn.execute('SELECT payload FROM update_journal WHERE status = 0 ORDER BY update_id').fetchall()
+        return [json.loads(payload) for (payload,) in rows]
+
+    def last_update_id(self) -> int:
+        """Максимальный записанный update_id (offset для getUpdates после перезапуска)"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT MAX(update_id) FROM update_journal').fetchone()
+        return row[0] or 0
+
+    def get_stats(self) -> Dict:
+        """Счетчики записи и число ожидающих обновлений"""
+        with self._connect() as conn:
+            pending = conn.execute('SELECT COUNT(*) FROM update_journal WHERE status = 0').fetchone()[0]
+        return {**self.stats, "pending": pending}
+
+    def close(self) -> None:
+        """Записывает накопленные подтверждения и останавливает поток-писатель"""
+        if self.writer.is_alive():
+            self.requests.put(None)
+            self.writer.join(timeout=10)
@@ -0,0 +1,130 @@
+"""
+Модуль приема обновлений Telegram через webhook
+Минимальное ASGI-приложение: проверяет секретный токен, передает обновление в очередь и сразу отвечает 200
+"""
+
+import hmac
+import json
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+SECRET_HEADER = b"x-telegram-bot-api-secret-token"
+
+# Обновления Telegram - единицы килобайт, большие тела отклоняются до разбора
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class WebhookApp:
+    """
+    ASGI-приложение webhook. Обработка обновления идет после ответа Telegram, в очереди Application.
+    """
+
+    def __init__(self, submit: Callable[[Dict], Awaitable[None]], secret_token: str, path: str = "/telegram",
+                 max_body_size: int = MAX_BODY_SIZE):
+        self.submit = submit  # Передает разобранное обновление в очередь бота
+        self.secret_token = secret_token.encode('utf-8')
+        self.path = path
+        self.max_body_size = max_body_size
+        self.received = 0
+        self.rejected = 0
+        self.last_update_at: Optional[float] = None
+
+    async def __call__(self, scope: Dict, receive: Callable, send: Callable) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        method = scope.get("method", "GET")
+        if scope["path"] == "/healthz" and method == "GET":
+            await self._respond(send, 200, json.dumps(self.get_stats()).encode('utf-8'), b"application/json")
+            return
+        if scope["path"] != self.path:
+            await self._respond(send, 404, b"not found")
+            return
+        if method != "POST":
+            await self._respond(send, 405, b"method not allowed")
+            return
+
+        headers = dict(scope.get("headers") or [])
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, b""), self.secret_token):
+            self.rejected += 1
+            await self._respond(send, 403, b"forbidden")
+            return
+
+        body = await self._read_body(receive)
+        if body is None:
+            self.rejected += 1
+            await self._respond(send, 413, b"payload too large")
+            return
+
+        try:
+            data = json.loads(body)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict) or "update_id" not in data:
+            self.rejected += 1
+            await self._respond(send, 400, b"bad update")
+            return
+
+        await self.submit(data)
+        self.received += 1
+        self.last_update_at = time.time()
+        await self._respond(send, 200, b"ok")
+
+    async def _read_body(self, receive: Callable) -> Optional[bytes]:
+        """Читает тело запроса; None, если оно больше max_body_size"""
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return b"".join(chunks)
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_body_size:
+                return None
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    @staticmethod
+    async def _respond(send: Callable, status: int, body: bytes, content_type: bytes = b"text/plain") -> None:
+        """Отправляет короткий ответ"""
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _lifespan(receive: Callable, send: Callable) -> None:
+        """Подтверждает запуск и остановку сервера"""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def get_stats(self) -> Dict:
+        """Счетчики приема обновлений"""
+        return {
+            "received": self.received,
+            "rejected": self.rejected,
+            "last_update_at": self.last_update_at,
+        }
+
+
+async def serve(app: Callable, host: str = "0.0.0.0", port: int = 8080) -> None:
+    """Запускает ASGI-приложение на uvicorn в текущем цикле событий (до SIGINT/SIGTERM)"""
+    try:
+        import uvicorn
+    except ImportError:
+        raise RuntimeError("Для режима webhook установите пакет uvicorn")
+
+    config = uvicorn.Config(app, host=host, port=port, log_level="warning", access_log=False)
+    await uvicorn.Server(config).serve()